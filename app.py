@@ -6,139 +6,299 @@
 """
 
 import os
-from flask import Flask, request, jsonify, send_from_directory, make_response
+from flask import Flask, Response, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from dotenv import load_dotenv
 
+# 加载环境变量（需在导入搜索引擎模块之前，以便模块级配置读取到.env中的值）
+load_dotenv()
+
 # 导入搜索引擎模块
-from search_engines import zhipuai, bochaai, searxng
+from search_engines import zhipuai, bochaai, searxng, http_client, dispatcher, cache, breaker, ratelimit
+from search_engines.config import env_bool
+from search_engines import log, metrics, streaming, batch, models, rerank, suggest, warmer, codec
+import static_assets
 
-# 加载环境变量
-load_dotenv()
+# 配置日志
+log.setup_logging()
+logger = log.get_logger(__name__)
+
+class CodecJSONProvider(DefaultJSONProvider):
+    """通过 search_engines.codec 编解码JSON（安装了 orjson 时更快），不转义非ASCII字符、不排序键"""
+
+    ensure_ascii = False
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return codec.dumps(obj, default=self.default).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return codec.loads(s)
+
+    def response(self, *args, **kwargs):
+        # 调试模式下保留 Flask 的缩进输出
+        if self.compact is None and self._app.debug:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(codec.dumps(obj, default=self.default) + b'\n', mimetype=self.mimetype)
 
 app = Flask(__name__, static_folder='.')
+app.json = CodecJSONProvider(app)
 
 # 启用CORS
 CORS(app)
 
+def warm_up():
+    """预热到各上游搜索引擎的连接，后续搜索直接复用连接池中的长连接；并启动热门查询的缓存预热"""
+    http_client.prewarm([zhipuai.upstream_url(), bochaai.upstream_url(), *searxng.upstream_urls()])
+    warmer.start()
+
+# 使用 gunicorn 预加载时由工作进程在派生后预热（见 gunicorn.conf.py）
+if env_bool('HTTP_PREWARM_ON_IMPORT', True):
+    warm_up()
+
+@app.before_request
+def begin_request():
+    """为每个请求分配请求ID（优先使用客户端传入的 X-Request-ID）"""
+    log.begin_request(request.headers.get('X-Request-ID'))
+
+@app.after_request
+def add_request_id(response):
+    """在响应头中返回请求ID，便于与日志对应"""
+    response.headers['X-Request-ID'] = log.request_id_var.get()
+    return response
+
+@app.after_request
+def compress_response(response):
+    """压缩较大的JSON响应"""
+    return static_assets.compress_json_response(response)
+
+# 前端资源（预先压缩，带哈希的文件名可长期缓存），只提供 static_assets.ASSETS 中的文件
+assets = static_assets.AssetPipeline(os.path.dirname(os.path.abspath(__file__)))
+
 @app.route('/')
 def index():
     """提供首页"""
-    return send_from_directory('.', 'index.html')
+    return assets.response(static_assets.INDEX)
 
 @app.route('/<path:path>')
 def static_files(path):
     """提供静态文件"""
-    return send_from_directory('.', path)
+    response = assets.response(path)
+    if response is None:
+        return jsonify({'error': '未找到'}), 404
+    return response
 
-@app.route('/api/search')
-def search():
-    """搜索API端点"""
+def _parse_search_request():
+    """解析搜索请求参数
+
+    Returns:
+        tuple: (搜索引擎, 搜索查询, 额外参数, 是否跳过缓存, 结果格式, 错误响应)，校验失败时只有错误响应不为None
+    """
     query = request.args.get('query', '')
     engine = request.args.get('engine', 'search_std')  # 默认使用智谱基础搜索
 
-    # 验证搜索引擎
-    valid_engines = ['search_std', 'bochaai', 'searxng']
-    if engine not in valid_engines:
-        return jsonify({'error': f'无效的搜索引擎: {engine}'}), 400
+    # 验证搜索引擎和搜索查询
+    error = dispatcher.validate(engine, query)
+    if error:
+        return None, None, None, None, None, (jsonify({'error': error}), 400)
+
+    # 结果格式：zhipu（默认，智谱AI兼容格式）或 compact（结构化字段，由前端渲染）
+    fmt = models.parse_format(request.args.get('format'))
+    if fmt is None:
+        return None, None, None, None, None, (jsonify({'error': f'无效的结果格式，可选值: {", ".join(models.FORMATS)}'}), 400)
 
-    if not query:
-        return jsonify({'error': '搜索查询不能为空'}), 400
+    # 重排方式：none（默认，保持搜索引擎的顺序）或 bm25（见 search_engines/rerank.py）
+    if rerank.parse_method(request.args.get('rerank')) is None:
+        return None, None, None, None, None, (jsonify({'error': f'无效的重排方式，可选值: {", ".join(rerank.METHODS)}'}), 400)
+
+    # 获取搜索引擎的额外参数
+    params = dispatcher.parse_params(engine, request.args)
+
+    # nocache=1 或 Cache-Control: no-cache 时跳过缓存读取（结果仍会写入缓存）
+    bypass_cache = (request.args.get('nocache', '').lower() in ('1', 'true')
+                    or 'no-cache' in request.headers.get('Cache-Control', ''))
+    return engine, query, params, bypass_cache, fmt, None
+
+def _search_error_response(engine, e):
+    """搜索过程中出现异常时的错误响应"""
+    engine_name = dispatcher.ENGINE_NAMES[engine]
+
+    if isinstance(e, breaker.CircuitOpenError):
+        # 熔断器打开且没有可用的缓存结果时快速失败
+        logger.warning('%s', e, extra={'engine': engine})
+        response = jsonify({'error': f'{engine_name} 暂时不可用', 'message': str(e)})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(int(e.retry_after) + 1)
+        return response
+
+    if isinstance(e, ratelimit.RateLimitError):
+        # 上游限流排队超时或队列已满
+        logger.warning('%s', e, extra={'engine': engine})
+        response = jsonify({'error': f'{engine_name} 请求过于频繁', 'message': str(e)})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(int(e.retry_after) + 1)
+        return response
+
+    # 记录错误
+    logger.exception('%s 搜索API错误: %s', engine_name, e, extra={'engine': engine})
+
+    # 返回错误信息
+    error_response = {
+        'error': f'{engine_name} 搜索请求失败',
+        'message': str(e)
+    }
+
+    return jsonify(error_response), 500
+
+def _no_store(response):
+    """添加禁止缓存的响应头"""
+    response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
+    response.headers['Pragma'] = 'no-cache'
+    response.headers['Expires'] = '0'
+    return response
+
+@app.route('/api/search')
+def search():
+    """搜索API端点"""
+    engine, query, params, bypass_cache, fmt, error_response = _parse_search_request()
+    if error_response is not None:
+        return error_response
 
     try:
-        print(f'发送搜索请求: {query}, 搜索引擎: {engine}')
-
-        # 根据选择的搜索引擎调用相应的模块
-        if engine == 'bochaai':
-            # 获取Bocha AI的额外参数
-            freshness = request.args.get('freshness', None)
-            summary_param = request.args.get('summary', None)
-            count_param = request.args.get('count', None)
-            page_param = request.args.get('page', None)
-
-            # 处理布尔类型参数
-            summary = None
-            if summary_param is not None:
-                summary = summary_param.lower() == 'true'
-
-            # 处理整数类型参数
-            count = None
-            if count_param is not None:
-                try:
-                    count = int(count_param)
-                except ValueError:
-                    pass
-
-            page = None
-            if page_param is not None:
-                try:
-                    page = int(page_param)
-                except ValueError:
-                    pass
-
-            # 调用Bocha AI搜索引擎并传递所有参数
-            result = bochaai.search(query, freshness, summary, count, page)
-        elif engine == 'searxng':
-            # 获取SearXNG的额外参数
-            engines = request.args.get('engines', None)  # 要使用的搜索引擎，用逗号分隔
-            language = request.args.get('language', 'auto')  # 语言
-            safesearch_param = request.args.get('safesearch', '1')  # 安全搜索级别
-            time_range = request.args.get('time_range', None)  # 时间范围
-            count_param = request.args.get('count', None)  # 结果数量
-
-            # 处理整数类型参数
-            safesearch = 1  # 默认值
-            try:
-                safesearch = int(safesearch_param)
-            except ValueError:
-                pass
-
-            count = None
-            if count_param is not None:
-                try:
-                    count = int(count_param)
-                except ValueError:
-                    pass
-
-            # 调用SearXNG搜索引擎并传递所有参数
-            result = searxng.search(query, engines, language, safesearch, time_range, count)
-        else:
-            # 调用智谱AI搜索引擎
-            # 智谱AI搜索引擎不支持高级选项
-            result = zhipuai.search(query, engine)
+        # 根据选择的搜索引擎调用相应的模块（engine=all 时并发查询所有已配置的搜索引擎）
+        with log.Timer() as timer:
+            result, cache_status = dispatcher.cached_search(engine, query, params, bypass_cache)
+        logger.info('搜索请求: %s', query, extra={'engine': engine, 'cache': cache_status, 'elapsed_ms': timer.elapsed_ms})
+        result = dispatcher.finish_request(engine, result, cache_status, timer.elapsed)
+        result = rerank.apply(engine, result, query, params['rerank'])
 
         # 检查是否有错误
         if 'error' in result:
-            return jsonify(result), 500
+            return jsonify(models.serialize(result, fmt)), 500
+        dispatcher.record_search(engine, query, params, result, timer.elapsed)
 
-        # 创建响应并添加缓存控制头
-        response = make_response(jsonify(result))
-        response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
+        # 创建响应并添加缓存控制头（未经合并和重排的结果复用缓存中已编码的 search_result）
+        with metrics.SERIALIZATION_LATENCY.labels(engine).time():
+            body = models.encode(result, fmt, reuse=engine != 'all' and params['rerank'] == rerank.NONE)
+        response = app.response_class(body, mimetype='application/json')
+        metrics.RESPONSE_SIZE.labels(engine).observe(response.content_length or 0)
+        _no_store(response)
+        response.headers['X-Cache'] = cache_status
         return response
 
     except Exception as e:
-        # 记录错误
-        if engine == 'bochaai':
-            engine_name = 'Bocha AI'
-        elif engine == 'searxng':
-            engine_name = 'SearXNG'
-        else:
-            engine_name = '智谱AI'
-        print(f'{engine_name} 搜索API错误: {str(e)}')
-
-        # 返回错误信息
-        error_response = {
-            'error': f'{engine_name} 搜索请求失败',
-            'message': str(e)
+        return _search_error_response(engine, e)
+
+@app.route('/api/search/stream')
+def search_stream():
+    """流式搜索API端点，参数与 /api/search 相同，以NDJSON逐步返回结果（见 search_engines/streaming.py）"""
+    engine, query, params, bypass_cache, fmt, error_response = _parse_search_request()
+    if error_response is not None:
+        return error_response
+
+    if engine == 'all':
+        events = streaming.federated_events(query, params, bypass_cache, fmt)
+    else:
+        # 单个搜索引擎在开始输出前完成搜索，出错时仍可返回相应的状态码
+        try:
+            with log.Timer() as timer:
+                result, cache_status = dispatcher.cached_search(engine, query, params, bypass_cache)
+            logger.info('搜索请求: %s', query, extra={'engine': engine, 'cache': cache_status, 'elapsed_ms': timer.elapsed_ms})
+            result = dispatcher.finish_request(engine, result, cache_status, timer.elapsed)
+            result = rerank.apply(engine, result, query, params['rerank'])
+        except Exception as e:
+            return _search_error_response(engine, e)
+
+        if 'error' in result:
+            return jsonify(models.serialize(result, fmt)), 500
+        dispatcher.record_search(engine, query, params, result, timer.elapsed)
+        events = streaming.single_events(engine, query, result, cache_status, fmt)
+
+    body = stream_with_context(streaming.encode(event) for event in events)
+    response = _no_store(Response(body, mimetype='application/x-ndjson'))
+    # 禁止反向代理缓冲，使每个事件立即到达浏览器
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/search/batch', methods=['POST'])
+def search_batch():
+    """批量搜索API端点，请求格式见 search_engines/batch.py"""
+    payload = request.get_json(silent=True)
+    items, error = batch.parse_request(payload)
+    if error:
+        return jsonify({'error': error}), 400
+
+    fmt = models.parse_format(payload.get('format') or request.args.get('format'))
+    if fmt is None:
+        return jsonify({'error': f'无效的结果格式，可选值: {", ".join(models.FORMATS)}'}), 400
+
+    bypass_cache = (str(payload.get('nocache', '')).lower() in ('1', 'true')
+                    or 'no-cache' in request.headers.get('Cache-Control', ''))
+    futures = batch.submit(items, bypass_cache, fmt)
+
+    # stream=true 时每个查询完成后（按提交顺序）立即输出一行
+    if str(payload.get('stream', request.args.get('stream', ''))).lower() in ('1', 'true'):
+        body = stream_with_context(streaming.encode(entry) for entry in batch.iter_results(futures))
+        response = _no_store(Response(body, mimetype='application/x-ndjson'))
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+    results = list(batch.iter_results(futures))
+    return _no_store(jsonify({
+        'count': len(results),
+        'errors': sum(1 for entry in results if entry['status'] != 'ok'),
+        'results': results
+    }))
+
+@app.route('/api/suggest')
+def search_suggest():
+    """搜索建议API端点：返回以 query 开头的查询补全（见 search_engines/suggest.py）"""
+    query = request.args.get('query', '')
+    with log.Timer() as timer:
+        suggestions = suggest.index.complete(query, request.args.get('limit', type=int))
+    response = jsonify({'query': query, 'suggestions': suggestions})
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Server-Timing'] = f'suggest;dur={timer.elapsed * 1000:.3f}'
+    return response
+
+@app.route('/api/cache/stats')
+def cache_stats():
+    """搜索结果缓存统计信息"""
+    stats = cache.result_cache.stats()
+    if warmer.warmer is not None:
+        stats['warming'] = warmer.warmer.stats()
+    return jsonify(stats)
+
+@app.route('/api/health')
+def health():
+    """健康检查：各搜索引擎的配置情况、熔断器状态、当前超时时间和限流状态"""
+    configured = dispatcher.configured_engines()
+    engines = {}
+    for engine in dispatcher.ENGINE_PARAMS:
+        engines[engine] = {
+            'name': dispatcher.ENGINE_NAMES[engine],
+            'configured': engine in configured,
+            **breaker.get(engine).snapshot()
         }
+        rate_limit = ratelimit.snapshot(engine)
+        if rate_limit is not None:
+            engines[engine]['rateLimit'] = rate_limit
+    engines['searxng']['instances'] = searxng.pool_snapshot()
+    degraded = any(info['configured'] and info['state'] != breaker.CLOSED for info in engines.values())
+    return jsonify({'status': 'degraded' if degraded else 'ok', 'engines': engines})
 
-        return jsonify(error_response), 500
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus 指标"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
 
 if __name__ == '__main__':
     # 获取端口，默认为5000
     port = int(os.getenv('PORT', 5000))
 
-    # 启动服务器
-    app.run(host='0.0.0.0', port=port, debug=True)
+    # 启动开发服务器（生产环境请使用 gunicorn -c gunicorn.conf.py）
+    app.run(host='0.0.0.0', port=port, debug=env_bool('FLASK_DEBUG', True))
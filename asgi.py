@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+搜索引擎 - ASGI版本
+
+/api/search 和 /api/search/stream 由异步搜索引擎模块处理，等待上游响应时不占用线程，
+单个进程即可同时处理大量进行中的搜索请求；其他路径交给 Flask 应用处理。
+
+启动方式:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+
+import time
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app as flask_app
+from search_engines import dispatcher, http_client, log, metrics, breaker, ratelimit, streaming, models, rerank, codec
+from search_engines.config import env_int
+import static_assets
+
+logger = log.get_logger(__name__)
+
+# 与 Flask 版本一致的响应头
+_NO_STORE_HEADERS = [
+    (b'cache-control', b'no-store, no-cache, must-revalidate, max-age=0'),
+    (b'pragma', b'no-cache'),
+    (b'expires', b'0')
+]
+
+# 其他路径交给 Flask 应用处理（在线程池中执行）
+_wsgi_app = WsgiToAsgi(flask_app)
+
+async def _send_json(send, status, data, headers=None, accept_encoding=None):
+    """发送JSON响应，data 为 bytes 时是已编码的JSON
+
+    指定 accept_encoding 时与 Flask 应用一样压缩较大的响应（见 static_assets.compress_json_response）。
+    """
+    body = data if isinstance(data, bytes) else codec.dumps(data, default=flask_app.json.default)
+
+    response_headers = [(b'content-type', b'application/json'), (b'access-control-allow-origin', b'*')]
+    min_size = env_int('COMPRESS_MIN_SIZE', 1024)
+    if accept_encoding is not None and status == 200 and 0 < min_size <= len(body):
+        response_headers.append((b'vary', b'Accept-Encoding'))
+        encoding = static_assets.negotiate(accept_encoding)
+        if encoding:
+            body = static_assets.compress_body(body, encoding)
+            response_headers.append((b'content-encoding', encoding.encode('ascii')))
+    response_headers.append((b'content-length', str(len(body)).encode('ascii')))
+    response_headers.extend(headers or [])
+    await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+def _parse_request(scope):
+    """解析查询参数和请求头，开始请求（设置请求ID）
+
+    Returns:
+        tuple: (查询参数, 请求头, 带有请求ID的响应头)
+    """
+    # 与 request.args.get 一致，重复参数取第一个值
+    args = {key: values[0] for key, values in parse_qs(scope['query_string'].decode('latin-1')).items()}
+    request_headers = {key.decode('latin-1').lower(): value.decode('latin-1') for key, value in scope['headers']}
+
+    request_id = log.begin_request(request_headers.get('x-request-id'))
+    return args, request_headers, [(b'x-request-id', request_id.encode('latin-1'))]
+
+async def _cached_search(send, engine, query, params, bypass_cache, fmt, id_header):
+    """执行搜索，出错时发送错误响应（search_result 按 fmt 格式输出）并返回None
+
+    Returns:
+        tuple|None: (经过 finish_request() 处理的搜索结果, 缓存状态)
+    """
+    try:
+        with log.Timer() as timer:
+            result, cache_status = await dispatcher.async_cached_search(engine, query, params, bypass_cache)
+        logger.info('搜索请求: %s', query, extra={'engine': engine, 'cache': cache_status, 'elapsed_ms': timer.elapsed_ms})
+        result = dispatcher.finish_request(engine, result, cache_status, timer.elapsed)
+        result = rerank.apply(engine, result, query, params['rerank'])
+    except breaker.CircuitOpenError as e:
+        logger.warning('%s', e, extra={'engine': engine})
+        retry_after = [(b'retry-after', str(int(e.retry_after) + 1).encode('ascii'))]
+        await _send_json(send, 503, {'error': f'{dispatcher.ENGINE_NAMES[engine]} 暂时不可用', 'message': str(e)},
+                         id_header + retry_after)
+        return None
+    except ratelimit.RateLimitError as e:
+        logger.warning('%s', e, extra={'engine': engine})
+        retry_after = [(b'retry-after', str(int(e.retry_after) + 1).encode('ascii'))]
+        await _send_json(send, 429, {'error': f'{dispatcher.ENGINE_NAMES[engine]} 请求过于频繁', 'message': str(e)},
+                         id_header + retry_after)
+        return None
+    except Exception as e:
+        engine_name = dispatcher.ENGINE_NAMES[engine]
+        logger.exception('%s 搜索API错误: %s', engine_name, e, extra={'engine': engine})
+        await _send_json(send, 500, {'error': f'{engine_name} 搜索请求失败', 'message': str(e)}, id_header)
+        return None
+
+    if 'error' in result:
+        await _send_json(send, 500, models.serialize(result, fmt), id_header)
+        return None
+    dispatcher.record_search(engine, query, params, result, timer.elapsed)
+    return result, cache_status
+
+def _search_params(args, request_headers):
+    """返回 (搜索引擎, 搜索查询, 额外参数, 是否跳过缓存, 结果格式, 校验错误)"""
+    query = args.get('query', '')
+    engine = args.get('engine', 'search_std')  # 默认使用智谱基础搜索
+
+    # 验证搜索引擎和搜索查询
+    error = dispatcher.validate(engine, query)
+    if error:
+        return engine, query, None, None, None, error
+
+    fmt = models.parse_format(args.get('format'))
+    if fmt is None:
+        return engine, query, None, None, None, f'无效的结果格式，可选值: {", ".join(models.FORMATS)}'
+    if rerank.parse_method(args.get('rerank')) is None:
+        return engine, query, None, None, None, f'无效的重排方式，可选值: {", ".join(rerank.METHODS)}'
+
+    params = dispatcher.parse_params(engine, args)
+    bypass_cache = (args.get('nocache', '').lower() in ('1', 'true')
+                    or 'no-cache' in request_headers.get('cache-control', ''))
+    return engine, query, params, bypass_cache, fmt, None
+
+async def search(scope, send):
+    """搜索API端点（异步版本），参数和响应与 app.search 相同"""
+    args, request_headers, id_header = _parse_request(scope)
+    engine, query, params, bypass_cache, fmt, error = _search_params(args, request_headers)
+    if error:
+        await _send_json(send, 400, {'error': error}, id_header)
+        return
+
+    searched = await _cached_search(send, engine, query, params, bypass_cache, fmt, id_header)
+    if searched is None:
+        return
+    result, cache_status = searched
+
+    # 未经合并和重排的结果复用缓存中已编码的 search_result
+    start = time.perf_counter()
+    body = models.encode(result, fmt, reuse=engine != 'all' and params['rerank'] == rerank.NONE)
+    metrics.SERIALIZATION_LATENCY.labels(engine).observe(time.perf_counter() - start)
+    metrics.RESPONSE_SIZE.labels(engine).observe(len(body))
+    await _send_json(send, 200, body, _NO_STORE_HEADERS + id_header + [(b'x-cache', cache_status.encode('ascii'))],
+                     request_headers.get('accept-encoding', ''))
+
+async def search_stream(scope, send):
+    """流式搜索API端点（异步版本），参数和响应与 app.search_stream 相同"""
+    args, request_headers, id_header = _parse_request(scope)
+    engine, query, params, bypass_cache, fmt, error = _search_params(args, request_headers)
+    if error:
+        await _send_json(send, 400, {'error': error}, id_header)
+        return
+
+    if engine != 'all':
+        searched = await _cached_search(send, engine, query, params, bypass_cache, fmt, id_header)
+        if searched is None:
+            return
+        result, cache_status = searched
+
+    response_headers = [
+        (b'content-type', b'application/x-ndjson'),
+        (b'access-control-allow-origin', b'*'),
+        (b'x-accel-buffering', b'no')
+    ]
+    await send({'type': 'http.response.start', 'status': 200,
+                'headers': response_headers + _NO_STORE_HEADERS + id_header})
+
+    if engine == 'all':
+        async for event in streaming.async_federated_events(query, params, bypass_cache, fmt):
+            await send({'type': 'http.response.body', 'body': streaming.encode(event), 'more_body': True})
+    else:
+        for event in streaming.single_events(engine, query, result, cache_status, fmt):
+            await send({'type': 'http.response.body', 'body': streaming.encode(event), 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+async def _lifespan(receive, send):
+    """处理ASGI生命周期事件，关闭时释放异步HTTP客户端"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await http_client.aclose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    """ASGI应用入口"""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        if scope['path'] == '/api/search':
+            await search(scope, send)
+            return
+        if scope['path'] == '/api/search/stream':
+            await search_stream(scope, send)
+            return
+
+    await _wsgi_app(scope, receive, send)
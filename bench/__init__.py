@@ -0,0 +1,12 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+离线性能测试
+
+- mock_upstreams：模拟智谱AI、Bocha AI 和 SearXNG 的本地服务，延迟分布和错误率可配置
+- loadgen：并发请求 /api/search 的负载生成器
+- run：启动模拟服务和应用服务器，执行负载测试并输出 JSON 结果
+
+在项目根目录运行，如 python -m bench.run --duration 30 --output bench.json
+"""
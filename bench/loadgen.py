@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+/api/search 负载生成器
+
+固定数量的并发连接（keep-alive）在指定时间内不断请求 /api/search，统计延迟分位数、吞吐量、
+状态码和缓存状态（X-Cache）。查询从固定的查询集中按 Zipf 分布抽取，少数热门查询占大部分请求，
+与真实流量的缓存命中情况相近；--nocache 时跳过缓存读取，每个请求都经过上游。
+
+    python -m bench.loadgen --url http://127.0.0.1:5000 --concurrency 32 --duration 30 --engines searxng,bochaai
+"""
+
+import json
+import time
+import random
+import bisect
+import argparse
+import threading
+import http.client
+from urllib.parse import urlsplit, urlencode
+
+# 组合生成查询集的词
+_TOPICS = ('python', 'flask', '机器学习', '深度学习', 'docker', 'kubernetes', '数据库', 'redis', '前端', 'react',
+           '算法', '操作系统', '网络协议', 'rust', 'golang', '大模型', '搜索引擎', '分布式系统', 'linux', 'nginx')
+_SUFFIXES = ('', '教程', '入门', '性能优化', '面试题', '最佳实践', 'tutorial', 'vs', '源码', '原理', '配置', '报错')
+
+def build_queries(size, seed=0):
+    """生成 size 个不同的查询（中文、英文和中英文混合）"""
+    rng = random.Random(seed)
+    queries = []
+    seen = set()
+    while len(queries) < size:
+        topic = rng.choice(_TOPICS)
+        suffix = rng.choice(_SUFFIXES)
+        query = f'{topic} {suffix}'.strip() if suffix != 'vs' else f'{topic} vs {rng.choice(_TOPICS)}'
+        if len(seen) >= len(_TOPICS) * len(_SUFFIXES):
+            query = f'{query} {len(queries)}'
+        if query not in seen:
+            seen.add(query)
+            queries.append(query)
+    return queries
+
+class ZipfSampler:
+    """按 Zipf 分布（第 k 个的概率与 1/k^s 成正比）抽取元素"""
+
+    def __init__(self, items, exponent=1.0):
+        self.items = items
+        total = 0.0
+        self._cumulative = []
+        for rank in range(1, len(items) + 1):
+            total += 1.0 / rank ** exponent
+            self._cumulative.append(total)
+
+    def sample(self, rng):
+        return self.items[bisect.bisect_left(self._cumulative, rng.random() * self._cumulative[-1])]
+
+def percentile(values, fraction):
+    """已排序的列表的分位数（最近秩法）"""
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))
+    return values[index]
+
+def summarize(latencies):
+    """延迟（秒）列表的统计（毫秒）"""
+    values = sorted(latencies)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values) * 1000, 2),
+        'p50': round(percentile(values, 0.50) * 1000, 2),
+        'p90': round(percentile(values, 0.90) * 1000, 2),
+        'p95': round(percentile(values, 0.95) * 1000, 2),
+        'p99': round(percentile(values, 0.99) * 1000, 2),
+        'max': round(values[-1] * 1000, 2)
+    }
+
+class _Worker(threading.Thread):
+    """一个并发连接，请求直到截止时间"""
+
+    def __init__(self, target, plan, seed):
+        super().__init__(daemon=True)
+        self.target = target
+        self.plan = plan
+        self.rng = random.Random(seed)
+        # (开始时间, 搜索引擎, 耗时, 状态码, 缓存状态, 响应大小)
+        self.samples = []
+        self.failures = 0
+
+    def _connect(self):
+        return http.client.HTTPConnection(self.target.hostname, self.target.port or 80, timeout=self.plan['timeout'])
+
+    def run(self):
+        conn = self._connect()
+        while time.perf_counter() < self.plan['deadline']:
+            engine = self.rng.choice(self.plan['engines'])
+            params = {'engine': engine, 'query': self.plan['sampler'].sample(self.rng), **self.plan['params']}
+            start = time.perf_counter()
+            try:
+                conn.request('GET', f'{self.target.path}/api/search?{urlencode(params)}')
+                response = conn.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException):
+                self.failures += 1
+                conn.close()
+                conn = self._connect()
+                continue
+            self.samples.append((start, engine, time.perf_counter() - start, response.status,
+                                 response.getheader('X-Cache', ''), len(body)))
+        conn.close()
+
+def run(url, engines, concurrency=16, duration=10.0, warmup=0.0, queries=200, zipf=1.0, nocache=False,
+        params=None, timeout=60.0, seed=0):
+    """执行负载测试
+
+    Args:
+        url (str): 应用地址，如 http://127.0.0.1:5000
+        engines (list): 请求的搜索引擎，每个请求随机选择一个
+        concurrency (int): 并发连接数
+        duration (float): 计入统计的测试时间（秒）
+        warmup (float): 开始统计前的预热时间（秒）
+        queries (int): 查询集大小
+        zipf (float): Zipf 分布的指数，越大热门查询越集中
+        nocache (bool): 是否跳过缓存读取
+        params (dict, optional): 额外的请求参数，如 {'format': 'compact'}
+        timeout (float): 单个请求的超时时间（秒）
+        seed (int): 随机种子
+
+    Returns:
+        dict: 统计结果
+    """
+    extra = dict(params or {})
+    if nocache:
+        extra['nocache'] = '1'
+    start = time.perf_counter()
+    measure_from = start + warmup
+    plan = {
+        'engines': list(engines),
+        'sampler': ZipfSampler(build_queries(queries, seed), zipf),
+        'params': extra,
+        'timeout': timeout,
+        'deadline': measure_from + duration
+    }
+    target = urlsplit(url.rstrip('/'))
+    workers = [_Worker(target, plan, seed * 1000 + index) for index in range(concurrency)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    samples = [sample for worker in workers for sample in worker.samples if sample[0] >= measure_from]
+    elapsed = max(time.perf_counter() - measure_from, 1e-9)
+    status = {}
+    cache = {}
+    for _, _, _, code, cache_status, _ in samples:
+        status[str(code)] = status.get(str(code), 0) + 1
+        if cache_status:
+            cache[cache_status] = cache.get(cache_status, 0) + 1
+    ok = [sample for sample in samples if sample[3] == 200]
+    return {
+        'requests': len(samples),
+        'errors': len(samples) - len(ok) + sum(worker.failures for worker in workers),
+        'rps': round(len(samples) / elapsed, 2),
+        'latency_ms': summarize([sample[2] for sample in samples]),
+        'engines': {
+            engine: summarize([sample[2] for sample in samples if sample[1] == engine]) for engine in plan['engines']
+        },
+        'status': status,
+        'cache': cache,
+        'mean_response_bytes': round(sum(sample[5] for sample in ok) / len(ok)) if ok else 0
+    }
+
+def add_arguments(parser):
+    """添加负载参数"""
+    parser.add_argument('--engines', default='search_std,bochaai,searxng', help='逗号分隔的搜索引擎')
+    parser.add_argument('--concurrency', type=int, default=16, help='并发连接数，默认16')
+    parser.add_argument('--duration', type=float, default=10, help='计入统计的测试时间（秒），默认10')
+    parser.add_argument('--warmup', type=float, default=2, help='开始统计前的预热时间（秒），默认2')
+    parser.add_argument('--queries', type=int, default=200, help='查询集大小，默认200')
+    parser.add_argument('--zipf', type=float, default=1.0, help='查询热度的 Zipf 指数，默认1.0')
+    parser.add_argument('--nocache', action='store_true', help='跳过缓存读取（每个请求都经过上游）')
+    parser.add_argument('--format', default=None, help='结果格式 zhipu 或 compact')
+    parser.add_argument('--timeout', type=float, default=60, help='单个请求的超时时间（秒），默认60')
+    parser.add_argument('--seed', type=int, default=0)
+
+def run_from_args(url, args):
+    """按命令行参数执行负载测试"""
+    return run(
+        url, [engine for engine in args.engines.split(',') if engine], concurrency=args.concurrency,
+        duration=args.duration, warmup=args.warmup, queries=args.queries, zipf=args.zipf, nocache=args.nocache,
+        params={'format': args.format} if args.format else None, timeout=args.timeout, seed=args.seed
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description='/api/search 负载生成器')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='应用地址')
+    add_arguments(parser)
+    args = parser.parse_args()
+    print(json.dumps(run_from_args(args.url, args), ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+上游搜索引擎模拟服务
+
+在本地模拟各上游API的响应结构，不消耗API配额即可测试应用的吞吐量和延迟：
+
+    POST /zhipu/api/paas/v4/web_search   智谱AI web_search（search_intent、search_result）
+    POST /bocha/v1/web-search            Bocha AI（data.webPages、data.images、data.videos），支持 count 和 page
+    GET  /searxng/search?format=json     SearXNG（results、suggestions、answers 等），支持 pageno
+
+相同的查询总是返回相同的结果。每个请求的延迟服从对数正态分布（中位数 latency 毫秒，对数标准差 jitter），
+error_rate 比例的请求返回 HTTP 500。启动方式:
+
+    python -m bench.mock_upstreams --port 8900 --latency 200 --jitter 0.5 --error-rate 0.01 \\
+        --bocha-latency 400 --searxng-error-rate 0.05
+
+应用的对应配置:
+
+    ZHIPUAI_API_URL=http://127.0.0.1:8900/zhipu/api/paas/v4/web_search
+    BOCHAAI_API_URL=http://127.0.0.1:8900/bocha/v1/web-search
+    SEARXNG_API_HOST=http://127.0.0.1:8900/searxng
+"""
+
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 模拟的上游
+UPSTREAMS = ('zhipu', 'bocha', 'searxng')
+
+# 请求路径 -> 上游
+PATHS = {
+    '/zhipu/api/paas/v4/web_search': 'zhipu',
+    '/bocha/v1/web-search': 'bocha',
+    '/searxng/search': 'searxng'
+}
+
+# 每页结果数：智谱AI固定返回的条数、Bocha AI 默认的 count、SearXNG 每页的条数
+ZHIPU_RESULTS = 10
+BOCHA_DEFAULT_COUNT = 10
+SEARXNG_PAGE_SIZE = 20
+
+_SITES = ('zhihu.com', 'csdn.net', 'github.com', 'baike.baidu.com', 'jianshu.com', 'stackoverflow.com',
+          'juejin.cn', 'cnblogs.com', 'developer.mozilla.org', 'docs.python.org', 'sohu.com', 'sina.com.cn')
+_WORDS = ('教程', '入门', '原理', '实践', '性能', '优化', '指南', '总结', '示例', '最佳实践', '常见问题', '源码分析',
+          'tutorial', 'guide', 'performance', 'example', 'overview', 'reference')
+_SENTENCE = ('{q}是近年来讨论较多的话题。本文从{w1}和{w2}两个方面介绍{q}的基本概念、典型用法以及在实际项目中的注意事项，'
+             '并给出了完整的{w3}，适合初学者和有一定经验的开发者参考。')
+
+class Profile:
+    """单个上游的延迟和错误率
+
+    Attributes:
+        latency (float): 延迟中位数（毫秒）
+        jitter (float): 对数正态分布的对数标准差，0表示固定延迟
+        error_rate (float): 返回 HTTP 500 的请求比例
+    """
+
+    __slots__ = ('latency', 'jitter', 'error_rate')
+
+    def __init__(self, latency=100.0, jitter=0.3, error_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    def delay(self, rng):
+        """随机抽取一次请求的延迟（秒）"""
+        if self.latency <= 0:
+            return 0.0
+        return self.latency * rng.lognormvariate(0, self.jitter) / 1000 if self.jitter > 0 else self.latency / 1000
+
+def _rng(*parts):
+    """以查询等参数为种子的随机数生成器，相同的请求得到相同的结果"""
+    seed = hashlib.blake2b('\x00'.join(str(part) for part in parts).encode('utf-8'), digest_size=8).digest()
+    return random.Random(int.from_bytes(seed, 'big'))
+
+def _item(query, rng, index):
+    """生成一条通用的结果（标题、链接、摘要等）"""
+    site = rng.choice(_SITES)
+    words = rng.sample(_WORDS, 3)
+    path = hashlib.md5(f'{query}/{index}'.encode('utf-8')).hexdigest()[:12]
+    return {
+        'title': f'{query} {words[0]}：{words[1]}与{words[2]}',
+        'url': f'https://www.{site}/p/{path}',
+        'site': site,
+        'snippet': _SENTENCE.format(q=query, w1=words[0], w2=words[1], w3=words[2]) * rng.randint(1, 2),
+        'date': f'2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T08:00:00+08:00'
+    }
+
+def zhipu_response(query):
+    """智谱AI web_search 的响应"""
+    rng = _rng('zhipu', query)
+    results = []
+    for index in range(ZHIPU_RESULTS):
+        item = _item(query, rng, index)
+        results.append({
+            'title': item['title'],
+            'content': item['snippet'],
+            'link': item['url'],
+            'media': item['site'],
+            'icon': f'https://{item["site"]}/favicon.ico',
+            'refer': f'ref_{index + 1}',
+            'publish_date': item['date'][:10]
+        })
+    return {
+        'id': f'mock-{rng.getrandbits(48):x}',
+        'created': int(time.time()),
+        'request_id': f'mock-{rng.getrandbits(48):x}',
+        'search_intent': [{'query': query, 'intent': 'SEARCH_ALL', 'keywords': query}],
+        'search_result': results
+    }
+
+def bocha_response(query, count=None, page=None):
+    """Bocha AI v1/web-search 的响应"""
+    count = max(1, min(50, count or BOCHA_DEFAULT_COUNT))
+    page = max(1, page or 1)
+    rng = _rng('bocha', query, page, count)
+    pages = []
+    for index in range((page - 1) * count, page * count):
+        item = _item(query, rng, index)
+        pages.append({
+            'id': f'https://api.bochaai.com/v1/#WebPages.{index}',
+            'name': item['title'],
+            'url': item['url'],
+            'displayUrl': item['url'],
+            'snippet': item['snippet'][:120],
+            'summary': item['snippet'],
+            'siteName': item['site'],
+            'siteIcon': f'https://th.bochaai.com/favicon?domain_url={item["site"]}',
+            'datePublished': item['date'],
+            'dateLastCrawled': item['date'],
+            'cachedPageUrl': None,
+            'language': None,
+            'isFamilyFriendly': None,
+            'isNavigational': None
+        })
+    images = [{
+        'webSearchUrl': None,
+        'name': None,
+        'thumbnailUrl': f'https://img.example.com/{query_index}.jpg',
+        'datePublished': None,
+        'contentUrl': f'https://img.example.com/{query_index}.jpg',
+        'hostPageUrl': pages[query_index % len(pages)]['url'],
+        'contentSize': None,
+        'encodingFormat': None,
+        'hostPageDisplayUrl': pages[query_index % len(pages)]['url'],
+        'width': 600,
+        'height': 400,
+        'thumbnail': None
+    } for query_index in range(min(5, count))]
+    return {
+        'code': 200,
+        'log_id': f'{rng.getrandbits(64):x}',
+        'msg': None,
+        'data': {
+            '_type': 'SearchResponse',
+            'queryContext': {'originalQuery': query},
+            'webPages': {
+                'webSearchUrl': f'https://bochaai.com/search?q={query}',
+                'totalEstimatedMatches': 10000000,
+                'value': pages,
+                'someResultsRemoved': True
+            },
+            'images': {'id': None, 'readLink': None, 'webSearchUrl': None, 'value': images, 'isFamilyFriendly': None},
+            'videos': None
+        }
+    }
+
+def searxng_response(query, pageno=1):
+    """SearXNG /search?format=json 的响应"""
+    pageno = max(1, pageno or 1)
+    rng = _rng('searxng', query, pageno)
+    results = []
+    for index in range((pageno - 1) * SEARXNG_PAGE_SIZE, pageno * SEARXNG_PAGE_SIZE):
+        item = _item(query, rng, index)
+        engines = rng.sample(('google', 'bing', 'duckduckgo', 'brave', 'startpage'), rng.randint(1, 3))
+        results.append({
+            'url': item['url'],
+            'title': item['title'],
+            'content': item['snippet'],
+            'publishedDate': item['date'] if rng.random() < 0.3 else None,
+            'thumbnail': None,
+            'engine': engines[0],
+            'template': 'default.html',
+            'parsed_url': ['https', f'www.{item["site"]}', urlsplit(item['url']).path, '', '', ''],
+            'img_src': '',
+            'priority': '',
+            'engines': engines,
+            'positions': [index % SEARXNG_PAGE_SIZE + 1] * len(engines),
+            'score': round(len(engines) / (index + 1), 4),
+            'category': 'general'
+        })
+    return {
+        'query': query,
+        'number_of_results': 0,
+        'results': results,
+        'answers': [],
+        'corrections': [],
+        'infoboxes': [],
+        'suggestions': [f'{query} {word}' for word in rng.sample(_WORDS, 4)],
+        'unresponsive_engines': []
+    }
+
+class MockServer(ThreadingHTTPServer):
+    """模拟服务，profiles 为各上游的延迟和错误率"""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, profiles):
+        super().__init__(address, _Handler)
+        self.profiles = profiles
+        self.requests = {name: 0 for name in UPSTREAMS}
+        self.errors = {name: 0 for name in UPSTREAMS}
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+
+    def decide(self, upstream):
+        """抽取本次请求的延迟和是否返回错误"""
+        profile = self.profiles[upstream]
+        with self._lock:
+            delay = profile.delay(self._rng)
+            failed = self._rng.random() < profile.error_rate
+            self.requests[upstream] += 1
+            if failed:
+                self.errors[upstream] += 1
+        return delay, failed
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, upstream, build):
+        delay, failed = self.server.decide(upstream)
+        if delay:
+            time.sleep(delay)
+        if failed:
+            self._send(500, {'error': {'code': '500', 'message': 'mock upstream error'}})
+        else:
+            self._send(200, build())
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if PATHS.get(parts.path) != 'searxng':
+            self._send(404, {'error': 'not found'})
+            return
+        args = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        self._handle('searxng', lambda: searxng_response(args.get('q', ''), _int(args.get('pageno'))))
+
+    def do_POST(self):
+        upstream = PATHS.get(urlsplit(self.path).path)
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            payload = {}
+        if upstream == 'zhipu':
+            self._handle('zhipu', lambda: zhipu_response(payload.get('search_query', '')))
+        elif upstream == 'bocha':
+            self._handle('bocha', lambda: bocha_response(
+                payload.get('query', ''), _int(payload.get('count')), _int(payload.get('page'))))
+        else:
+            self._send(404, {'error': 'not found'})
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def upstream_env(base_url):
+    """返回使应用请求模拟服务的环境变量"""
+    return {
+        'ZHIPUAI_API_URL': f'{base_url}/zhipu/api/paas/v4/web_search',
+        'BOCHAAI_API_URL': f'{base_url}/bocha/v1/web-search',
+        'SEARXNG_API_HOST': f'{base_url}/searxng'
+    }
+
+def add_arguments(parser):
+    """添加延迟和错误率参数：全局的 --latency 等，以及每个上游的 --<upstream>-latency 等"""
+    parser.add_argument('--latency', type=float, default=100, help='上游延迟中位数（毫秒），默认100')
+    parser.add_argument('--jitter', type=float, default=0.3, help='延迟的对数标准差，默认0.3')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 HTTP 500 的比例，默认0')
+    for upstream in UPSTREAMS:
+        parser.add_argument(f'--{upstream}-latency', type=float)
+        parser.add_argument(f'--{upstream}-jitter', type=float)
+        parser.add_argument(f'--{upstream}-error-rate', type=float)
+
+def profiles_from_args(args):
+    """根据命令行参数返回各上游的 Profile"""
+    profiles = {}
+    for upstream in UPSTREAMS:
+        values = {}
+        for field in ('latency', 'jitter', 'error_rate'):
+            value = getattr(args, f'{upstream}_{field}')
+            values[field] = getattr(args, field) if value is None else value
+        profiles[upstream] = Profile(**values)
+    return profiles
+
+def main():
+    parser = argparse.ArgumentParser(description='上游搜索引擎模拟服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockServer((args.host, args.port), profiles_from_args(args))
+    print(json.dumps(upstream_env(f'http://{args.host}:{server.server_port}')), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
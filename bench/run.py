@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+离线性能测试
+
+启动上游模拟服务（见 mock_upstreams）和与生产相同配置的 Gunicorn（gunicorn.conf.py），
+用负载生成器（见 loadgen）请求 /api/search，测试期间每秒采样各工作进程的内存（RSS），
+最后输出 JSON 结果：
+
+    python -m bench.run --workers 4 --mode asgi --concurrency 64 --duration 30 \\
+        --latency 300 --error-rate 0.01 --output bench.json
+
+应用的API密钥和上游地址指向模拟服务，磁盘缓存和查询日志默认关闭；其他配置可用 --env KEY=VALUE 设置，
+如 --env CACHE_TTL=0。指定 --baseline 时与之前的结果比较，p95 延迟增加或吞吐量下降超过
+--max-regression（比例）时以状态码1退出，便于在CI中跟踪性能回退。
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+import subprocess
+import http.client
+
+from . import loadgen, mock_upstreams
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _page_size():
+    try:
+        return os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return 4096
+
+def rss_mb(pid):
+    """进程的常驻内存（MB），进程不存在时返回None"""
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return round(int(f.read().split()[1]) * _page_size() / 1048576, 1)
+    except (OSError, IndexError, ValueError):
+        return None
+
+def child_pids(pid):
+    """pid 的子进程（读取 /proc，仅限 Linux）"""
+    children = []
+    try:
+        names = os.listdir('/proc')
+    except OSError:
+        return children
+    for name in names:
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as f:
+                # 进程名可能包含空格，父进程号在最后一个右括号之后的第二个字段
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(name))
+    return sorted(children)
+
+class MemorySampler(threading.Thread):
+    """每隔 interval 秒记录主进程和各工作进程的内存"""
+
+    def __init__(self, master_pid, interval=1.0):
+        super().__init__(daemon=True)
+        self.master_pid = master_pid
+        self.interval = interval
+        # 工作进程号 -> 内存峰值（MB）
+        self.peak = {}
+        self.master_peak = 0.0
+        self._stop_event = threading.Event()
+
+    def sample(self):
+        workers = {}
+        for pid in child_pids(self.master_pid):
+            value = rss_mb(pid)
+            if value is not None:
+                workers[pid] = value
+                self.peak[pid] = max(self.peak.get(pid, 0.0), value)
+        self.master_peak = max(self.master_peak, rss_mb(self.master_pid) or 0.0)
+        return workers
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        final = self.sample()
+        peaks = sorted(self.peak.values())
+        return {
+            'workers': len(final),
+            'master_rss_mb': rss_mb(self.master_pid),
+            'master_peak_rss_mb': self.master_peak,
+            'worker_rss_mb': sorted(final.values()),
+            'worker_peak_rss_mb': peaks,
+            'worker_peak_rss_mb_max': peaks[-1] if peaks else None,
+            # 测试期间因 MAX_REQUESTS 等重启过的工作进程也计入峰值
+            'worker_processes_seen': len(self.peak)
+        }
+
+def _start_mock(args):
+    """启动上游模拟服务子进程，返回 (进程, 应用的上游环境变量)"""
+    command = [sys.executable, '-m', 'bench.mock_upstreams', '--host', '127.0.0.1', '--port', str(args.mock_port),
+               '--latency', str(args.latency), '--jitter', str(args.jitter), '--error-rate', str(args.error_rate)]
+    for upstream in mock_upstreams.UPSTREAMS:
+        for field in ('latency', 'jitter', 'error_rate'):
+            value = getattr(args, f'{upstream}_{field}')
+            if value is not None:
+                command += [f'--{upstream}-{field.replace("_", "-")}', str(value)]
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line:
+        raise RuntimeError('上游模拟服务启动失败')
+    return process, json.loads(line)
+
+def _app_env(args, upstreams):
+    env = dict(os.environ)
+    env.update(upstreams)
+    env.update({
+        # 显式设置，避免 .env 中的真实密钥和地址生效（load_dotenv 不覆盖已有的环境变量）
+        'ZHIPUAI_API_KEY': 'bench',
+        'BOCHAAI_API_KEY': 'bench',
+        'PORT': str(args.port),
+        'WEB_CONCURRENCY': str(args.workers),
+        'SERVER_MODE': args.mode,
+        'DISK_CACHE_PATH': '',
+        'QUERY_LOG_PATH': '',
+        'GUNICORN_ACCESS_LOG': os.devnull,
+        'GUNICORN_LOG_LEVEL': 'warning',
+        'LOG_LEVEL': 'WARNING'
+    })
+    for item in args.env:
+        key, _, value = item.partition('=')
+        env[key] = value
+    return env
+
+def _wait_ready(port, timeout=30.0):
+    """等待应用的 /api/health 可用"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+        try:
+            conn.request('GET', '/api/health')
+            if conn.getresponse().status == 200:
+                return
+        except (OSError, http.client.HTTPException):
+            pass
+        finally:
+            conn.close()
+        time.sleep(0.2)
+    raise RuntimeError(f'应用在 {timeout} 秒内未就绪')
+
+def _stop(process, timeout=30.0):
+    if process is None or process.poll() is not None:
+        return
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def compare(result, baseline, max_regression):
+    """与基准结果比较，返回超出允许范围的回退项"""
+    regressions = []
+    old_p95 = (baseline.get('latency_ms') or {}).get('p95')
+    new_p95 = (result.get('latency_ms') or {}).get('p95')
+    if old_p95 and new_p95 and new_p95 > old_p95 * (1 + max_regression):
+        regressions.append({'metric': 'latency_ms.p95', 'baseline': old_p95, 'current': new_p95})
+    old_rps = baseline.get('rps')
+    new_rps = result.get('rps')
+    if old_rps and new_rps is not None and new_rps < old_rps * (1 - max_regression):
+        regressions.append({'metric': 'rps', 'baseline': old_rps, 'current': new_rps})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='离线性能测试')
+    parser.add_argument('--workers', type=int, default=2, help='Gunicorn 工作进程数，默认2')
+    parser.add_argument('--mode', choices=('wsgi', 'asgi'), default='wsgi', help='服务器模式，默认wsgi')
+    parser.add_argument('--port', type=int, default=5055, help='应用端口，默认5055')
+    parser.add_argument('--mock-port', type=int, default=0, help='上游模拟服务端口，默认随机')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE', help='应用的其他环境变量')
+    parser.add_argument('--output', help='JSON 结果的输出文件，默认输出到标准输出')
+    parser.add_argument('--baseline', help='用于比较的基准结果（JSON）')
+    parser.add_argument('--max-regression', type=float, default=0.1, help='允许的性能回退比例，默认0.1')
+    mock_upstreams.add_arguments(parser)
+    loadgen.add_arguments(parser)
+    args = parser.parse_args()
+
+    mock = server = None
+    try:
+        mock, upstreams = _start_mock(args)
+        server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'], cwd=ROOT,
+                                  env=_app_env(args, upstreams))
+        _wait_ready(args.port)
+        sampler = MemorySampler(server.pid)
+        sampler.start()
+        load = loadgen.run_from_args(f'http://127.0.0.1:{args.port}', args)
+        memory = sampler.stop()
+    finally:
+        _stop(server)
+        _stop(mock)
+
+    result = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'revision': _git_revision(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+        **load,
+        'memory': memory
+    }
+    status = 0
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            result['regressions'] = compare(result, json.load(f), args.max_regression)
+        status = 1 if result['regressions'] else 0
+
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    print(output)
+    sys.exit(status)
+
+if __name__ == '__main__':
+    main()
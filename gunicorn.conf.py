@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+生产环境 Gunicorn 配置
+
+启动方式:
+    gunicorn -c gunicorn.conf.py
+
+主进程预先加载应用（搜索引擎模块、共享HTTP客户端等），然后派生多个工作进程。
+SERVER_MODE=asgi 时使用 uvicorn 工作进程运行 asgi:app，否则使用多线程工作进程运行 app:app。
+
+信号:
+    HUP   平滑重启所有工作进程
+    TERM  平滑关闭（等待进行中的请求完成，最长 graceful_timeout 秒）
+"""
+
+import os
+import tempfile
+import multiprocessing
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from search_engines.config import env_int
+
+# 上游连接在工作进程中建立，避免多个进程共用主进程中建立的套接字
+os.environ['HTTP_PREWARM_ON_IMPORT'] = '0'
+
+# 工作进程之间合并相同的并发搜索请求（见 search_engines/singleflight.py）
+os.environ.setdefault('SINGLEFLIGHT_DIR', os.path.join(tempfile.gettempdir(), 'mysearch-singleflight'))
+
+# /metrics 汇总所有工作进程的指标（见 search_engines/metrics.py）
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'mysearch-metrics'))
+
+# 监听地址，与 python app.py 一样使用 PORT 环境变量
+bind = f"0.0.0.0:{env_int('PORT', 5000)}"
+
+# 工作进程数默认为CPU核心数
+workers = env_int('WEB_CONCURRENCY', multiprocessing.cpu_count())
+
+if os.getenv('SERVER_MODE', 'wsgi').lower() == 'asgi':
+    wsgi_app = 'asgi:app'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'app:app'
+    worker_class = 'gthread'
+    # 每个工作进程的线程数
+    threads = env_int('GUNICORN_THREADS', 8)
+
+# 在派生工作进程前加载应用
+preload_app = True
+
+# 每个工作进程处理指定数量的请求后自动重启，加入随机抖动避免所有进程同时重启
+max_requests = env_int('MAX_REQUESTS', 1000)
+max_requests_jitter = env_int('MAX_REQUESTS_JITTER', max(1, max_requests // 10))
+
+# 超时时间需大于最慢上游的超时时间（智谱AI为30秒）
+timeout = env_int('GUNICORN_TIMEOUT', 60)
+graceful_timeout = env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = env_int('GUNICORN_KEEPALIVE', 5)
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+def on_starting(server):
+    """删除上次运行留下的指标文件"""
+    from search_engines import metrics
+    metrics.clear_shared_dir()
+
+def post_fork(server, worker):
+    """工作进程派生后丢弃从主进程继承的连接池，并开始定期写入本进程的指标"""
+    from search_engines import http_client, metrics
+    http_client.reset()
+    metrics.start_exporter()
+
+def post_worker_init(worker):
+    """工作进程初始化完成后预热到各上游的连接，并启动缓存预热线程"""
+    import app
+    app.warm_up()
+
+def worker_exit(server, worker):
+    """工作进程退出前写入最后的指标"""
+    from search_engines import metrics
+    metrics.flush()
+
+def child_exit(server, worker):
+    """工作进程退出后（如 max_requests 自动重启）把其计数归档，/metrics 的合计不会减少"""
+    from search_engines import metrics
+    metrics.mark_process_dead(worker.pid)
@@ -47,11 +47,23 @@ document.addEventListener('DOMContentLoaded', function() {
     const engineDescriptions = {
         'search_std': '智谱基础搜索：智谱AI提供的基础搜索引擎，适合一般查询',
         'bochaai': 'Bocha AI：使用 Bocha AI 搜索引擎，提供智能化的搜索结果和知识整合',
-        'searxng': 'SearXNG：使用 SearXNG 元搜索引擎，整合多个搜索引擎的结果'
+        'searxng': 'SearXNG：使用 SearXNG 元搜索引擎，整合多个搜索引擎的结果',
+        'all': '聚合搜索：同时查询所有已配置的搜索引擎，合并去重并统一排序'
+    };
+
+    // 搜索引擎名称
+    const engineNames = {
+        'search_std': '智谱基础搜索',
+        'bochaai': 'Bocha AI',
+        'searxng': 'SearXNG',
+        'all': '聚合搜索'
     };
 
     const engineDescriptionElement = document.getElementById('engine-description');
 
+    // 进行中的搜索请求，开始新的搜索时取消
+    let searchController = null;
+
     // 搜索引擎切换动画和描述更新
     document.querySelectorAll('input[name="search-engine"]').forEach(radio => {
         radio.addEventListener('change', function() {
@@ -106,13 +118,25 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
+    // 搜索建议：停止输入 SUGGEST_DELAY 毫秒后请求，新的输入会取消尚未完成的请求
+    const SUGGEST_DELAY = 150;
+    let suggestTimer = null;
+    let suggestController = null;
+
+    function cancelSuggestions() {
+        clearTimeout(suggestTimer);
+        if (suggestController) {
+            suggestController.abort();
+            suggestController = null;
+        }
+    }
+
     // 搜索输入框输入事件 - 用于显示搜索建议
     searchInput.addEventListener('input', function() {
         const query = searchInput.value.trim();
+        cancelSuggestions();
         if (query.length > 1) {
-            // 这里可以添加搜索建议的逻辑
-            // 简单模拟搜索建议
-            showSearchSuggestions(query);
+            suggestTimer = setTimeout(() => fetchSuggestions(query), SUGGEST_DELAY);
         } else {
             searchSuggestions.style.display = 'none';
         }
@@ -136,7 +160,8 @@ document.addEventListener('DOMContentLoaded', function() {
         // 清空搜索信息
         searchInfo.innerHTML = '';
 
-        // 隐藏搜索建议
+        // 隐藏搜索建议，取消尚未返回的建议请求
+        cancelSuggestions();
         searchSuggestions.style.display = 'none';
 
         // 获取选中的搜索引擎
@@ -144,8 +169,8 @@ document.addEventListener('DOMContentLoaded', function() {
         console.log('选中的搜索引擎:', selectedEngine);
 
         // 构建API请求URL
-        // 添加时间戳参数，防止缓存
-        let apiUrl = `/api/search?query=${encodeURIComponent(query)}&engine=${selectedEngine}&_t=${Date.now()}`;
+        // 使用 compact 格式（结构化字段由 renderResultItem 渲染），添加时间戳参数，防止缓存
+        let apiUrl = `/api/search/stream?query=${encodeURIComponent(query)}&engine=${selectedEngine}&format=compact&_t=${Date.now()}`;
 
         // 根据不同的搜索引擎添加高级选项
         if (selectedEngine === 'search_std') {
@@ -193,50 +218,94 @@ document.addEventListener('DOMContentLoaded', function() {
 
         console.log('请求URL:', apiUrl);
 
-        // 调用后端API
-        fetch(apiUrl)
-            .then(response => {
-                if (!response.ok) {
-                    throw new Error('搜索请求失败');
+        // 取消上一次尚未完成的搜索，避免其结果渲染到本次搜索中
+        if (searchController) {
+            searchController.abort();
+        }
+        const controller = new AbortController();
+        searchController = controller;
+
+        // 逐步收到的搜索结果，done 事件到达后替换为最终结果
+        const data = {
+            search_result: [],
+            meta: { engines: {} }
+        };
+        const startTime = performance.now();
+        let resultList = null;
+
+        // 处理流式搜索的每个事件
+        function handleEvent(event) {
+            if (event.type === 'error') {
+                throw new Error(event.error);
+            }
+
+            if (event.type === 'start') {
+                // 聚合搜索时先把所有搜索引擎标记为等待中
+                event.engines.forEach(engine => {
+                    data.meta.engines[engine] = { name: engineNames[engine] || engine, status: 'pending' };
+                });
+            } else if (event.type === 'engine') {
+                const { type, engine, ...engineMeta } = event;
+                data.meta.engines[engine] = engineMeta;
+            } else if (event.type === 'results') {
+                // 收到第一批结果后立即显示
+                if (!resultList) {
+                    loadingIndicator.style.display = 'none';
+                    searchResults.innerHTML = '<div class="stream-results"></div>';
+                    resultList = searchResults.querySelector('.stream-results');
                 }
-                return response.json();
-            })
-            .then(data => {
+                const items = selectedEngine === 'all'
+                    ? event.items.map(item => ({ ...item, sources: [event.engine] }))
+                    : event.items;
+                data.search_result.push(...items);
+                resultList.insertAdjacentHTML('beforeend', items.map(renderResultItem).join(''));
+            } else if (event.type === 'extras') {
+                ['suggestions', 'corrections', 'answers', 'infoboxes'].forEach(field => {
+                    if (event[field]) {
+                        data[field] = (data[field] || []).concat(event[field]);
+                    }
+                });
+            } else if (event.type === 'done') {
+                if (event.error) {
+                    throw new Error(event.error);
+                }
+                data.meta = event.meta;
+                data.search_intent = event.search_intent;
+                // 聚合搜索的最终结果为合并排序后的列表
+                if (event.search_result) {
+                    data.search_result = event.search_result;
+                }
+
                 // 隐藏加载指示器
                 loadingIndicator.style.display = 'none';
 
                 // 调试信息
                 console.log('搜索结果数据:', data);
 
-                // 获取搜索引擎名称
-                const engineNames = {
-                    'search_std': '智谱基础搜索',
-                    'bochaai': 'Bocha AI',
-                    'searxng': 'SearXNG'
-                };
-                const engineName = engineNames[document.querySelector('input[name="search-engine"]:checked').value] || '未知搜索引擎';
-
-                // 显示搜索信息
-                const selectedEngine = document.querySelector('input[name="search-engine"]:checked').value;
-                const resultCount = data.search_result ? data.search_result.length : 0;
-
-                if (selectedEngine === 'bochaai') {
-                    // 显示 Bocha AI 特有的搜索信息
-                    const totalMatches = data.meta && data.meta.totalResults ? data.meta.totalResults : resultCount;
-                    searchInfo.innerHTML = `使用 <strong>${engineName}</strong> 找到约 ${totalMatches} 条结果（用时 ${((Math.random() * 0.5) + 0.1).toFixed(2)} 秒） <span class="bocha-info">数据来源: Bocha AI Web Search API</span>`;
-                } else if (selectedEngine === 'searxng') {
-                    // 显示 SearXNG 特有的搜索信息
-                    const totalMatches = data.meta && data.meta.totalResults ? data.meta.totalResults : resultCount;
-                    const engines = document.getElementById('searxng-engines').value;
-                    searchInfo.innerHTML = `使用 <strong>${engineName}</strong> 找到约 ${totalMatches} 条结果（用时 ${((Math.random() * 0.5) + 0.1).toFixed(2)} 秒） <span class="searxng-info">数据来源: ${engines.replace(/,/g, ', ')}</span>`;
-                } else {
-                    searchInfo.innerHTML = `使用 <strong>${engineName}</strong> 找到约 ${resultCount} 条结果（用时 ${((Math.random() * 0.5) + 0.1).toFixed(2)} 秒）`;
-                }
-
-                // 渲染搜索结果
+                renderSearchInfo(data, selectedEngine);
                 renderSearchResults(data, query);
+                return;
+            }
+
+            // 结果未全部到达时显示已收到的结果数和实际等待时间
+            data.meta.elapsed = (performance.now() - startTime) / 1000;
+            renderSearchInfo(data, selectedEngine);
+        }
+
+        // 调用后端流式API
+        fetch(apiUrl, { signal: controller.signal })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error('搜索请求失败');
+                }
+                return readNdjson(response, handleEvent);
             })
             .catch(error => {
+                // 已被新的搜索取代
+                if (error.name === 'AbortError') {
+                    return;
+                }
+
                 // 隐藏加载指示器
                 loadingIndicator.style.display = 'none';
 
@@ -253,6 +322,75 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
 
+    // 逐行读取NDJSON响应，每解析出一个事件调用一次 onEvent
+    async function readNdjson(response, onEvent) {
+        // 不支持流式读取时一次性读取全部内容
+        if (!response.body || !response.body.getReader) {
+            const text = await response.text();
+            text.split('\n').filter(line => line.trim()).forEach(line => onEvent(JSON.parse(line)));
+            return;
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+
+            let index;
+            while ((index = buffer.indexOf('\n')) >= 0) {
+                const line = buffer.slice(0, index).trim();
+                buffer = buffer.slice(index + 1);
+                if (line) {
+                    onEvent(JSON.parse(line));
+                }
+            }
+        }
+
+        buffer += decoder.decode();
+        if (buffer.trim()) {
+            onEvent(JSON.parse(buffer));
+        }
+    }
+
+    // 显示搜索信息（结果数、用时和数据来源）
+    function renderSearchInfo(data, selectedEngine) {
+        // 获取搜索引擎名称
+        const engineName = engineNames[selectedEngine] || '未知搜索引擎';
+        const resultCount = data.search_result ? data.search_result.length : 0;
+
+        // 服务端返回的实际搜索耗时
+        const elapsedSeconds = data.meta && typeof data.meta.elapsed === 'number' ? data.meta.elapsed.toFixed(2) : '-';
+
+        if (selectedEngine === 'bochaai') {
+            // 显示 Bocha AI 特有的搜索信息
+            const totalMatches = data.meta && data.meta.totalResults ? data.meta.totalResults : resultCount;
+            searchInfo.innerHTML = `使用 <strong>${engineName}</strong> 找到约 ${totalMatches} 条结果（用时 ${elapsedSeconds} 秒） <span class="bocha-info">数据来源: Bocha AI Web Search API</span>`;
+        } else if (selectedEngine === 'searxng') {
+            // 显示 SearXNG 特有的搜索信息
+            const totalMatches = data.meta && data.meta.totalResults ? data.meta.totalResults : resultCount;
+            const engines = document.getElementById('searxng-engines').value;
+            searchInfo.innerHTML = `使用 <strong>${engineName}</strong> 找到约 ${totalMatches} 条结果（用时 ${elapsedSeconds} 秒） <span class="searxng-info">数据来源: ${engines.replace(/,/g, ', ')}</span>`;
+        } else if (selectedEngine === 'all') {
+            // 显示聚合搜索各搜索引擎的状态
+            const statusText = {
+                'pending': '（等待中）',
+                'circuit_open': '（熔断中）',
+                'rate_limited': '（请求过于频繁）'
+            };
+            const engineStatus = data.meta && data.meta.engines ? Object.values(data.meta.engines)
+                .map(item => `${item.name}${item.status === 'ok' ? ` ${item.count} 条` : statusText[item.status] || '（失败）'}`)
+                .join('，') : '';
+            searchInfo.innerHTML = `使用 <strong>${engineName}</strong> 找到约 ${resultCount} 条结果（用时 ${elapsedSeconds} 秒） <span class="searxng-info">数据来源: ${engineStatus}</span>`;
+        } else {
+            searchInfo.innerHTML = `使用 <strong>${engineName}</strong> 找到约 ${resultCount} 条结果（用时 ${elapsedSeconds} 秒）`;
+        }
+    }
+
     // 渲染搜索结果
     function renderSearchResults(data, query) {
         console.log('渲染搜索结果:', data);
@@ -351,7 +489,7 @@ document.addEventListener('DOMContentLoaded', function() {
         let answersHTML = '';
         let infoboxesHTML = '';
 
-        if (selectedEngine === 'searxng') {
+        if (selectedEngine === 'searxng' || selectedEngine === 'all') {
             // 处理搜索建议
             if (data.suggestions && data.suggestions.length > 0) {
                 suggestionsHTML = `
@@ -414,40 +552,7 @@ document.addEventListener('DOMContentLoaded', function() {
         }
 
         // 创建搜索结果列表
-        let resultsHTML = data.search_result.map((result, index) => {
-            console.log(`处理搜索结果 ${index + 1}:`, result);
-
-            // 处理URL显示
-            let displayUrl = result.link || '#';
-            if (displayUrl === '#' && result.media) {
-                displayUrl = result.media;
-            }
-            console.log(`显示URL: ${displayUrl}`);
-
-            // 处理内容摘要
-            let snippet = result.content || '无内容摘要';
-            if (snippet.length > 300) {
-                snippet = snippet.substring(0, 297) + '...';
-            }
-            console.log(`标题: ${result.title || '无标题'}, 内容长度: ${snippet.length}`);
-
-            // 获取来源信息
-            const source = result.media || '未知来源';
-
-            return `
-                <div class="result-item">
-                    <h3 class="result-title">
-                        <a href="${result.link || '#'}" target="_blank">${result.title || '无标题'}</a>
-                    </h3>
-                    ${displayUrl !== '#' ? `<div class="result-url">${displayUrl}</div>` : ''}
-                    <div class="result-snippet">${snippet}</div>
-                    <div class="result-footer">
-                        <span class="result-source">来源: <strong>${source}</strong></span>
-                        <a href="${result.link || '#'}" target="_blank" class="result-link">查看原网页</a>
-                    </div>
-                </div>
-            `;
-        }).join('');
+        const resultsHTML = data.search_result.map(renderResultItem).join('');
 
         // 更新搜索结果
         searchResults.innerHTML = searchIntentHTML + correctionsHTML + answersHTML + infoboxesHTML + resultsHTML + suggestionsHTML;
@@ -455,22 +560,99 @@ document.addEventListener('DOMContentLoaded', function() {
 
 
 
-    // 显示搜索建议
-    function showSearchSuggestions(query) {
-        // 简单模拟搜索建议
-        const suggestions = [
-            `${query} 最新动态`,
-            `${query} 是什么`,
-            `${query} 的发展历程`,
-            `${query} 的应用场景`,
-            `${query} 相关技术`
-        ];
+    // 渲染单条搜索结果
+    function renderResultItem(result) {
+        // 处理URL显示
+        let displayUrl = result.link || '#';
+        if (displayUrl === '#' && result.media) {
+            displayUrl = result.media;
+        }
+
+        // 处理内容摘要
+        let snippet = result.content || '无内容摘要';
+        if (snippet.length > 300) {
+            snippet = snippet.substring(0, 297) + '...';
+        }
+
+        // 获取来源信息
+        const source = result.media || '未知来源';
+
+        // 缩略图和发布时间、网站等附加信息
+        const thumbnail = result.thumbnail
+            ? `<img class="result-thumbnail" src="${result.thumbnail}" alt="${result.title || ''}" loading="lazy">`
+            : '';
+        const details = [
+            ['发布时间', result.published],
+            ['网站', result.site],
+            ['语言', result.language],
+            ['发布者', result.publisher],
+            ['时长', result.duration],
+            ['搜索引擎', result.upstream]
+        ].filter(([, value]) => value).map(([label, value]) => `<small>${label}: ${value}</small>`).join('');
+
+        // 聚合搜索时显示结果来自哪些搜索引擎
+        const sourceEngines = result.sources ? ` · ${result.sources.map(name => engineNames[name] || name).join(' / ')}` : '';
+
+        return `
+            <div class="result-item">
+                <h3 class="result-title">
+                    <a href="${result.link || '#'}" target="_blank">${result.title || '无标题'}</a>
+                </h3>
+                ${displayUrl !== '#' ? `<div class="result-url">${displayUrl}</div>` : ''}
+                <div class="result-snippet">${snippet}</div>
+                ${thumbnail}
+                ${details ? `<div class="result-details">${details}</div>` : ''}
+                <div class="result-footer">
+                    <span class="result-source">来源: <strong>${source}</strong>${sourceEngines}</span>
+                    <a href="${result.link || '#'}" target="_blank" class="result-link">查看原网页</a>
+                </div>
+            </div>
+        `;
+    }
+
+    // 请求搜索建议（/api/suggest）
+    async function fetchSuggestions(query) {
+        const controller = new AbortController();
+        suggestController = controller;
+        try {
+            const response = await fetch(`/api/suggest?query=${encodeURIComponent(query)}`, { signal: controller.signal });
+            if (!response.ok) {
+                return;
+            }
+            const data = await response.json();
+            // 输入框已变化时丢弃过期的结果
+            if (suggestController === controller) {
+                showSearchSuggestions(data.suggestions || []);
+            }
+        } catch (error) {
+            if (error.name !== 'AbortError') {
+                console.error('获取搜索建议失败:', error);
+            }
+        } finally {
+            if (suggestController === controller) {
+                suggestController = null;
+            }
+        }
+    }
 
-        const suggestionsHTML = suggestions.map(suggestion =>
-            `<div class="suggestion-item" onclick="document.getElementById('search-input').value='${suggestion}'; document.getElementById('search-button').click();">${suggestion}</div>`
-        ).join('');
+    // 显示搜索建议（建议来自其他用户的搜索，以文本节点插入，不解析HTML）
+    function showSearchSuggestions(suggestions) {
+        searchSuggestions.innerHTML = '';
+        if (suggestions.length === 0) {
+            searchSuggestions.style.display = 'none';
+            return;
+        }
 
-        searchSuggestions.innerHTML = suggestionsHTML;
+        suggestions.forEach(suggestion => {
+            const item = document.createElement('div');
+            item.className = 'suggestion-item';
+            item.textContent = suggestion;
+            item.addEventListener('click', () => {
+                searchInput.value = suggestion;
+                performSearch(suggestion);
+            });
+            searchSuggestions.appendChild(item);
+        });
         searchSuggestions.style.display = 'block';
     }
 });
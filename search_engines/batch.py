@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+批量搜索实现
+
+POST /api/search/batch 一次提交多个搜索查询，每个查询可以指定自己的搜索引擎和参数：
+
+    {
+        "engine": "searxng",                 // 可选，各查询默认的搜索引擎
+        "params": {"language": "zh-CN"},     // 可选，各查询默认的额外参数
+        "queries": [
+            "python",                        // 只有查询时使用默认搜索引擎和参数
+            {"query": "flask", "engine": "bochaai", "count": 5, "rerank": "bm25"}
+        ],
+        "format": "zhipu",                   // 可选，结果格式 zhipu 或 compact（见 models 模块）
+        "stream": false,                     // 可选，true 时以NDJSON逐条返回
+        "nocache": false                     // 可选，跳过缓存读取
+    }
+
+查询经过与 /api/search 相同的缓存、请求合并和熔断器（dispatcher.cached_search），
+每个搜索引擎有自己的线程池，线程数 BATCH_CONCURRENCY_<ENGINE> 即同时执行的查询数（所有批量请求共享），
+某个搜索引擎排队的查询不会占用其他搜索引擎的线程；上游限流时排在页面搜索之后（见 ratelimit 模块）。
+engine=all 的查询对各搜索引擎的请求也提交到该搜索引擎的线程池，同样计入 BATCH_CONCURRENCY_<ENGINE>；
+BATCH_CONCURRENCY_ALL 只限制同时进行合并的 all 查询数。
+结果按提交顺序返回，单个查询出错不影响其他查询。
+"""
+
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+
+from . import dispatcher, federated, ratelimit, models, rerank
+from .config import env_int, engine_env
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# 每个搜索引擎一个线程池，线程数限制该搜索引擎同时执行的查询数
+_executors = {}
+_executors_lock = threading.Lock()
+
+def _executor(engine):
+    """获取（或创建）搜索引擎的线程池，engine 须已通过 dispatcher.validate 校验"""
+    executor = _executors.get(engine)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(engine)
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=max(1, engine_env('BATCH_CONCURRENCY', engine, 4)),
+                    thread_name_prefix=f'batch-{engine}'
+                )
+                _executors[engine] = executor
+    return executor
+
+def parse_request(payload):
+    """解析批量搜索请求
+
+    Args:
+        payload (dict): 请求体JSON
+
+    Returns:
+        tuple: (查询列表, 错误信息)。查询列表的每项为 {'query', 'engine', 'args'}，
+               请求格式错误时查询列表为None
+    """
+    if not isinstance(payload, dict):
+        return None, '请求体必须是JSON对象'
+
+    queries = payload.get('queries')
+    if not isinstance(queries, list) or not queries:
+        return None, 'queries 必须是非空列表'
+
+    max_queries = env_int('BATCH_MAX_QUERIES', 1000)
+    if len(queries) > max_queries:
+        return None, f'单次最多提交 {max_queries} 个查询'
+
+    default_engine = payload.get('engine', 'search_std')
+    default_args = payload.get('params') if isinstance(payload.get('params'), dict) else {}
+
+    items = []
+    for query in queries:
+        if isinstance(query, dict):
+            args = {**default_args, **query}
+        else:
+            args = {**default_args, 'query': query}
+        items.append({
+            'query': str(args.pop('query', '') or ''),
+            'engine': str(args.pop('engine', default_engine)),
+            'args': args
+        })
+    return items, None
+
+def _search_all(query, params, bypass_cache):
+    """聚合搜索的批量版本：各搜索引擎的请求在该搜索引擎的线程池中执行，当前线程只等待并合并结果
+
+    在线程池中排队的时间不计入 FEDERATED_TIMEOUT，各搜索引擎的请求仍受上游超时限制。
+    """
+    futures = federated.submit(query, params, bypass_cache, executor=_executor)
+    if futures is None:
+        return {'error': '没有已配置的搜索引擎'}, 'MISS'
+    wait(futures.values())
+    return federated.combine(query, futures, bypass_cache)
+
+def _run_item(index, item, bypass_cache, fmt):
+    """执行单个已通过校验的查询，返回该查询的结果项"""
+    query, engine = item['query'], item['engine']
+    entry = {'index': index, 'query': query, 'engine': engine}
+
+    start = time.perf_counter()
+    try:
+        params = dispatcher.parse_params(engine, item['args'])
+        if params['rerank'] is None:
+            entry.update(status='error', error=f'无效的重排方式，可选值: {", ".join(rerank.METHODS)}')
+            return entry
+        with ratelimit.priority(ratelimit.BATCH):
+            if engine == 'all':
+                result, cache_status = _search_all(query, params, bypass_cache)
+            else:
+                result, cache_status = dispatcher.cached_search(engine, query, params, bypass_cache)
+    except Exception as e:
+        logger.warning('批量搜索第 %d 项失败: %s', index, e, extra={'engine': engine})
+        entry.update(status='error', error=str(e), elapsed=round(time.perf_counter() - start, 3))
+        return entry
+
+    entry.update(cache=cache_status, elapsed=round(time.perf_counter() - start, 3))
+    if dispatcher.is_error_result(result):
+        entry.update(status='error', error=dispatcher.error_message(result))
+    else:
+        result = rerank.apply(engine, result, query, params['rerank'])
+        entry.update(status='ok', result=models.serialize(result, fmt))
+    return entry
+
+def submit(items, bypass_cache=False, fmt=models.ZHIPU):
+    """提交所有查询到各搜索引擎的线程池，返回按提交顺序排列的 Future 列表
+
+    校验失败的查询不提交，直接返回已完成的 Future。
+    """
+    futures = []
+    for index, item in enumerate(items):
+        error = dispatcher.validate(item['engine'], item['query'])
+        if error:
+            future = Future()
+            future.set_result({'index': index, 'query': item['query'], 'engine': item['engine'],
+                               'status': 'error', 'error': error})
+        else:
+            # 复制当前上下文，使线程池中的日志带上请求ID
+            future = _executor(item['engine']).submit(
+                contextvars.copy_context().run, _run_item, index, item, bypass_cache, fmt)
+        futures.append(future)
+    return futures
+
+def iter_results(futures):
+    """按提交顺序逐个返回查询结果项
+
+    调用方提前停止迭代（如流式响应的客户端断开）时取消尚未开始的查询。
+    """
+    start = time.perf_counter()
+    errors = 0
+    try:
+        for index, future in enumerate(futures):
+            try:
+                entry = future.result()
+            except Exception as e:
+                # _run_item 自身出错时也只影响该查询
+                logger.exception('批量搜索第 %d 项失败: %s', index, e)
+                entry = {'index': index, 'status': 'error', 'error': str(e)}
+            if entry['status'] != 'ok':
+                errors += 1
+            yield entry
+    finally:
+        cancelled = sum(1 for future in futures if future.cancel())
+        logger.info('批量搜索完成', extra={
+            'queries': len(futures),
+            'errors': errors,
+            'cancelled': cancelled,
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+        })
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+熔断器与自适应超时实现
+
+每个搜索引擎一个熔断器，由共享HTTP客户端记录每次上游请求的结果和耗时：
+
+- 关闭（closed）：正常请求。最近 BREAKER_WINDOW 次请求中失败（连接错误、超时、5xx/429 或慢请求）
+  的比例达到 BREAKER_ERROR_RATE 时打开
+- 打开（open）：直接拒绝请求（抛出 CircuitOpenError），BREAKER_OPEN_SECONDS 秒后进入半开
+- 半开（half-open）：只放行一个探测请求，成功则关闭，失败则重新打开。探测在发出上游请求前结束
+  （如限流排队超时）时由 release() 释放，下一个请求可以立即探测
+
+上游请求的超时时间根据最近请求耗时的 p99 自适应调整，并限制在
+[UPSTREAM_TIMEOUT_MIN, UPSTREAM_TIMEOUT_<ENGINE>] 范围内。
+
+配置（均可用 _<ENGINE> 后缀单独配置，如 BREAKER_OPEN_SECONDS_SEARXNG）:
+    UPSTREAM_TIMEOUT             超时时间上限（秒），默认智谱AI为30，其他为10
+    UPSTREAM_TIMEOUT_MIN         超时时间下限（秒），默认2
+    UPSTREAM_TIMEOUT_MULTIPLIER  超时时间为 p99 耗时的倍数，默认2
+    BREAKER_WINDOW               统计失败率的最近请求数，默认20
+    BREAKER_MIN_REQUESTS         窗口内至少有多少次请求才会打开熔断器，默认10
+    BREAKER_ERROR_RATE           打开熔断器的失败率，默认0.5
+    BREAKER_SLOW_SECONDS         超过该耗时（秒）的请求视为失败，默认为超时时间上限的80%
+    BREAKER_OPEN_SECONDS         打开后多久进入半开状态（秒），默认30
+"""
+
+import time
+import threading
+from collections import deque
+
+from . import metrics
+from .config import env_float, engine_env
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# 指标中的状态值
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# 各搜索引擎默认的超时时间上限（秒）
+DEFAULT_TIMEOUTS = {
+    'search_std': 30,
+    'bochaai': 10,
+    'searxng': 10
+}
+
+# 计算自适应超时时间所需的最少样本数，不足时使用超时时间上限
+MIN_LATENCY_SAMPLES = 20
+
+# 保留的耗时样本数
+LATENCY_SAMPLES = 200
+
+class CircuitOpenError(Exception):
+    """熔断器打开时拒绝请求"""
+
+    def __init__(self, engine, retry_after):
+        super().__init__(f'熔断器已打开，请 {int(retry_after) + 1} 秒后重试')
+        self.engine = engine
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """单个搜索引擎的熔断器"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        max_timeout = engine_env('UPSTREAM_TIMEOUT', engine, DEFAULT_TIMEOUTS.get(engine, 10), parse=env_float)
+        self.max_timeout = max_timeout
+        self.min_timeout = min(engine_env('UPSTREAM_TIMEOUT_MIN', engine, 2, parse=env_float), max_timeout)
+        self.multiplier = engine_env('UPSTREAM_TIMEOUT_MULTIPLIER', engine, 2, parse=env_float)
+        self.window = max(1, engine_env('BREAKER_WINDOW', engine, 20))
+        self.min_requests = engine_env('BREAKER_MIN_REQUESTS', engine, 10)
+        self.error_rate = engine_env('BREAKER_ERROR_RATE', engine, 0.5, parse=env_float)
+        self.slow_seconds = engine_env('BREAKER_SLOW_SECONDS', engine, max_timeout * 0.8, parse=env_float)
+        self.open_seconds = engine_env('BREAKER_OPEN_SECONDS', engine, 30, parse=env_float)
+
+        self.state = CLOSED
+        self._outcomes = deque(maxlen=self.window)  # True 表示失败
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._timeout = max_timeout
+        self._opened_at = 0.0
+        self._probe_started = None
+        self._lock = threading.Lock()
+        self.rejections = 0
+
+    def allow(self):
+        """检查是否允许发出请求
+
+        Returns:
+            float|None: 半开状态下认领的探测，结束后应传给 release()；其他状态返回None
+
+        Raises:
+            CircuitOpenError: 熔断器打开，或半开状态下已有探测请求在进行
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self.state == OPEN:
+                if now - self._opened_at < self.open_seconds:
+                    self._reject()
+                    raise CircuitOpenError(self.engine, self.open_seconds - (now - self._opened_at))
+                self.state = HALF_OPEN
+                self._probe_started = None
+
+            if self.state == HALF_OPEN:
+                # 探测请求未记录结果（如请求前就出错）时，超过超时时间后允许新的探测
+                if self._probe_started is not None and now - self._probe_started < self.max_timeout:
+                    self._reject()
+                    raise CircuitOpenError(self.engine, self.max_timeout - (now - self._probe_started))
+                self._probe_started = now
+                return now
+            return None
+
+    def release(self, probe):
+        """释放 allow() 认领的探测：探测没有记录上游请求的结果就结束时，允许新的探测
+
+        Args:
+            probe (float|None): allow() 的返回值
+        """
+        if probe is None:
+            return
+        with self._lock:
+            if self.state == HALF_OPEN and self._probe_started == probe:
+                self._probe_started = None
+
+    def _reject(self):
+        self.rejections += 1
+        metrics.CIRCUIT_REJECTIONS.labels(self.engine).inc()
+
+    def record(self, failed, latency):
+        """记录一次上游请求的结果
+
+        Args:
+            failed (bool): 是否失败（连接错误、超时、5xx/429）
+            latency (float): 耗时（秒），超时的请求按超时时间计
+        """
+        failed = failed or latency >= self.slow_seconds
+        with self._lock:
+            self._latencies.append(latency)
+            if len(self._latencies) >= MIN_LATENCY_SAMPLES:
+                self._timeout = self._compute_timeout()
+
+            if self.state == HALF_OPEN:
+                if failed:
+                    self._open()
+                else:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                    self._probe_started = None
+                return
+
+            self._outcomes.append(failed)
+            if self.state == CLOSED and len(self._outcomes) >= self.min_requests:
+                if sum(self._outcomes) / len(self._outcomes) >= self.error_rate:
+                    self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._probe_started = None
+        self._outcomes.clear()
+
+    def _compute_timeout(self):
+        """根据最近耗时的 p99 计算超时时间"""
+        samples = sorted(self._latencies)
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        return max(self.min_timeout, min(self.max_timeout, p99 * self.multiplier))
+
+    def timeout(self):
+        """当前的上游请求超时时间（秒）"""
+        return round(self._timeout, 3)
+
+    def percentile(self, q, min_samples=1):
+        """最近请求耗时的分位数（秒），样本数少于 min_samples 时返回None"""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples or len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+    def snapshot(self):
+        """返回熔断器状态，用于 /api/health"""
+        with self._lock:
+            outcomes = list(self._outcomes)
+            state = self.state
+            retry_after = max(0.0, self.open_seconds - (time.monotonic() - self._opened_at)) if state == OPEN else 0
+        p95, p99 = self.percentile(0.95), self.percentile(0.99)
+        return {
+            'state': state,
+            'timeout': self.timeout(),
+            'errorRate': round(sum(outcomes) / len(outcomes), 4) if outcomes else 0,
+            'requests': len(outcomes),
+            'p95': round(p95, 3) if p95 is not None else None,
+            'p99': round(p99, 3) if p99 is not None else None,
+            'retryAfter': round(retry_after, 1),
+            'rejections': self.rejections
+        }
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get(engine):
+    """获取（或创建）搜索引擎的熔断器"""
+    breaker = _breakers.get(engine)
+    if breaker is not None:
+        return breaker
+
+    with _breakers_lock:
+        breaker = _breakers.get(engine)
+        if breaker is None:
+            breaker = CircuitBreaker(engine)
+            _breakers[engine] = breaker
+            metrics.CIRCUIT_STATE.labels(engine).set_function(lambda: STATE_VALUES[breaker.state])
+            metrics.UPSTREAM_TIMEOUT.labels(engine).set_function(breaker.timeout)
+    return breaker
+
+def allow(engine):
+    """检查搜索引擎的熔断器是否允许发出请求，不允许时抛出 CircuitOpenError
+
+    Returns:
+        float|None: 认领的探测，请求结束后应传给 release()
+    """
+    return get(engine).allow()
+
+def release(engine, probe):
+    """释放搜索引擎的熔断器中未记录结果的探测"""
+    get(engine).release(probe)
+
+def timeout(engine):
+    """返回搜索引擎当前的上游请求超时时间（秒）"""
+    return get(engine).timeout()
+
+def record(engine, failed, latency):
+    """记录搜索引擎的一次上游请求结果"""
+    get(engine).record(failed, latency)
+
+def snapshot():
+    """返回所有已使用的搜索引擎的熔断器状态"""
+    return {engine: breaker.snapshot() for engine, breaker in sorted(_breakers.items())}
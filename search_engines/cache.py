@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+搜索结果缓存实现
+
+进程内的LRU/TTL缓存，位于 /api/search 之前。热门查询重复出现时直接返回缓存结果，
+避免重复调用上游搜索引擎。
+
+- 过期后重新验证（stale-while-revalidate）：结果过期后的一段时间内仍可直接返回，同时在后台刷新
+- 错误缓存（negative caching）：上游出错的结果短时间缓存，避免故障的上游被反复请求
+- 磁盘缓存（设置 DISK_CACHE_PATH 时）：作为第二层，所有工作进程共享并在重启后保留（见 disk_cache 模块）
+"""
+
+import json
+import time
+import asyncio
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from . import metrics, models, disk_cache, codec
+from .config import env_int, engine_env
+
+# 默认缓存时间（秒），可通过 CACHE_TTL_<ENGINE> 为每个搜索引擎单独配置
+DEFAULT_TTL = 300
+
+# 结果过期后仍可返回（并在后台刷新）的时间（秒），可通过 CACHE_STALE_TTL_<ENGINE> 单独配置
+DEFAULT_STALE_TTL = 120
+
+# 错误结果的缓存时间（秒），可通过 CACHE_NEGATIVE_TTL_<ENGINE> 单独配置
+DEFAULT_NEGATIVE_TTL = 30
+
+# 后台刷新被认领后，在该时间（秒）内不会再次发起刷新
+REFRESH_HOLD = 60
+
+# lookup() 返回的缓存状态
+FRESH = 'fresh'
+STALE = 'stale'
+NEGATIVE = 'negative'
+
+def normalize_query(query):
+    """规范化搜索查询：统一全角/半角字符、大小写并合并多余空白"""
+    query = unicodedata.normalize('NFKC', query or '')
+    return ' '.join(query.split()).casefold()
+
+def make_key(engine, query, params):
+    """根据搜索引擎、规范化后的查询和全部引擎参数生成缓存键
+
+    Args:
+        engine (str): 搜索引擎
+        query (str): 搜索查询
+        params (dict): 搜索引擎的额外参数
+
+    Returns:
+        str: 缓存键
+    """
+    items = sorted((k, v) for k, v in params.items() if v is not None)
+    return json.dumps([engine, normalize_query(query), items], ensure_ascii=False, separators=(',', ':'))
+
+def engine_ttl(engine):
+    """返回搜索引擎的缓存时间（秒）"""
+    return engine_env('CACHE_TTL', engine, DEFAULT_TTL)
+
+def engine_stale_ttl(engine):
+    """返回搜索引擎结果过期后仍可返回的时间（秒）"""
+    return engine_env('CACHE_STALE_TTL', engine, DEFAULT_STALE_TTL)
+
+def engine_negative_ttl(engine):
+    """返回搜索引擎错误结果的缓存时间（秒）"""
+    return engine_env('CACHE_NEGATIVE_TTL', engine, DEFAULT_NEGATIVE_TTL)
+
+def _serialize(value):
+    """将缓存值序列化为JSON（SearchItem 写为 compact 格式），其长度也作为估算的内存占用"""
+    return codec.dumps(value, default=models.json_default)
+
+class _Entry:
+    """缓存条目"""
+
+    __slots__ = ('value', 'expires_at', 'stale_until', 'refresh_after', 'size', 'negative')
+
+    def __init__(self, value, expires_at, stale_until, size, negative):
+        self.value = value
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+        self.refresh_after = expires_at
+        self.size = size
+        self.negative = negative
+
+class ResultCache:
+    """线程安全的LRU/TTL结果缓存
+
+    同时限制条目数量和估算的内存占用，超出任一上限时淘汰最久未使用的条目。
+    正常结果过期后在 stale_ttl 时间内仍保留，由 lookup() 返回 STALE 状态供调用方在后台刷新。
+    指定 backing（disk_cache.DiskCache）时，写入的结果同时写入磁盘缓存，内存中未命中时从磁盘缓存读取。
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, backing=None):
+        self.max_entries = max_entries if max_entries is not None else env_int('CACHE_MAX_ENTRIES', 1000)
+        self.max_bytes = max_bytes if max_bytes is not None else env_int('CACHE_MAX_BYTES', 64 * 1024 * 1024)
+        self._entries = OrderedDict()  # key -> _Entry
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.backing = backing
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+        self.negative_hits = 0
+        self.disk_hits = 0
+
+    def get(self, key):
+        """获取未过期的缓存结果，不存在或已过期时返回None"""
+        value, state = self.lookup(key)
+        return value if state == FRESH else None
+
+    def lookup(self, key):
+        """获取缓存结果及其状态
+
+        Returns:
+            tuple: (搜索结果, 状态)，状态为 FRESH、STALE（已过期但仍可返回）或 NEGATIVE（缓存的错误结果）；
+                   不存在或超出可返回时间时为 (None, None)
+        """
+        now = time.time()
+        found = self._lookup_memory(key, now)
+        return found if found is not None else self._lookup_backing(key, now)
+
+    async def async_lookup(self, key):
+        """lookup() 的异步版本：内存查询在事件循环中执行，磁盘缓存的读取和解码在线程中执行"""
+        now = time.time()
+        found = self._lookup_memory(key, now)
+        return found if found is not None else await asyncio.to_thread(self._lookup_backing, key, now)
+
+    def _lookup_memory(self, key, now):
+        """在内存中查询，返回 lookup() 的结果；需要查询磁盘缓存时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.stale_until <= now:
+                del self._entries[key]
+                self._bytes -= entry.size
+                self.expirations += 1
+                entry = None
+
+            if entry is not None and (entry.expires_at > now or self.backing is None):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value, self._state(entry, now)
+            if self.backing is None:
+                self.misses += 1
+                return None, None
+        return None
+
+    def _lookup_backing(self, key, now):
+        """内存中没有，或内存中的结果已过期时查询磁盘缓存（其他工作进程可能已写入了更新的结果，如缓存预热）"""
+        loaded = self._load(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.stale_until <= now:
+                entry = None
+            if loaded is not None and (entry is None or loaded.expires_at > entry.expires_at):
+                self._insert(key, loaded)
+                self.hits += 1
+                self.disk_hits += 1
+                return loaded.value, self._state(loaded, now)
+
+            if entry is None:
+                self.misses += 1
+                return None, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value, self._state(entry, now)
+
+    def _state(self, entry, now):
+        """返回条目的缓存状态（调用方持有锁）"""
+        if entry.negative:
+            self.negative_hits += 1
+            return NEGATIVE
+        if entry.expires_at <= now:
+            self.stale_hits += 1
+            return STALE
+        return FRESH
+
+    def _load(self, key):
+        """从磁盘缓存读取条目，不存在或数据无效时返回None"""
+        if self.backing is None or self.max_entries <= 0:
+            return None
+        found = self.backing.get(key)
+        if found is None:
+            return None
+        data, expires_at, stale_until, negative = found
+        if len(data) > self.max_bytes:
+            return None
+        try:
+            value = models.load(codec.loads(data))
+        except ValueError:
+            return None
+        return _Entry(value, expires_at, stale_until, len(data), negative)
+
+    def set(self, key, value, ttl, stale_ttl=0, negative=False):
+        """写入缓存结果
+
+        Args:
+            key (str): 缓存键
+            value (dict): 搜索结果
+            ttl (int): 缓存时间（秒），小于等于0时不缓存
+            stale_ttl (int, optional): 过期后仍可返回的时间（秒）
+            negative (bool, optional): 是否为错误结果
+        """
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+
+        data = _serialize(value)
+        if len(data) > self.max_bytes:
+            return
+
+        expires_at = time.time() + ttl
+        stale_until = expires_at + max(stale_ttl, 0)
+        with self._lock:
+            self._insert(key, _Entry(value, expires_at, stale_until, len(data), negative))
+        if self.backing is not None:
+            self.backing.set(key, data, expires_at, stale_until, negative)
+
+    def _insert(self, key, entry):
+        """写入内存中的条目并按LRU顺序淘汰，直到满足条目数和内存上限（调用方持有锁）"""
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.size
+
+        self._entries[key] = entry
+        self._bytes += entry.size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self.evictions += 1
+
+    def contains(self, key):
+        """内存中是否有仍可返回的条目（不计入命中统计）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry.stale_until > time.time()
+
+    def expires_in(self, key):
+        """返回正常结果距离过期的秒数（已过期时为负数，不计入命中统计），没有正常结果时返回None
+
+        内存中没有时查询磁盘缓存。
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.stale_until > now:
+                return None if entry.negative else entry.expires_at - now
+        if self.backing is None:
+            return None
+        expires_at = self.backing.expires_at(key)
+        return expires_at - now if expires_at is not None else None
+
+    def claim_refresh(self, key):
+        """认领过期结果的后台刷新，返回是否需要由调用方刷新
+
+        同一条目在刷新完成（set() 覆盖）、失败（defer_refresh()）或 REFRESH_HOLD 秒之前只会被认领一次。
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.negative or now < entry.refresh_after:
+                return False
+            entry.refresh_after = now + REFRESH_HOLD
+            return True
+
+    def defer_refresh(self, key, seconds):
+        """刷新失败时推迟下一次刷新，期间继续返回过期结果
+
+        Returns:
+            bool: 是否存在仍可返回的正常结果
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.negative or entry.stale_until <= now:
+                return False
+            entry.refresh_after = now + seconds
+            return True
+
+    def clear(self):
+        """清空内存中的缓存（不影响磁盘缓存）"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            stats = {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'maxEntries': self.max_entries,
+                'maxBytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / total, 4) if total else 0,
+                'staleHits': self.stale_hits,
+                'negativeHits': self.negative_hits,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'diskHits': self.disk_hits
+            }
+        if self.backing is not None:
+            stats['disk'] = self.backing.stats()
+        return stats
+
+# 全局结果缓存
+result_cache = ResultCache(backing=disk_cache.from_env())
+
+metrics.CACHE_ENTRIES.labels().set_function(lambda: len(result_cache._entries))
+metrics.CACHE_BYTES.labels().set_function(lambda: result_cache._bytes)
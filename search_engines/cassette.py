@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+上游请求录制与回放实现
+
+CASSETTE_MODE=record 时，搜索引擎经共享HTTP客户端（见 http_client 模块）发送的每个上游请求
+（方法、地址、查询参数、JSON请求体、请求头）及其响应（状态码、响应头、响应体、耗时）或异常追加到
+CASSETTE_PATH，所有工作进程写入同一个文件（O_APPEND，每条一次写入）。每条记录是一行 compact JSON；
+路径以 .gz 结尾时每条记录压缩为一个 gzip 成员，整个文件仍可用 gzip 直接读取。
+
+API密钥等敏感信息在写入前替换为 [REDACTED]：Authorization、Cookie 等请求头，名称中含 key、token、
+secret、password 的请求头、查询参数和请求体字段，以及地址中的用户名和密码。
+
+CASSETTE_MODE=replay 时不再访问上游：按请求（方法、路径、查询参数和请求体，不含主机名，
+SearXNG 多实例的请求都能匹配）返回录制的响应或抛出录制的异常。同一请求有多条记录时按录制顺序依次返回，
+用完后从头开始。没有匹配的记录时按连接错误处理。CASSETTE_TIMING=original 时按录制时的耗时等待后返回，
+zero（默认）时立即返回，用于排除上游延迟、单独测量结果转换和响应输出的耗时。
+
+配置:
+    CASSETTE_MODE    off（默认）、record 或 replay
+    CASSETTE_PATH    录像文件路径
+    CASSETTE_TIMING  回放时的延迟：zero（默认）或 original
+"""
+
+import os
+import re
+import gzip
+import json
+import time
+import base64
+import asyncio
+import threading
+from collections import deque
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+RECORD = 'record'
+REPLAY = 'replay'
+
+# 回放延迟
+ORIGINAL = 'original'
+ZERO = 'zero'
+
+REDACTED = '[REDACTED]'
+
+# 总是替换的请求头和响应头
+_SECRET_HEADERS = frozenset(['authorization', 'proxy-authorization', 'cookie', 'set-cookie'])
+
+# 名称中含这些词的请求头、查询参数和请求体字段视为敏感信息
+_SECRET_NAME_RE = re.compile(r'key|token|secret|password|passwd|auth', re.IGNORECASE)
+
+# 响应体以解码后的内容保存，这些响应头不再适用
+_DROP_RESPONSE_HEADERS = frozenset(['content-encoding', 'content-length', 'transfer-encoding', 'connection'])
+
+def _redact_value(name, value):
+    return REDACTED if _SECRET_NAME_RE.search(str(name)) else value
+
+def redact_headers(headers):
+    """返回替换了敏感信息的请求头"""
+    return {
+        name: REDACTED if name.lower() in _SECRET_HEADERS else _redact_value(name, value)
+        for name, value in (headers or {}).items()
+    }
+
+def redact_params(params):
+    """返回替换了敏感信息并排序的查询参数列表"""
+    if not params:
+        return []
+    items = params.items() if isinstance(params, dict) else params
+    return sorted([str(name), str(_redact_value(name, value))] for name, value in items if value is not None)
+
+def redact_json(data):
+    """返回替换了敏感字段的JSON请求体"""
+    if isinstance(data, dict):
+        return {name: REDACTED if _SECRET_NAME_RE.search(str(name)) else redact_json(value)
+                for name, value in data.items()}
+    if isinstance(data, list):
+        return [redact_json(value) for value in data]
+    return data
+
+def redact_url(url):
+    """去掉地址中的用户名和密码，并替换敏感的查询参数"""
+    parts = urlsplit(url)
+    netloc = parts.netloc.rsplit('@', 1)[-1]
+    query = parts.query
+    if query:
+        query = '&'.join(
+            f'{name}={REDACTED}' if _SECRET_NAME_RE.search(name) else f'{name}={value}' if sep else name
+            for name, sep, value in (item.partition('=') for item in query.split('&'))
+        )
+    return urlunsplit((parts.scheme, netloc, parts.path, query, parts.fragment))
+
+def match_key(method, url, params, json_body):
+    """返回用于匹配录制记录的键（不含主机名）"""
+    parts = urlsplit(redact_url(url))
+    return json.dumps(
+        [method.upper(), parts.path, parts.query, redact_params(params), redact_json(json_body)],
+        ensure_ascii=False, sort_keys=True, separators=(',', ':')
+    )
+
+class Recorder:
+    """将上游请求和响应追加写入录像文件，fork 出的子进程会重新打开文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self.compress = path.endswith('.gz')
+        self._fd = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.errors = 0
+
+    def _open(self):
+        """打开录像文件（调用方持有锁）"""
+        if self._fd is not None and self._pid == os.getpid():
+            return self._fd
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        self._pid = os.getpid()
+        return self._fd
+
+    def record(self, engine, method, url, params, json_body, headers, elapsed, response=None, error=None):
+        """追加一次上游请求
+
+        Args:
+            engine (str): 发起请求的搜索引擎
+            method (str): 请求方法
+            url (str): 请求地址
+            params (dict|list): 查询参数
+            json_body: JSON请求体
+            headers (dict): 请求头
+            elapsed (float): 耗时（秒）
+            response (requests.Response, optional): 响应
+            error (Exception, optional): 请求异常
+        """
+        entry = {
+            't': round(time.time(), 3),
+            'engine': engine,
+            'method': method.upper(),
+            'url': redact_url(url),
+            'params': redact_params(params),
+            'json': redact_json(json_body),
+            'headers': redact_headers(headers),
+            'elapsed': round(elapsed, 4)
+        }
+        if error is not None:
+            entry['error'] = 'timeout' if isinstance(error, requests.exceptions.Timeout) else 'connection'
+            entry['message'] = str(error)
+        else:
+            content = response.content or b''
+            entry['status'] = response.status_code
+            entry['response_headers'] = {
+                name: REDACTED if name.lower() in _SECRET_HEADERS else value
+                for name, value in response.headers.items() if name.lower() not in _DROP_RESPONSE_HEADERS
+            }
+            entry['encoding'] = response.encoding
+            try:
+                entry['body'] = content.decode('utf-8')
+            except UnicodeDecodeError:
+                entry['body_base64'] = base64.b64encode(content).decode('ascii')
+
+        data = (json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        if self.compress:
+            data = gzip.compress(data, compresslevel=6)
+        try:
+            with self._lock:
+                os.write(self._open(), data)
+                self.written += 1
+        except OSError as e:
+            self.errors += 1
+            logger.warning('写入上游录像失败: %s', e)
+
+class Player:
+    """按请求返回录像文件中的响应
+
+    Args:
+        path (str): 录像文件路径
+        timing (str, optional): original 按录制时的耗时等待，zero 立即返回
+    """
+
+    def __init__(self, path, timing=ZERO):
+        self.path = path
+        self.timing = timing
+        # 匹配键 -> 录制的记录，按录制顺序轮流返回
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.played = 0
+        self.missed = 0
+        self._load()
+
+    def _load(self):
+        opener = gzip.open if self.path.endswith('.gz') else open
+        count = 0
+        with opener(self.path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    key = match_key(entry['method'], entry['url'], entry['params'], entry['json'])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                self._entries.setdefault(key, deque()).append(entry)
+                count += 1
+        logger.info('已加载上游录像', extra={'path': self.path, 'entries': count, 'requests': len(self._entries)})
+
+    def _next(self, method, url, params, json_body):
+        """取出匹配的下一条记录，没有时抛出连接错误"""
+        key = match_key(method, url, params, json_body)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.missed += 1
+                raise requests.exceptions.ConnectionError(f'录像中没有匹配的请求: {method.upper()} {redact_url(url)}')
+            entry = entries[0]
+            entries.rotate(-1)
+            self.played += 1
+        return entry
+
+    def _delay(self, entry):
+        return entry.get('elapsed', 0) if self.timing == ORIGINAL else 0
+
+    def _result(self, entry, url):
+        """根据记录构造响应或抛出录制的异常"""
+        error = entry.get('error')
+        if error == 'timeout':
+            raise requests.exceptions.Timeout(entry.get('message') or '请求超时')
+        if error is not None:
+            raise requests.exceptions.ConnectionError(entry.get('message') or '连接失败')
+
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict(entry.get('response_headers') or {})
+        if 'body_base64' in entry:
+            response._content = base64.b64decode(entry['body_base64'])
+        else:
+            response._content = entry.get('body', '').encode('utf-8')
+        response.encoding = entry.get('encoding')
+        response.url = url
+        response.reason = 'Replayed'
+        return response
+
+    def play(self, method, url, params=None, json_body=None):
+        """返回与请求匹配的响应
+
+        Raises:
+            requests.exceptions.RequestException: 录制的异常，或没有匹配的记录
+        """
+        entry = self._next(method, url, params, json_body)
+        delay = self._delay(entry)
+        if delay > 0:
+            time.sleep(delay)
+        return self._result(entry, url)
+
+    async def async_play(self, method, url, params=None, json_body=None):
+        """play 的异步版本"""
+        entry = self._next(method, url, params, json_body)
+        delay = self._delay(entry)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self._result(entry, url)
+
+    def stats(self):
+        """返回回放统计信息"""
+        return {
+            'requests': len(self._entries),
+            'entries': sum(len(entries) for entries in self._entries.values()),
+            'played': self.played,
+            'missed': self.missed
+        }
+
+# 当前的录制器和回放器（同时只有一个生效）
+recorder = None
+player = None
+
+def start_recording(path):
+    """开始录制上游请求"""
+    global recorder, player
+    recorder, player = Recorder(path), None
+    return recorder
+
+def start_replay(path, timing=ZERO):
+    """开始回放录像，不再访问上游"""
+    global recorder, player
+    recorder, player = None, Player(path, timing)
+    return player
+
+def stop():
+    """停止录制或回放"""
+    global recorder, player
+    recorder = player = None
+
+def from_env():
+    """根据 CASSETTE_MODE 等环境变量开始录制或回放"""
+    mode = (os.getenv('CASSETTE_MODE') or 'off').strip().lower()
+    path = os.getenv('CASSETTE_PATH')
+    if mode not in (RECORD, REPLAY):
+        return
+    if not path:
+        logger.warning('CASSETTE_MODE=%s 需要设置 CASSETTE_PATH', mode)
+        return
+    if mode == RECORD:
+        start_recording(path)
+        return
+    timing = (os.getenv('CASSETTE_TIMING') or ZERO).strip().lower()
+    if timing not in (ORIGINAL, ZERO):
+        logger.warning('无效的 CASSETTE_TIMING: %s，使用 zero', timing)
+        timing = ZERO
+    start_replay(path, timing)
+
+from_env()
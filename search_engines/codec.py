@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+JSON编解码实现
+
+响应输出（Flask 和 ASGI）、NDJSON流、结果缓存、进程间共享的结果文件以及上游响应的解析
+都通过这里编码和解码JSON。安装了 orjson 时使用 orjson（编码快数倍，直接输出UTF-8字节），
+否则使用标准库 json。两者都输出不转义非ASCII字符的 compact JSON，写入的数据可以互相读取。
+
+配置:
+    JSON_CODEC  auto（默认，安装了 orjson 时使用）、orjson 或 json
+"""
+
+import os
+import json
+
+from .log import get_logger
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson 为可选依赖
+    orjson = None
+
+logger = get_logger(__name__)
+
+ORJSON = 'orjson'
+JSON = 'json'
+
+def _json_dumps(value, default=None, sort_keys=False):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=default,
+                      sort_keys=sort_keys).encode('utf-8')
+
+def _json_loads(data):
+    return json.loads(data)
+
+def _orjson_dumps(value, default=None, sort_keys=False):
+    # 与标准库一致，非字符串的键转为字符串
+    option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+    try:
+        return orjson.dumps(value, default=default, option=option)
+    except TypeError:
+        # orjson 不支持的值（如超过64位的整数）退回到标准库，无法序列化时由标准库抛出异常
+        return _json_dumps(value, default, sort_keys)
+
+def _orjson_loads(data):
+    return orjson.loads(data)
+
+def _select():
+    """根据 JSON_CODEC 选择编解码实现"""
+    name = (os.getenv('JSON_CODEC') or 'auto').strip().lower()
+    if name not in ('auto', ORJSON, JSON):
+        logger.warning('无效的 JSON_CODEC: %s，使用 auto', name)
+        name = 'auto'
+    if name == ORJSON and orjson is None:
+        logger.warning('JSON_CODEC=orjson 但未安装 orjson，使用标准库 json')
+    if name != JSON and orjson is not None:
+        return ORJSON, _orjson_dumps, _orjson_loads
+    return JSON, _json_dumps, _json_loads
+
+# 当前使用的实现
+NAME, _dumps, _loads = _select()
+
+def dumps(value, default=None, sort_keys=False):
+    """将值编码为 compact JSON
+
+    Args:
+        value: 要编码的值
+        default (callable, optional): 转换不能直接编码的对象，与 json.dumps 的 default 相同
+        sort_keys (bool, optional): 是否按键排序
+
+    Returns:
+        bytes: UTF-8编码的JSON
+
+    Raises:
+        TypeError: 存在无法编码的对象
+    """
+    return _dumps(value, default, sort_keys)
+
+def loads(data):
+    """解码JSON（str 或 UTF-8 编码的 bytes）
+
+    Raises:
+        json.JSONDecodeError: 格式无效（orjson 的异常是其子类）
+    """
+    return _loads(data)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+环境变量配置读取工具
+"""
+
+import os
+
+def env_int(name, default):
+    """读取整数类型的环境变量，未设置或无效时返回默认值"""
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+def env_float(name, default):
+    """读取浮点类型的环境变量，未设置或无效时返回默认值"""
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+def env_bool(name, default):
+    """读取布尔类型的环境变量，支持 1/0、true/false、yes/no、on/off"""
+    value = os.getenv(name)
+    if value is None or value.strip() == '':
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+def engine_env(kind, engine, default, parse=env_int):
+    """读取按搜索引擎区分的配置
+
+    先读取 <KIND>_<ENGINE>（如 CACHE_TTL_BOCHAAI），未设置时读取 <KIND>，
+    都未设置时返回默认值。
+    """
+    return parse(f'{kind}_{engine.upper()}', parse(kind, default))
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+结果去重实现
+
+SearXNG 汇总多个搜索引擎的结果，同一页面经常以不同形式重复出现：带跟踪参数、http/https、
+www/非www 的链接，或内容几乎相同的镜像站点。各搜索引擎的结果转换后按以下两步去重，保留排名最高的一条：
+
+- 链接规范化：忽略协议、www 前缀、默认端口、末尾斜杠、锚点和常见跟踪参数（utm_*、fbclid 等），
+  其余查询参数按名称排序
+- 近似重复：以标题和摘要中连续的3个字符（忽略大小写和标点）作为特征，特征集合的 Jaccard 相似度
+  不低于 DEDUP_SIMILARITY 的不同网站的结果视为重复（同一网站内标题和摘要相近的通常是不同页面，
+  如同一文档的不同版本）。每条结果计算 MinHash 签名并分段建立索引（LSH），
+  只与至少一段签名完全相同的结果比较，总耗时与结果数成线性
+
+聚合搜索合并各搜索引擎的结果时也使用同样的规则。
+
+配置:
+    DEDUP             是否对各搜索引擎的结果去重，默认开启；可用 DEDUP_<ENGINE> 单独配置
+    DEDUP_SIMILARITY  视为近似重复的最低相似度（0-1），默认0.7，0表示只按链接去重；
+                      可用 DEDUP_SIMILARITY_<ENGINE> 单独配置（聚合搜索为 DEDUP_SIMILARITY_ALL）
+"""
+
+import re
+import unicodedata
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+from . import metrics
+from .config import env_float, env_bool, engine_env
+from .zhipuai import is_valid_url
+
+# 特征长度（字符数）
+SHINGLE = 3
+
+# 参与比较的最大文本长度
+MAX_TEXT = 500
+
+# 特征数少于该值的结果（如只有很短的标题）不做近似重复判断，避免误判
+MIN_FEATURES = 24
+
+# MinHash 签名分为 BANDS 段，每段 ROWS 个值；相似度约 (1/BANDS)^(1/ROWS)=0.5 以上的结果大概率成为候选
+BANDS = 16
+ROWS = 4
+SIGNATURE_SIZE = BANDS * ROWS
+
+# 不影响页面内容的跟踪参数
+TRACKING_PARAMS = frozenset((
+    'fbclid', 'gclid', 'dclid', 'gbraid', 'wbraid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid',
+    '_hsenc', '_hsmkt', 'ref_src', 'spm', 'scm', 'share_source', 'share_medium', 'wt.mc_id'
+))
+TRACKING_PREFIXES = ('utm_',)
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+_WORD_RE = re.compile(r'\w+')
+
+_HASH_MASK = (1 << 64) - 1
+_EMPTY = 1 << 64
+
+def canonical_url(url):
+    """返回用于判断重复的规范化链接，无效链接返回None
+
+    Args:
+        url (str): 结果链接
+
+    Returns:
+        str|None: 不含协议的规范化链接，如 example.com/path?a=1
+    """
+    if not is_valid_url(url):
+        return None
+    try:
+        parts = urlsplit(url.strip())
+        host = (parts.hostname or '').rstrip('.')
+        port = parts.port
+    except ValueError:
+        return None
+
+    if host.startswith('www.'):
+        host = host[4:]
+    if port and port != DEFAULT_PORTS.get(parts.scheme.lower()):
+        host = f'{host}:{port}'
+
+    path = parts.path.rstrip('/')
+    params = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name.lower() not in TRACKING_PARAMS and not name.lower().startswith(TRACKING_PREFIXES)
+    )
+    return f'{host}{path}?{urlencode(params)}' if params else f'{host}{path}'
+
+def _host(url):
+    """规范化链接中的网站部分"""
+    return url.split('/', 1)[0].split('?', 1)[0] if url is not None else None
+
+def shingles(text):
+    """返回文本的特征集合（忽略大小写和标点后连续的 SHINGLE 个字符）"""
+    text = ' '.join(_WORD_RE.findall(unicodedata.normalize('NFKC', text[:MAX_TEXT]).casefold()))
+    return {text[start:start + SHINGLE] for start in range(len(text) - SHINGLE + 1)}
+
+def minhash(features):
+    """计算特征集合的 MinHash 签名
+
+    使用单次哈希的 MinHash（one permutation hashing）：每个特征哈希一次，按哈希值分到
+    SIGNATURE_SIZE 个桶中取最小值，空桶借用右侧最近的非空桶。特征使用进程内的字符串哈希，
+    签名只能在同一进程内比较，不应保存。
+
+    Args:
+        features (set): shingles() 返回的特征集合，不能为空
+
+    Returns:
+        list: SIGNATURE_SIZE 个整数
+    """
+    signature = [_EMPTY] * SIGNATURE_SIZE
+    for feature in features:
+        h = hash(feature) & _HASH_MASK
+        index = h % SIGNATURE_SIZE
+        value = h // SIGNATURE_SIZE
+        if value < signature[index]:
+            signature[index] = value
+
+    for index in range(SIGNATURE_SIZE):
+        if signature[index] == _EMPTY:
+            for offset in range(1, SIGNATURE_SIZE):
+                value = signature[(index + offset) % SIGNATURE_SIZE]
+                if value < _EMPTY:
+                    # 加上偏移量，避免不同桶借用同一个值后被误认为相同
+                    signature[index] = value + offset * _EMPTY
+                    break
+    return signature
+
+def similarity(a, b):
+    """两个特征集合的 Jaccard 相似度"""
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+class Deduplicator:
+    """按加入顺序判断结果是否与已保留的结果重复
+
+    Args:
+        threshold (float): 视为近似重复的最低相似度，小于等于0时只按链接去重
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self._urls = {}
+        self._buckets = [{} for _ in range(BANDS)] if threshold > 0 else ()
+        self._features = []
+        self._hosts = []
+        self.url_duplicates = 0
+        self.near_duplicates = 0
+
+    def add(self, item):
+        """加入一条结果
+
+        Returns:
+            int|None: 与已保留的第几条结果重复；不重复时返回None，该结果被保留并编号为已保留的结果数
+        """
+        url = canonical_url(item.link)
+        if url is not None and url in self._urls:
+            self.url_duplicates += 1
+            return self._urls[url]
+
+        features = None
+        keys = ()
+        if self._buckets and item.refer != '错误':
+            features = shingles(f'{item.title} {item.content}')
+            if len(features) < MIN_FEATURES:
+                features = None
+            else:
+                signature = minhash(features)
+                keys = [tuple(signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+                duplicate = self._find(features, keys, _host(url))
+                if duplicate is not None:
+                    self.near_duplicates += 1
+                    if url is not None:
+                        self._urls[url] = duplicate
+                    return duplicate
+
+        index = len(self._features)
+        self._features.append(features)
+        self._hosts.append(_host(url))
+        if url is not None:
+            self._urls[url] = index
+        for key, bucket in zip(keys, self._buckets):
+            bucket.setdefault(key, []).append(index)
+        return None
+
+    def _find(self, features, keys, host):
+        """在签名至少有一段相同的其他网站的已保留结果中查找相似度达到阈值的第一条"""
+        checked = set()
+        for key, bucket in zip(keys, self._buckets):
+            for index in bucket.get(key, ()):
+                if index in checked:
+                    continue
+                checked.add(index)
+                if host is not None and self._hosts[index] == host:
+                    continue
+                if similarity(features, self._features[index]) >= self.threshold:
+                    return index
+        return None
+
+def engine_similarity(engine):
+    """返回搜索引擎的近似重复相似度阈值"""
+    return engine_env('DEDUP_SIMILARITY', engine, 0.7, parse=env_float)
+
+def dedupe(engine, result):
+    """对搜索引擎转换后的结果去重（原地修改），保留排名最高的一条
+
+    Args:
+        engine (str): 搜索引擎
+        result (dict): 智谱AI兼容格式的搜索结果，search_result 为 SearchItem 列表
+
+    Returns:
+        dict: 去重后的结果，有重复时 meta.duplicates 为删除的结果数
+    """
+    items = result.get('search_result')
+    if not items or len(items) < 2 or not engine_env('DEDUP', engine, True, parse=env_bool):
+        return result
+
+    deduplicator = Deduplicator(engine_similarity(engine))
+    kept = [item for item in items if deduplicator.add(item) is None]
+    removed = len(items) - len(kept)
+    if removed:
+        result['search_result'] = kept
+        if isinstance(result.get('meta'), dict):
+            result['meta']['duplicates'] = removed
+        if deduplicator.url_duplicates:
+            metrics.DUPLICATES_REMOVED.labels(engine, 'url').inc(deduplicator.url_duplicates)
+        if deduplicator.near_duplicates:
+            metrics.DUPLICATES_REMOVED.labels(engine, 'near').inc(deduplicator.near_duplicates)
+    return result
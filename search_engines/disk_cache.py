@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+磁盘结果缓存实现
+
+结果缓存的第二层：基于 SQLite（WAL 模式），所有工作进程共享同一个数据库文件，容器重启后缓存仍然有效。
+进程内缓存未命中时查询磁盘缓存，命中的结果会载入进程内缓存。
+
+- 结果以 zlib 压缩的 compact JSON（见 models 模块）保存
+- 读取时更新最近访问时间（同一条目最多每 ACCESS_RESOLUTION 秒更新一次，避免每次读取都写库）
+- 后台压缩任务定期删除超出可返回时间的条目，总大小超过上限时按最近访问时间淘汰，并回收文件空间。
+  多个工作进程中每个压缩周期只有一个进程执行
+
+WAL 模式依赖共享内存，数据库文件应放在本地磁盘上（不支持网络文件系统）。
+
+配置:
+    DISK_CACHE_PATH              数据库文件路径，未设置时不使用磁盘缓存
+    DISK_CACHE_MAX_BYTES         压缩后结果的总大小上限（字节），默认256MB
+    DISK_CACHE_COMPACT_INTERVAL  后台压缩的间隔（秒），默认300
+"""
+
+import os
+import time
+import zlib
+import sqlite3
+import threading
+
+from .config import env_int, env_float
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# 数据库结构版本，变化时丢弃旧的缓存数据
+SCHEMA_VERSION = 1
+
+# 最近访问时间的更新精度（秒）
+ACCESS_RESOLUTION = 60
+
+# 超过上限时淘汰到上限的该比例，避免每次压缩都只淘汰少量条目
+EVICT_TARGET = 0.9
+
+# zlib 压缩级别
+COMPRESS_LEVEL = 6
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    stale_until REAL NOT NULL,
+    negative INTEGER NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+CREATE INDEX IF NOT EXISTS entries_stale_until ON entries (stale_until);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+INSERT OR IGNORE INTO meta (name, value) VALUES ('compacted_at', 0);
+"""
+
+class DiskCache:
+    """SQLite 磁盘缓存，保存已序列化的结果（bytes）
+
+    每个线程使用自己的数据库连接，fork 出的子进程会重新建立连接。
+    数据库出错时记录日志并视为未命中，不影响搜索请求。
+    """
+
+    def __init__(self, path, max_bytes=None, compact_interval=None):
+        self.path = path
+        self.max_bytes = max_bytes if max_bytes is not None else env_int('DISK_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+        self.compact_interval = (compact_interval if compact_interval is not None
+                                 else env_float('DISK_CACHE_COMPACT_INTERVAL', 300))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._compactor_pid = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+
+    def _connect(self):
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        # 只对新建的数据库生效（必须在建表之前），压缩时据此回收删除条目占用的页
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        if conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            self._create_schema(conn)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        self._start_compactor()
+        return conn
+
+    def _create_schema(self, conn):
+        """创建（或重建）数据库结构"""
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # 其他进程可能已经完成创建
+            if conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+                conn.execute('DROP TABLE IF EXISTS entries')
+                conn.execute('DROP TABLE IF EXISTS meta')
+                for statement in _SCHEMA.split(';'):
+                    if statement.strip():
+                        conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _error(self, action, e):
+        with self._lock:
+            self.errors += 1
+        logger.warning('磁盘缓存%s失败: %s', action, e)
+
+    def get(self, key):
+        """读取缓存条目
+
+        Returns:
+            tuple|None: (序列化的结果, 过期时间, 可返回截止时间, 是否为错误结果)；
+                        不存在或超出可返回时间时返回None
+        """
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                'SELECT value, expires_at, stale_until, negative, accessed_at FROM entries WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None and row[2] > now and now - row[4] >= ACCESS_RESOLUTION:
+                conn.execute('UPDATE entries SET accessed_at = ? WHERE key = ?', (now, key))
+        except (sqlite3.Error, OSError) as e:
+            self._error('读取', e)
+            return None
+
+        if row is None or row[2] <= now:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            data = zlib.decompress(row[0])
+        except zlib.error as e:
+            self._error('解压', e)
+            return None
+        with self._lock:
+            self.hits += 1
+        return data, row[1], row[2], bool(row[3])
+
+    def expires_at(self, key):
+        """返回正常结果的过期时间（不读取结果，不计入命中统计），不存在或为错误结果时返回None"""
+        try:
+            row = self._connect().execute(
+                'SELECT expires_at FROM entries WHERE key = ? AND negative = 0 AND stale_until > ?', (key, time.time())
+            ).fetchone()
+        except (sqlite3.Error, OSError) as e:
+            self._error('读取', e)
+            return None
+        return row[0] if row is not None else None
+
+    def set(self, key, data, expires_at, stale_until, negative=False):
+        """写入缓存条目
+
+        Args:
+            key (str): 缓存键
+            data (bytes): 序列化的结果
+            expires_at (float): 过期时间（Unix时间戳）
+            stale_until (float): 过期后仍可返回的截止时间
+            negative (bool, optional): 是否为错误结果
+        """
+        value = zlib.compress(data, COMPRESS_LEVEL)
+        if len(value) > self.max_bytes:
+            return
+        try:
+            self._connect().execute(
+                'INSERT OR REPLACE INTO entries (key, value, size, expires_at, stale_until, negative, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, value, len(value), expires_at, stale_until, int(negative), time.time())
+            )
+        except (sqlite3.Error, OSError) as e:
+            self._error('写入', e)
+            return
+        with self._lock:
+            self.writes += 1
+
+    def compact(self, force=False):
+        """删除超出可返回时间的条目，超出大小上限时按最近访问时间淘汰，并回收文件空间
+
+        Args:
+            force (bool, optional): 是否忽略其他进程最近已执行过压缩
+
+        Returns:
+            dict|None: 删除的条目数，本周期已由其他进程执行时返回None
+        """
+        conn = self._connect()
+        now = time.time()
+
+        # 在所有工作进程中认领本周期的压缩
+        claimed = conn.execute(
+            "UPDATE meta SET value = ? WHERE name = 'compacted_at' AND value <= ?",
+            (now, now if force else now - self.compact_interval * 0.9)
+        ).rowcount
+        if not claimed:
+            return None
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            expired = conn.execute('DELETE FROM entries WHERE stale_until <= ?', (now,)).rowcount
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            evicted = []
+            if total > self.max_bytes:
+                excess = total - self.max_bytes * EVICT_TARGET
+                for key, size in conn.execute('SELECT key, size FROM entries ORDER BY accessed_at'):
+                    if excess <= 0:
+                        break
+                    evicted.append((key,))
+                    excess -= size
+                conn.executemany('DELETE FROM entries WHERE key = ?', evicted)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+        # 回收删除条目占用的页，并把WAL中的内容写回数据库文件
+        conn.execute('PRAGMA incremental_vacuum')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        if expired or evicted:
+            logger.info('磁盘缓存压缩完成', extra={'expired': expired, 'evicted': len(evicted)})
+        return {'expired': expired, 'evicted': len(evicted)}
+
+    def _start_compactor(self):
+        """在当前进程中启动后台压缩线程（每个进程一个）"""
+        with self._lock:
+            if self._compactor_pid == os.getpid() or self.compact_interval <= 0:
+                return
+            self._compactor_pid = os.getpid()
+        threading.Thread(target=self._compact_loop, name='disk-cache-compactor', daemon=True).start()
+
+    def _compact_loop(self):
+        while True:
+            time.sleep(self.compact_interval)
+            try:
+                self.compact()
+            except (sqlite3.Error, OSError) as e:
+                self._error('压缩', e)
+
+    def stats(self):
+        """返回磁盘缓存统计信息"""
+        try:
+            entries, size = self._connect().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        except (sqlite3.Error, OSError) as e:
+            self._error('统计', e)
+            entries, size = None, None
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'path': self.path,
+                'entries': entries,
+                'bytes': size,
+                'maxBytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / total, 4) if total else 0,
+                'writes': self.writes,
+                'errors': self.errors
+            }
+
+def from_env():
+    """根据 DISK_CACHE_PATH 创建磁盘缓存，未设置时返回None"""
+    path = os.getenv('DISK_CACHE_PATH')
+    return DiskCache(path) if path else None
@@ -0,0 +1,462 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+搜索引擎调度实现
+
+负责解析各搜索引擎的请求参数，并将搜索请求分发到对应的搜索引擎模块。
+"""
+
+import os
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from . import zhipuai, cache, federated, metrics, singleflight, breaker, ratelimit, dedup, pagination, rerank
+from . import suggest, querylog
+from .config import env_int
+from .log import get_logger, set_engine, Timer
+
+logger = get_logger(__name__)
+
+# 支持的搜索引擎，all 表示同时查询所有已配置的搜索引擎
+ENGINES = ['search_std', 'bochaai', 'searxng', 'all']
+
+# 搜索引擎显示名称
+ENGINE_NAMES = {
+    'search_std': '智谱AI',
+    'bochaai': 'Bocha AI',
+    'searxng': 'SearXNG',
+    'all': '聚合搜索'
+}
+
+# 各搜索引擎 search() 函数接受的额外参数
+ENGINE_PARAMS = {
+    'search_std': [],
+    'bochaai': ['freshness', 'summary', 'count', 'page'],
+    'searxng': ['engines', 'language', 'safesearch', 'time_range', 'count', 'page']
+}
+
+def _parse_int(value):
+    """将字符串参数转换为整数，无效时（包括批量搜索中的列表、对象等）返回None"""
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def parse_params(engine, args):
+    """从请求参数中解析搜索引擎的额外参数
+
+    Args:
+        engine (str): 搜索引擎
+        args (Mapping): 请求参数，如 request.args
+
+    Returns:
+        dict: 对应搜索引擎 search() 函数的关键字参数。
+              engine 为 all 时返回所有搜索引擎参数的并集。
+              另有 rerank 为重排方式（无效时为None），只作用于响应，不传给搜索引擎也不影响缓存键。
+    """
+    params = _parse_engine_params(engine, args)
+    params['rerank'] = rerank.parse_method(args.get('rerank'))
+    return params
+
+def _parse_engine_params(engine, args):
+    """parse_params() 中搜索引擎 search() 函数的参数部分"""
+    if engine == 'all':
+        params = {}
+        for name in ENGINE_PARAMS:
+            params.update(_parse_engine_params(name, args))
+        return params
+
+    if engine == 'bochaai':
+        # 处理布尔类型参数
+        summary = None
+        summary_param = args.get('summary', None)
+        if summary_param is not None:
+            summary = str(summary_param).lower() == 'true'
+
+        return {
+            'freshness': args.get('freshness', None),
+            'summary': summary,
+            'count': _parse_int(args.get('count', None)),
+            'page': _parse_int(args.get('page', None))
+        }
+
+    if engine == 'searxng':
+        safesearch = _parse_int(args.get('safesearch', '1'))
+        return {
+            'engines': args.get('engines', None),  # 要使用的搜索引擎，用逗号分隔
+            'language': args.get('language', 'auto'),  # 语言
+            'safesearch': 1 if safesearch is None else safesearch,  # 安全搜索级别
+            'time_range': args.get('time_range', None),  # 时间范围
+            'count': _parse_int(args.get('count', None)),  # 结果数量
+            'page': _parse_int(args.get('page', None))  # 页码
+        }
+
+    # 智谱AI搜索引擎不支持高级选项
+    return {}
+
+def engine_params(engine, params):
+    """从参数并集中取出指定搜索引擎接受的参数"""
+    return {key: params[key] for key in ENGINE_PARAMS[engine] if key in params}
+
+def configured_engines():
+    """返回已配置（API密钥或主机地址已设置）的搜索引擎列表"""
+    engines = []
+    if os.getenv('ZHIPUAI_API_KEY'):
+        engines.append('search_std')
+    if os.getenv('BOCHAAI_API_KEY'):
+        engines.append('bochaai')
+    if os.getenv('SEARXNG_API_HOST'):
+        engines.append('searxng')
+    return engines
+
+def validate(engine, query):
+    """校验搜索请求，返回错误信息，校验通过时返回None"""
+    if engine not in ENGINES:
+        return f'无效的搜索引擎: {engine}'
+    if not query:
+        return '搜索查询不能为空'
+    return None
+
+def search(engine, query, params):
+    """调用对应的搜索引擎模块执行搜索（不经过缓存）
+
+    Args:
+        engine (str): 搜索引擎，不包括 all
+        query (str): 搜索查询
+        params (dict): parse_params() 返回的额外参数
+
+    Returns:
+        dict: 去重后的搜索结果
+    """
+    if engine in pagination.ENGINES:
+        # count 超过一次上游请求的结果数时并发请求多个上游页
+        return pagination.search(engine, query, engine_params(engine, params))
+    return dedup.dedupe(engine, zhipuai.search(query, engine))
+
+async def async_search(engine, query, params):
+    """search() 的异步版本"""
+    if engine in pagination.ENGINES:
+        return await pagination.async_search(engine, query, engine_params(engine, params))
+    return dedup.dedupe(engine, await zhipuai.async_search(query, engine))
+
+# 由缓存直接返回的缓存状态（未等待上游）
+CACHED_STATUSES = ('HIT', 'STALE', 'NEGATIVE')
+
+# 后台刷新过期结果的线程池
+_refresh_executor = ThreadPoolExecutor(max_workers=env_int('CACHE_REFRESH_WORKERS', 4),
+                                       thread_name_prefix='cache-refresh')
+
+# 进行中的异步后台刷新和预取任务，保留引用避免被垃圾回收
+_refresh_tasks = set()
+
+# 进行中的下一页预取的缓存键
+_prefetching = set()
+
+def _cache_lookup(engine, query, params, bypass_cache):
+    """查询缓存
+
+    Returns:
+        tuple: (缓存键, 缓存结果, 缓存状态)。未命中或跳过缓存时缓存结果为None；
+               缓存状态为 HIT、STALE（已过期，需要后台刷新）或 NEGATIVE（缓存的错误结果）
+    """
+    key = cache.make_key(engine, query, engine_params(engine, params))
+    if bypass_cache:
+        return key, None, None
+    result, state = cache.result_cache.lookup(key)
+    return (key,) + _lookup_status(result, state)
+
+def _lookup_status(result, state):
+    """将 ResultCache.lookup() 的结果转换为 (缓存结果, 缓存状态)"""
+    if result is None:
+        return None, None
+    if state == cache.STALE:
+        return result, 'STALE'
+    if state == cache.NEGATIVE:
+        return result, 'NEGATIVE'
+    return result, 'HIT'
+
+async def _async_cache_lookup(engine, query, params, bypass_cache):
+    """_cache_lookup() 的异步版本，磁盘缓存在线程中查询，不阻塞事件循环"""
+    key = cache.make_key(engine, query, engine_params(engine, params))
+    if bypass_cache:
+        return key, None, None
+    result, state = await cache.result_cache.async_lookup(key)
+    return (key,) + _lookup_status(result, state)
+
+def _cache_store(engine, key, result, bypass_cache):
+    """写入缓存，返回缓存状态
+
+    正常结果缓存 CACHE_TTL 秒，过期后 CACHE_STALE_TTL 秒内仍可返回；错误结果缓存 CACHE_NEGATIVE_TTL 秒。
+    已有仍可返回的正常结果时不写入错误结果，而是推迟其下一次刷新，继续返回该结果。
+    """
+    if is_error_result(result):
+        negative_ttl = cache.engine_negative_ttl(engine)
+        if not cache.result_cache.defer_refresh(key, negative_ttl):
+            cache.result_cache.set(key, result, negative_ttl, negative=True)
+    else:
+        cache.result_cache.set(key, result, cache.engine_ttl(engine), cache.engine_stale_ttl(engine))
+    return 'BYPASS' if bypass_cache else 'MISS'
+
+def _log_upstream(engine, query, result, timer):
+    """记录一次上游搜索的结果和耗时"""
+    logger.info('上游搜索完成: %s', query, extra={
+        'engine': engine,
+        'elapsed_ms': timer.elapsed_ms,
+        'results': len(result.get('search_result', [])),
+        'upstream_error': is_error_result(result)
+    })
+
+def _shared_status(engine, key, result, source, bypass_cache):
+    """处理 single-flight 的结果，返回缓存状态
+
+    本次调用执行了上游请求时写入缓存；共享其他工作进程的结果时也写入本进程的缓存；
+    共享本进程内其他调用的结果时缓存已由执行者写入，状态为 SHARED。
+    """
+    if source == singleflight.THREAD:
+        status = 'SHARED'
+    else:
+        status = _cache_store(engine, key, result, bypass_cache)
+        if source == singleflight.PROCESS:
+            status = 'SHARED'
+    if status == 'SHARED':
+        metrics.SINGLEFLIGHT_SHARED.labels(engine, source).inc()
+    return status
+
+def _fetch(engine, query, params):
+    """请求上游并记录日志
+
+    熔断器打开时抛出 breaker.CircuitOpenError，限流排队超时时抛出 ratelimit.RateLimitError。
+    熔断器半开时本次请求是探测请求，没有发出上游请求（如限流排队超时）时释放探测。
+    """
+    set_engine(engine)
+    probe = breaker.allow(engine)
+    try:
+        ratelimit.acquire(engine)
+        with Timer() as timer:
+            result = search(engine, query, params)
+    finally:
+        breaker.release(engine, probe)
+    _log_upstream(engine, query, result, timer)
+    return result
+
+async def _async_fetch(engine, query, params):
+    """_fetch() 的异步版本"""
+    set_engine(engine)
+    probe = breaker.allow(engine)
+    try:
+        await ratelimit.async_acquire(engine)
+        with Timer() as timer:
+            result = await async_search(engine, query, params)
+    finally:
+        breaker.release(engine, probe)
+    _log_upstream(engine, query, result, timer)
+    return result
+
+async def _async_fetch_and_store(engine, key, query, params, bypass_cache):
+    """请求上游并写入缓存，返回 (搜索结果, 缓存状态)
+
+    序列化和磁盘缓存写入在线程中执行，不阻塞事件循环。写入缓存后才结束 single-flight，
+    写入期间到达的相同请求共享本次结果，而不是在缓存写入完成前再次请求上游。
+    """
+    result = await _async_fetch(engine, query, params)
+    return result, await asyncio.to_thread(_cache_store, engine, key, result, bypass_cache)
+
+async def _async_shared_fetch(engine, key, query, params, bypass_cache):
+    """经过 single-flight 执行 _async_fetch_and_store()，共享本进程内其他调用的结果时状态为 SHARED"""
+    (result, status), source = await singleflight.group.do_async(
+        key, lambda: _async_fetch_and_store(engine, key, query, params, bypass_cache))
+    if source == singleflight.THREAD:
+        status = 'SHARED'
+        metrics.SINGLEFLIGHT_SHARED.labels(engine, source).inc()
+    return result, status
+
+def _revalidate(engine, key, query, params):
+    """在后台刷新过期的缓存结果"""
+    ratelimit.priority_var.set(ratelimit.BACKGROUND)
+    try:
+        result, source = singleflight.group.do(key, lambda: _fetch(engine, query, params))
+        _shared_status(engine, key, result, source, False)
+    except Exception as e:
+        logger.warning('后台刷新失败: %s', e, extra={'engine': engine})
+        cache.result_cache.defer_refresh(key, cache.engine_negative_ttl(engine))
+
+async def _async_revalidate(engine, key, query, params):
+    """_revalidate() 的异步版本"""
+    ratelimit.priority_var.set(ratelimit.BACKGROUND)
+    try:
+        await _async_shared_fetch(engine, key, query, params, False)
+    except Exception as e:
+        logger.warning('后台刷新失败: %s', e, extra={'engine': engine})
+        cache.result_cache.defer_refresh(key, cache.engine_negative_ttl(engine))
+
+def _claim_prefetch(engine, query, params):
+    """认领下一页的预取，返回其缓存键；已缓存或正在预取时返回None"""
+    key = cache.make_key(engine, query, engine_params(engine, params))
+    if key in _prefetching or cache.result_cache.contains(key):
+        return None
+    _prefetching.add(key)
+    return key
+
+def _run_prefetch(engine, key, query, params):
+    """执行下一页预取"""
+    ratelimit.priority_var.set(ratelimit.BACKGROUND)
+    try:
+        _cached_search(engine, query, params, False)
+    except Exception as e:
+        logger.debug('预取下一页失败: %s', e, extra={'engine': engine})
+    finally:
+        _prefetching.discard(key)
+
+async def _async_run_prefetch(engine, key, query, params):
+    """_run_prefetch() 的异步版本"""
+    ratelimit.priority_var.set(ratelimit.BACKGROUND)
+    try:
+        await _async_cached_search(engine, query, params, False)
+    except Exception as e:
+        logger.debug('预取下一页失败: %s', e, extra={'engine': engine})
+    finally:
+        _prefetching.discard(key)
+
+def _cached_search(engine, query, params, bypass_cache):
+    """经过结果缓存执行单个搜索引擎的搜索（不预取下一页）"""
+    key, result, status = _cache_lookup(engine, query, params, bypass_cache)
+    if result is not None:
+        if status == 'STALE' and cache.result_cache.claim_refresh(key):
+            context = contextvars.copy_context()
+            _refresh_executor.submit(context.run, _revalidate, engine, key, query, params)
+        return result, status
+
+    result, source = singleflight.group.do(key, lambda: _fetch(engine, query, params))
+    return result, _shared_status(engine, key, result, source, bypass_cache)
+
+async def _async_cached_search(engine, query, params, bypass_cache):
+    """_cached_search() 的异步版本"""
+    key, result, status = await _async_cache_lookup(engine, query, params, bypass_cache)
+    if result is not None:
+        if status == 'STALE' and cache.result_cache.claim_refresh(key):
+            task = asyncio.ensure_future(_async_revalidate(engine, key, query, params))
+            _refresh_tasks.add(task)
+            task.add_done_callback(_refresh_tasks.discard)
+        return result, status
+
+    return await _async_shared_fetch(engine, key, query, params, bypass_cache)
+
+def cached_search(engine, query, params, bypass_cache=False):
+    """经过结果缓存执行搜索
+
+    缓存未命中时，同一缓存键的并发请求只会发出一次上游请求（见 singleflight 模块）。
+    结果已过期但仍在可返回时间内时直接返回该结果，并在后台刷新；
+    因此搜索引擎熔断时仍可返回过期结果，没有可用结果时才抛出 breaker.CircuitOpenError。
+    开启 PAGINATION_PREFETCH 时在后台预取下一页（见 pagination 模块）。
+
+    Args:
+        engine (str): 搜索引擎，all 时并发查询所有已配置的搜索引擎
+        query (str): 搜索查询
+        params (dict): parse_params() 返回的额外参数
+        bypass_cache (bool, optional): 是否跳过缓存读取。结果仍会写入缓存。
+
+    Returns:
+        tuple: (搜索结果, 缓存状态)，缓存状态为 HIT、STALE（过期结果）、NEGATIVE（缓存的错误结果）、
+               MISS、BYPASS、SHARED（共享了并发请求的结果）或 PARTIAL（仅 all）
+    """
+    if engine == 'all':
+        return federated.search(query, params, bypass_cache)
+
+    result, status = _cached_search(engine, query, params, bypass_cache)
+    next_params = None if is_error_result(result) else pagination.next_page_params(engine, params, result)
+    if next_params is not None:
+        key = _claim_prefetch(engine, query, next_params)
+        if key is not None:
+            context = contextvars.copy_context()
+            _refresh_executor.submit(context.run, _run_prefetch, engine, key, query, next_params)
+    return result, status
+
+async def async_cached_search(engine, query, params, bypass_cache=False):
+    """cached_search() 的异步版本，并发请求只在本进程内合并"""
+    if engine == 'all':
+        return await federated.async_search(query, params, bypass_cache)
+
+    result, status = await _async_cached_search(engine, query, params, bypass_cache)
+    next_params = None if is_error_result(result) else pagination.next_page_params(engine, params, result)
+    if next_params is not None:
+        key = _claim_prefetch(engine, query, next_params)
+        if key is not None:
+            task = asyncio.ensure_future(_async_run_prefetch(engine, key, query, next_params))
+            _refresh_tasks.add(task)
+            task.add_done_callback(_refresh_tasks.discard)
+    return result, status
+
+def finish_request(engine, result, cache_status, elapsed):
+    """记录请求指标，并返回在 meta 中带有实际耗时的结果副本（缓存中的结果不能被修改）
+
+    Args:
+        engine (str): 搜索引擎
+        result (dict): 搜索结果
+        cache_status (str): 缓存状态
+        elapsed (float): 请求耗时（秒）
+
+    Returns:
+        dict: 搜索结果副本
+    """
+    metrics.CACHE_REQUESTS.labels(engine, cache_status).inc()
+    metrics.REQUEST_LATENCY.labels(engine, cache_status).observe(elapsed)
+
+    result = dict(result)
+    meta = dict(result.get('meta') or {})
+    meta['elapsed'] = round(elapsed, 3)
+    meta['cache'] = cache_status
+    result['meta'] = meta
+    return result
+
+def refresh(engine, query, params):
+    """请求上游并写入缓存（跳过缓存读取，不预取下一页），用于缓存预热
+
+    Args:
+        engine (str): 搜索引擎，不包括 all
+        query (str): 搜索查询
+        params (dict): 额外参数
+
+    Returns:
+        dict: 搜索结果
+    """
+    result, _ = _cached_search(engine, query, params, True)
+    return result
+
+def record_search(engine, query, params, result, elapsed):
+    """记录一次用户搜索的正常结果：更新搜索建议（见 suggest 模块），并写入查询日志（见 querylog 模块）
+
+    Args:
+        engine (str): 搜索引擎
+        query (str): 搜索查询
+        params (dict): parse_params() 返回的参数
+        result (dict): 搜索结果
+        elapsed (float): 请求耗时（秒）
+    """
+    if is_error_result(result):
+        return
+    suggest.observe(query, result)
+    if querylog.query_log is not None:
+        names = ENGINE_PARAMS[engine] if engine != 'all' else {name for names in ENGINE_PARAMS.values() for name in names}
+        logged = {name: params[name] for name in names if params.get(name) is not None}
+        querylog.query_log.record(engine, cache.normalize_query(query), logged, elapsed)
+
+def is_error_result(result):
+    """判断搜索结果是否为错误结果
+
+    搜索引擎模块在上游出错时会返回带有错误信息的结果（而不是抛出异常），
+    这些结果不应被当作正常结果缓存。
+    """
+    if 'error' in result:
+        return True
+    if '_error' in str(result.get('id', '')):
+        return True
+    return any(item.refer == '错误' for item in result.get('search_result', []))
+
+def error_message(result):
+    """返回错误结果中的错误信息"""
+    return result.get('error') or next(
+        (item.content for item in result.get('search_result', [])), '')
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+聚合搜索实现
+
+engine=all 时并发查询所有已配置的搜索引擎，总耗时取决于最慢的搜索引擎而不是各引擎耗时之和。
+各搜索引擎的结果（已转换为智谱AI兼容格式）按倒数排名融合（Reciprocal Rank Fusion）合并为一个列表，
+链接相同或内容近似重复的结果（见 dedup 模块）合并为一条。
+"""
+
+import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, TimeoutError as FuturesTimeoutError
+
+from . import dispatcher, breaker, ratelimit, dedup
+from .config import env_int, env_float, engine_env
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# 倒数排名融合的平滑常数，越大则排名靠后的结果与靠前结果的差距越小
+RRF_K = 60
+
+# 聚合搜索共享的线程池
+_executor = ThreadPoolExecutor(
+    max_workers=env_int('FEDERATED_MAX_WORKERS', 32),
+    thread_name_prefix='federated'
+)
+
+def merge_results(engine_results):
+    """合并多个搜索引擎的结果
+
+    Args:
+        engine_results (list): [(搜索引擎, 搜索结果列表)]，按搜索引擎优先级排列
+
+    Returns:
+        list: 合并后的 SearchItem 列表，每项带有 engine（排名最高的来源）、
+              sources（所有来源）和 score（融合得分）字段
+    """
+    merged = []
+    # 按搜索引擎优先级和排名顺序加入，重复的结果合并到先出现的一条
+    deduplicator = dedup.Deduplicator(dedup.engine_similarity('all'))
+
+    for engine, items in engine_results:
+        weight = engine_env('FEDERATED_WEIGHT', engine, 1.0, parse=env_float)
+        for rank, item in enumerate(items, start=1):
+            score = weight / (RRF_K + rank)
+
+            index = deduplicator.add(item)
+            if index is not None:
+                entry = merged[index]
+                entry.score += score
+                if engine not in entry.sources:
+                    entry.sources.append(engine)
+                continue
+
+            # 缓存中的结果不能被修改，合并时使用副本
+            entry = item.copy()
+            entry.engine = engine
+            entry.sources = [engine]
+            entry.score = score
+            merged.append(entry)
+
+    # 得分相同时保持搜索引擎优先级和原始排名顺序（sorted 为稳定排序）
+    results = sorted(merged, key=lambda entry: entry.score, reverse=True)
+    for entry in results:
+        entry.score = round(entry.score, 6)
+    return results
+
+def _search_engine(engine, query, params, bypass_cache):
+    """查询单个搜索引擎，返回 (搜索结果, 缓存状态, 耗时)"""
+    start = time.time()
+    result, cache_status = dispatcher.cached_search(engine, query, params, bypass_cache)
+    return result, cache_status, time.time() - start
+
+async def _async_search_engine(engine, query, params, bypass_cache):
+    """_search_engine() 的异步版本"""
+    start = time.time()
+    result, cache_status = await dispatcher.async_cached_search(engine, query, params, bypass_cache)
+    return result, cache_status, time.time() - start
+
+def submit(query, params, bypass_cache=False, executor=None):
+    """在线程池中并发查询所有已配置的搜索引擎
+
+    Args:
+        executor (callable, optional): 搜索引擎 -> 执行该搜索引擎查询的线程池，默认使用聚合搜索共享的线程池
+
+    Returns:
+        dict|None: 搜索引擎 -> concurrent.futures.Future，没有已配置的搜索引擎时返回None
+    """
+    engines = dispatcher.configured_engines()
+    if not engines:
+        return None
+    return {
+        # 复制当前上下文，使线程池中的日志带上请求ID
+        engine: (executor(engine) if executor is not None else _executor).submit(
+            contextvars.copy_context().run, _search_engine, engine, query, params, bypass_cache)
+        for engine in engines
+    }
+
+def iter_completed(futures):
+    """按完成顺序返回搜索引擎，超过 FEDERATED_TIMEOUT 后不再等待"""
+    engines = {future: engine for engine, future in futures.items()}
+    try:
+        for future in as_completed(engines, timeout=env_float('FEDERATED_TIMEOUT', 35)):
+            yield engines[future]
+    except FuturesTimeoutError:
+        return
+
+def search(query, params, bypass_cache=False):
+    """并发查询所有已配置的搜索引擎并合并结果
+
+    Args:
+        query (str): 搜索查询
+        params (dict): dispatcher.parse_params('all', ...) 返回的参数
+        bypass_cache (bool, optional): 是否跳过各搜索引擎的缓存读取
+
+    Returns:
+        tuple: (智谱AI兼容格式的搜索结果, 缓存状态)
+    """
+    futures = submit(query, params, bypass_cache)
+    if futures is None:
+        return {'error': '没有已配置的搜索引擎'}, 'MISS'
+
+    wait(futures.values(), timeout=env_float('FEDERATED_TIMEOUT', 35))
+    # 超时的搜索引擎不再等待，其结果在完成后仍会写入缓存
+    return combine(query, futures, bypass_cache)
+
+def async_submit(query, params, bypass_cache=False):
+    """submit() 的异步版本，返回 搜索引擎 -> asyncio.Task"""
+    engines = dispatcher.configured_engines()
+    if not engines:
+        return None
+    return {
+        engine: asyncio.ensure_future(_async_search_engine(engine, query, params, bypass_cache))
+        for engine in engines
+    }
+
+async def async_iter_completed(tasks):
+    """iter_completed() 的异步版本"""
+    engines = {task: engine for engine, task in tasks.items()}
+    deadline = time.monotonic() + env_float('FEDERATED_TIMEOUT', 35)
+    pending = set(engines)
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            yield engines[task]
+
+async def async_search(query, params, bypass_cache=False):
+    """search() 的异步版本"""
+    tasks = async_submit(query, params, bypass_cache)
+    if tasks is None:
+        return {'error': '没有已配置的搜索引擎'}, 'MISS'
+
+    await asyncio.wait(tasks.values(), timeout=env_float('FEDERATED_TIMEOUT', 35))
+    return combine(query, tasks, bypass_cache)
+
+def engine_outcome(engine, future):
+    """解析单个搜索引擎的执行结果
+
+    Args:
+        engine (str): 搜索引擎
+        future: concurrent.futures.Future 或 asyncio.Future
+
+    Returns:
+        tuple: (搜索引擎状态, 正常的搜索结果（出错或超时时为None）, 缓存状态)。
+               搜索引擎状态包括 name、status（ok/error/timeout/circuit_open/rate_limited），
+               以及 cache、time、count、message 中的相应字段
+    """
+    engine_meta = {'name': dispatcher.ENGINE_NAMES[engine]}
+
+    if not future.done():
+        engine_meta['status'] = 'timeout'
+        return engine_meta, None, 'MISS'
+
+    try:
+        result, cache_status, elapsed = future.result()
+    except breaker.CircuitOpenError as e:
+        engine_meta['status'] = 'circuit_open'
+        engine_meta['message'] = str(e)
+        return engine_meta, None, 'MISS'
+    except ratelimit.RateLimitError as e:
+        engine_meta['status'] = 'rate_limited'
+        engine_meta['message'] = str(e)
+        return engine_meta, None, 'MISS'
+    except Exception as e:
+        logger.warning('聚合搜索 %s 错误: %s', dispatcher.ENGINE_NAMES[engine], e, extra={'engine': engine})
+        engine_meta['status'] = 'error'
+        engine_meta['message'] = str(e)
+        return engine_meta, None, 'MISS'
+
+    engine_meta['cache'] = cache_status
+    engine_meta['time'] = round(elapsed, 3)
+
+    if dispatcher.is_error_result(result):
+        engine_meta['status'] = 'error'
+        engine_meta['message'] = dispatcher.error_message(result)
+        return engine_meta, None, cache_status
+
+    engine_meta['status'] = 'ok'
+    engine_meta['count'] = len(result.get('search_result', []))
+    return engine_meta, result, cache_status
+
+def combine(query, futures, bypass_cache, outcomes=None):
+    """根据各搜索引擎的执行结果构建聚合搜索结果
+
+    Args:
+        query (str): 搜索查询
+        futures (dict): 搜索引擎 -> concurrent.futures.Future 或 asyncio.Future
+        bypass_cache (bool): 是否跳过了缓存读取
+        outcomes (dict, optional): 搜索引擎 -> 已解析的 engine_outcome() 结果，避免重复解析
+
+    Returns:
+        tuple: (智谱AI兼容格式的搜索结果, 缓存状态)
+    """
+    outcomes = outcomes or {}
+    converted_result = {
+        'id': f'all_{int(time.time())}',
+        'created': int(time.time()),
+        'search_intent': [
+            {
+                'query': query,
+                'intent': 'SEARCH_ALL',
+                'keywords': query
+            }
+        ],
+        'search_result': [],
+        'suggestions': [],
+        'corrections': [],
+        'answers': [],
+        'infoboxes': [],
+        'meta': {
+            'source': '聚合搜索',
+            'engines': {},
+            'totalResults': 0
+        }
+    }
+
+    engine_results = []
+    cache_statuses = []
+    for engine, future in futures.items():
+        outcome = outcomes.get(engine) or engine_outcome(engine, future)
+        engine_meta, result, cache_status = outcome
+        converted_result['meta']['engines'][engine] = engine_meta
+        cache_statuses.append(cache_status)
+        if result is None:
+            continue
+
+        items = result.get('search_result', [])
+        engine_results.append((engine, items))
+
+        meta = result.get('meta') or {}
+        converted_result['meta']['totalResults'] += meta.get('totalResults', len(items)) or 0
+
+        # SearXNG 特有的建议、纠正、答案和信息框
+        for field in ('suggestions', 'corrections', 'answers', 'infoboxes'):
+            converted_result[field].extend(result.get(field, []))
+
+    converted_result['search_result'] = merge_results(engine_results)
+    if not engine_results:
+        converted_result['error'] = '所有搜索引擎均请求失败'
+
+    if all(status in dispatcher.CACHED_STATUSES for status in cache_statuses):
+        cache_status = 'HIT'
+    elif bypass_cache:
+        cache_status = 'BYPASS'
+    elif any(status in dispatcher.CACHED_STATUSES for status in cache_statuses):
+        cache_status = 'PARTIAL'
+    else:
+        cache_status = 'MISS'
+    return converted_result, cache_status
@@ -0,0 +1,396 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+共享HTTP客户端实现
+
+所有搜索引擎模块通过这里发送上游请求：按主机维护连接池并保持长连接，
+避免每次搜索都重新建立TCP连接和TLS握手。
+
+同步请求基于 requests，异步请求基于 httpx（未安装时退回到在线程中执行同步请求）。
+异步响应会被转换为 requests.Response，搜索引擎模块可以共用同一套响应处理逻辑。
+设置 CASSETTE_MODE 时录制上游请求，或从录像回放响应而不访问上游（见 cassette 模块）。
+"""
+
+import time
+import socket
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from .config import env_int, env_float
+from .log import get_logger
+from . import metrics, breaker, cassette
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - httpx 为可选依赖
+    httpx = None
+
+logger = get_logger(__name__)
+
+# 每个主机一个连接池适配器，所有线程共享
+_adapters = {}
+_adapters_lock = threading.Lock()
+
+# 每个线程一个Session（Session本身不保证线程安全），底层连接池共享
+_local = threading.local()
+
+def _host_key(url):
+    """返回URL对应的连接池键，如 https://open.bigmodel.cn"""
+    parsed = urlparse(url)
+    return f'{parsed.scheme}://{parsed.netloc}'
+
+def _build_retry():
+    """根据环境变量构建重试策略
+
+    默认只重试连接阶段的错误以及网关类的状态码，读取超时不重试，
+    避免一次搜索的耗时被放大数倍。连接错误时请求尚未发出，所有方法都可以重试；
+    网关类状态码只对 GET/HEAD 重试：智谱AI、Bocha AI 的 POST 请求返回 502/504 时
+    上游可能已经执行（并计费）了搜索，重试会重复计费。
+    """
+    return Retry(
+        total=env_int('HTTP_MAX_RETRIES', 2),
+        connect=env_int('HTTP_MAX_RETRIES', 2),
+        read=0,
+        status=env_int('HTTP_STATUS_RETRIES', 1),
+        backoff_factor=env_float('HTTP_BACKOFF_FACTOR', 0.2),
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False,
+        respect_retry_after_header=True
+    )
+
+class Interrupt:
+    """允许其他线程中断的同步请求（如对冲请求中落后的主请求）
+
+    请求等待响应时，interrupt() 关闭其连接的套接字，请求随即以连接错误结束，
+    被中断的请求不计入上游统计和熔断器。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = None
+        self.interrupted = False
+
+    @staticmethod
+    def _shutdown(conn):
+        sock = getattr(conn, 'sock', None)
+        if sock is None:
+            return
+        try:
+            # 绕过 SSLSocket.shutdown()，不改动另一个线程正在使用的TLS状态
+            socket.socket.shutdown(sock, socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _attach(self, conn):
+        with self._lock:
+            self._conn = conn
+            if self.interrupted:
+                self._shutdown(conn)
+
+    def _detach(self):
+        with self._lock:
+            self._conn = None
+
+    def interrupt(self):
+        """中断请求，请求已收到响应时不影响其连接"""
+        with self._lock:
+            self.interrupted = True
+            if self._conn is not None:
+                self._shutdown(self._conn)
+
+class _InterruptibleMixin:
+    """等待响应期间向当前线程的 Interrupt 登记连接，之后连接可能被放回连接池，不再登记"""
+
+    def getresponse(self, *args, **kwargs):
+        interrupt = getattr(_local, 'interrupt', None)
+        if interrupt is None:
+            return super().getresponse(*args, **kwargs)
+        interrupt._attach(self)
+        try:
+            return super().getresponse(*args, **kwargs)
+        finally:
+            interrupt._detach()
+
+class _HTTPConnection(_InterruptibleMixin, HTTPConnection):
+    pass
+
+class _HTTPSConnection(_InterruptibleMixin, HTTPSConnection):
+    pass
+
+class _HTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _HTTPConnection
+
+class _HTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _HTTPSConnection
+
+class _Adapter(HTTPAdapter):
+    """使用可中断连接的连接池适配器"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _HTTPConnectionPool, 'https': _HTTPSConnectionPool}
+
+def _get_adapter(host_key):
+    """获取（或创建）主机对应的连接池适配器"""
+    adapter = _adapters.get(host_key)
+    if adapter is not None:
+        return adapter
+
+    with _adapters_lock:
+        adapter = _adapters.get(host_key)
+        if adapter is None:
+            adapter = _Adapter(
+                pool_connections=1,
+                pool_maxsize=env_int('HTTP_POOL_MAXSIZE', 20),
+                max_retries=_build_retry(),
+                pool_block=False
+            )
+            _adapters[host_key] = adapter
+    return adapter
+
+def get_session(url):
+    """获取当前线程可用于请求url的Session
+
+    Args:
+        url (str): 请求地址
+
+    Returns:
+        requests.Session: 已挂载共享连接池的Session
+    """
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        session.headers['Connection'] = 'keep-alive'
+        _local.session = session
+        _local.mounted = set()
+
+    host_key = _host_key(url)
+    if host_key not in _local.mounted:
+        session.mount(host_key, _get_adapter(host_key))
+        _local.mounted.add(host_key)
+    return session
+
+def _record(engine, start, response=None, error=None):
+    """记录一次上游请求的耗时、响应大小和错误"""
+    if engine is None:
+        return
+    elapsed = time.perf_counter() - start
+    metrics.UPSTREAM_LATENCY.labels(engine).observe(elapsed)
+    # 连接错误、超时、5xx 和 429 计入熔断器的失败次数，其他 4xx 通常是请求本身的问题
+    failed = error is not None or (response is not None and (response.status_code >= 500 or response.status_code == 429))
+    breaker.record(engine, failed, elapsed)
+    if isinstance(error, requests.exceptions.Timeout):
+        metrics.UPSTREAM_TIMEOUTS.labels(engine).inc()
+    elif error is not None:
+        metrics.UPSTREAM_ERRORS.labels(engine, 'connection').inc()
+    elif response is not None:
+        metrics.UPSTREAM_RESPONSE_SIZE.labels(engine).observe(len(response.content))
+        if response.status_code >= 400:
+            metrics.UPSTREAM_ERRORS.labels(engine, f'http_{response.status_code}').inc()
+
+def _record_cassette(engine, method, url, kwargs, start, response=None, error=None):
+    """录制模式下记录搜索引擎的上游请求（不含连接预热）"""
+    recorder = cassette.recorder
+    if recorder is None or engine is None:
+        return
+    recorder.record(
+        engine, method, url, kwargs.get('params'), kwargs.get('json'), kwargs.get('headers'),
+        time.perf_counter() - start, response=response, error=error
+    )
+
+def request(method, url, engine=None, interrupt=None, **kwargs):
+    """通过共享连接池发送请求
+
+    Args:
+        method (str): 请求方法
+        url (str): 请求地址
+        engine (str, optional): 发起请求的搜索引擎，用于统计上游耗时和错误
+        interrupt (Interrupt, optional): 用于从其他线程中断请求
+        **kwargs: 其他参数，与 requests.request 相同
+
+    Returns:
+        requests.Response: 响应
+    """
+    start = time.perf_counter()
+    try:
+        if cassette.player is not None:
+            response = cassette.player.play(method, url, kwargs.get('params'), kwargs.get('json'))
+        else:
+            _local.interrupt = interrupt
+            try:
+                response = get_session(url).request(method, url, **kwargs)
+            finally:
+                _local.interrupt = None
+    except requests.exceptions.RequestException as e:
+        if interrupt is not None and interrupt.interrupted:
+            raise
+        _record(engine, start, error=e)
+        _record_cassette(engine, method, url, kwargs, start, error=e)
+        raise
+    _record(engine, start, response=response)
+    _record_cassette(engine, method, url, kwargs, start, response=response)
+    return response
+
+def get(url, **kwargs):
+    """通过共享连接池发送GET请求"""
+    return request('GET', url, **kwargs)
+
+def post(url, **kwargs):
+    """通过共享连接池发送POST请求"""
+    return request('POST', url, **kwargs)
+
+def reset():
+    """丢弃所有连接池
+
+    在 fork 出的子进程中调用，避免子进程继续使用从父进程继承的套接字。
+    """
+    global _local
+    with _adapters_lock:
+        _adapters.clear()
+    _local = threading.local()
+
+def _warm(url):
+    """向上游发送一次轻量请求以建立连接"""
+    try:
+        request('HEAD', url, timeout=env_float('HTTP_PREWARM_TIMEOUT', 5), allow_redirects=False)
+    except requests.exceptions.RequestException as e:
+        logger.warning('预热连接失败: %s, %s', url, e)
+
+def prewarm(urls, wait=False):
+    """预先建立到各上游的连接
+
+    每个上游并发建立 HTTP_PREWARM_CONNECTIONS 个连接（默认2个），
+    连接在请求结束后留在连接池中供后续搜索复用。
+
+    Args:
+        urls (iterable): 上游地址列表，None或空字符串会被忽略
+        wait (bool, optional): 是否等待预热完成。默认为False，在后台执行。
+
+    Returns:
+        ThreadPoolExecutor: 执行预热的线程池，没有可预热的地址时返回None
+    """
+    # 回放录像时不访问上游
+    targets = [url for url in urls if url] if cassette.player is None else []
+    connections = max(0, env_int('HTTP_PREWARM_CONNECTIONS', 2))
+    if not targets or connections == 0:
+        return None
+
+    executor = ThreadPoolExecutor(
+        max_workers=min(len(targets) * connections, 16),
+        thread_name_prefix='http-prewarm'
+    )
+    for url in targets:
+        for _ in range(connections):
+            executor.submit(_warm, url)
+    executor.shutdown(wait=wait)
+    return executor
+
+# 每个事件循环一个异步客户端（httpx.AsyncClient 不能跨事件循环使用）
+_async_clients = weakref.WeakKeyDictionary()
+
+def _get_async_client():
+    """获取当前事件循环的异步客户端"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=env_int('HTTP_ASYNC_MAX_CONNECTIONS', 1000),
+                max_keepalive_connections=env_int('HTTP_POOL_MAXSIZE', 20) * 4
+            ),
+            transport=httpx.AsyncHTTPTransport(retries=env_int('HTTP_MAX_RETRIES', 2)),
+            headers={'Connection': 'keep-alive'}
+        )
+        _async_clients[loop] = client
+    return client
+
+def _to_requests_response(response):
+    """将 httpx.Response 转换为 requests.Response"""
+    converted = requests.Response()
+    converted.status_code = response.status_code
+    converted.headers.update(response.headers)
+    converted._content = response.content
+    converted.encoding = response.encoding
+    converted.reason = response.reason_phrase
+    converted.url = str(response.url)
+    converted.elapsed = response.elapsed
+    return converted
+
+async def async_request(method, url, params=None, json=None, headers=None, timeout=None, engine=None):
+    """异步发送请求
+
+    Args:
+        method (str): 请求方法
+        url (str): 请求地址
+        params (dict, optional): 查询参数
+        json (dict, optional): JSON请求体
+        headers (dict, optional): 请求头
+        timeout (float, optional): 超时时间（秒）
+        engine (str, optional): 发起请求的搜索引擎，用于统计上游耗时和错误
+
+    Returns:
+        requests.Response: 响应
+
+    Raises:
+        requests.exceptions.RequestException: 与同步请求相同的异常类型
+    """
+    if httpx is None:
+        return await asyncio.to_thread(
+            request, method, url, params=params, json=json, headers=headers, timeout=timeout, engine=engine
+        )
+
+    start = time.perf_counter()
+    kwargs = {'params': params, 'json': json, 'headers': headers}
+    if cassette.player is not None:
+        try:
+            response = await cassette.player.async_play(method, url, params, json)
+        except requests.exceptions.RequestException as e:
+            _record(engine, start, error=e)
+            raise
+        _record(engine, start, response=response)
+        return response
+
+    try:
+        try:
+            response = await _get_async_client().request(
+                method, url, params=params, json=json, headers=headers, timeout=timeout
+            )
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e) or '请求超时') from e
+        except httpx.HTTPError as e:
+            raise requests.exceptions.ConnectionError(str(e) or e.__class__.__name__) from e
+    except requests.exceptions.RequestException as e:
+        _record(engine, start, error=e)
+        _record_cassette(engine, method, url, kwargs, start, error=e)
+        raise
+
+    response = _to_requests_response(response)
+    _record(engine, start, response=response)
+    _record_cassette(engine, method, url, kwargs, start, response=response)
+    return response
+
+async def async_get(url, **kwargs):
+    """异步发送GET请求"""
+    return await async_request('GET', url, **kwargs)
+
+async def async_post(url, **kwargs):
+    """异步发送POST请求"""
+    return await async_request('POST', url, **kwargs)
+
+async def aclose():
+    """关闭当前事件循环的异步客户端"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+日志实现
+
+基于标准库 logging，提供：
+- 按级别过滤，格式化参数延迟到日志真正输出时才计算
+- 结构化（JSON）日志行，自动带上请求ID、搜索引擎等上下文
+- 按请求采样的上游响应内容输出，避免每个请求都序列化完整响应
+
+配置:
+    LOG_LEVEL                日志级别，默认 INFO
+    LOG_FORMAT               json（默认）或 text
+    LOG_PAYLOAD_SAMPLE_RATE  输出请求/响应内容的请求比例（0-1），默认0.01，仅在 DEBUG 级别生效
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import logging
+import contextvars
+
+from .config import env_float
+
+# 请求级上下文，异步任务会自动继承，线程池中需通过 contextvars.copy_context() 传递
+request_id_var = contextvars.ContextVar('request_id', default='-')
+engine_var = contextvars.ContextVar('engine', default='-')
+sampled_var = contextvars.ContextVar('sampled', default=False)
+
+# 结构化日志中不输出的 LogRecord 内置字段
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+def get_logger(name):
+    """获取日志记录器，name 通常为模块名"""
+    return logging.getLogger(name)
+
+class LazyJson:
+    """延迟序列化的JSON参数，只有日志真正输出时才执行 json.dumps"""
+
+    __slots__ = ('value', 'limit', 'indent')
+
+    def __init__(self, value, limit=None, indent=None):
+        self.value = value
+        self.limit = limit
+        self.indent = indent
+
+    def __str__(self):
+        text = json.dumps(self.value, ensure_ascii=False, indent=self.indent, default=str)
+        if self.limit is not None and len(text) > self.limit:
+            return text[:self.limit] + '...'
+        return text
+
+def begin_request(request_id=None, engine=None):
+    """开始一个请求：设置请求ID、搜索引擎，并决定本请求是否采样输出响应内容
+
+    Returns:
+        str: 请求ID
+    """
+    request_id = request_id or uuid.uuid4().hex[:16]
+    request_id_var.set(request_id)
+    engine_var.set(engine or '-')
+    sampled_var.set(random.random() < env_float('LOG_PAYLOAD_SAMPLE_RATE', 0.01))
+    return request_id
+
+def set_engine(engine):
+    """设置当前上下文的搜索引擎"""
+    engine_var.set(engine)
+
+def payload_enabled(logger):
+    """是否输出请求/响应内容：需要 DEBUG 级别且当前请求被采样"""
+    return sampled_var.get() and logger.isEnabledFor(logging.DEBUG)
+
+def log_payload(logger, message, value, limit=2000):
+    """在 payload_enabled() 时输出上游请求/响应内容"""
+    if payload_enabled(logger):
+        logger.debug('%s: %s', message, LazyJson(value, limit=limit))
+
+class Timer:
+    """计时器，用于在日志中记录耗时
+
+    Examples:
+        with Timer() as timer:
+            ...
+        logger.info('完成', extra={'elapsed_ms': timer.elapsed_ms})
+    """
+
+    __slots__ = ('start', 'elapsed')
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.elapsed = 0.0
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        return False
+
+    @property
+    def elapsed_ms(self):
+        return round(self.elapsed * 1000, 2)
+
+class _ContextFilter(logging.Filter):
+    """为日志记录添加请求上下文"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        if not hasattr(record, 'engine'):
+            record.engine = engine_var.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """输出单行JSON日志"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+            'engine': getattr(record, 'engine', '-')
+        }
+        # 通过 extra 传入的字段，如 elapsed_ms、status
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+_configured = False
+
+def setup_logging(level=None, fmt=None):
+    """配置根日志记录器，重复调用不会重复添加处理器"""
+    global _configured
+    if _configured:
+        return
+
+    level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+    fmt = (fmt or os.getenv('LOG_FORMAT', 'json')).lower()
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.addFilter(_ContextFilter())
+    if fmt == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(
+            '%(asctime)s %(levelname)s [%(request_id)s] [%(engine)s] %(name)s: %(message)s'
+        ))
+
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level)
+    _configured = True
@@ -0,0 +1,518 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+指标统计实现
+
+记录各搜索引擎的上游延迟、结果转换耗时、序列化耗时、响应大小、错误/超时次数和缓存命中情况，
+并以 Prometheus 文本格式输出（/metrics）。
+
+指标在进程内统计。设置 METRICS_DIR 时（gunicorn.conf.py 默认设置）汇总所有工作进程的指标：
+每个工作进程每隔 METRICS_FLUSH_INTERVAL 秒（以及退出前）把本进程的指标写入该目录下的 <pid>.json，
+输出指标的进程合并所有文件，无论由哪个工作进程响应 /metrics，得到的都是全部工作进程的合计。
+工作进程退出后（如 max_requests 自动重启），主进程把其计数器和直方图累加到 archive.json 并删除其文件，
+计数不会因为工作进程重启而减少，文件数和指标序列数也不会随重启次数增长。
+其他工作进程的指标最多滞后 METRICS_FLUSH_INTERVAL 秒。数值类指标（Gauge）只统计仍在运行的工作进程，
+按指标的 multiprocess_mode 求和或取最大值。
+
+配置:
+    METRICS_DIR             汇总多进程指标的共享目录，未设置时只输出本进程的指标
+    METRICS_FLUSH_INTERVAL  工作进程写入指标的间隔（秒），默认5
+"""
+
+import os
+import abc
+import json
+import time
+import bisect
+import tempfile
+import threading
+
+from .config import env_float
+from .log import get_logger
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = get_logger(__name__)
+
+# 延迟类指标的分桶（秒）
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# 大小类指标的分桶（字节）
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# 工作进程退出后保留其计数器和直方图的文件名
+ARCHIVE_FILE = 'archive.json'
+
+# 读取和归档共享目录时使用的锁文件
+LOCK_FILE = '.lock'
+
+def _format_labels(names, values):
+    """格式化标签，如 {engine="bochaai",cache="HIT"}，没有标签时返回空字符串"""
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+def _escape(value):
+    """转义标签值"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_value(value):
+    """格式化数值"""
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+class _Metric(abc.ABC):
+    """带标签指标的基类，子类实现 _new_child() 创建各标签值的子指标"""
+
+    type_name = ''
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """获取指定标签值的子指标"""
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._new_child()
+                    self._children[values] = child
+        return child
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """创建子指标"""
+
+    @abc.abstractmethod
+    def _format(self, values, data):
+        """返回一组标签值的数据对应的 Prometheus 文本格式的行"""
+
+    @staticmethod
+    def merge(total, data):
+        """合并两个进程中同一组标签值的数据"""
+        return total + data
+
+    def samples(self):
+        """返回本进程的数据 {标签值元组: 数据}"""
+        return {values: child.sample() for values, child in list(self._children.items())}
+
+    def reset(self):
+        """清零本进程的计数（保留 Gauge 的取值函数），用于从主进程派生的工作进程"""
+        for child in list(self._children.values()):
+            child.reset()
+
+    def collect(self, samples=None):
+        """返回 Prometheus 文本格式的行
+
+        Args:
+            samples (dict, optional): 合并后的数据，默认为本进程的数据
+        """
+        samples = self.samples() if samples is None else samples
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        for values, data in sorted(samples.items()):
+            lines.extend(self._format(values, data))
+        return lines
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def sample(self):
+        return self.value
+
+    def reset(self):
+        with self._lock:
+            self.value = 0.0
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    type_name = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _format(self, values, data):
+        return [f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(data)}']
+
+class _GaugeChild:
+    __slots__ = ('value', 'function')
+
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """设置取值函数，输出指标时调用"""
+        self.function = function
+
+    def sample(self):
+        return self.function() if self.function is not None else self.value
+
+    def reset(self):
+        pass
+
+class Gauge(_Metric):
+    """可任意设置的数值
+
+    Args:
+        multiprocess_mode (str, optional): 汇总多个工作进程的方式，sum（默认）求和，max 取最大值
+    """
+
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), multiprocess_mode='sum'):
+        super().__init__(name, documentation, labelnames)
+        self.multiprocess_mode = multiprocess_mode
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def merge(self, total, data):
+        return max(total, data) if self.multiprocess_mode == 'max' else total + data
+
+    def _format(self, values, data):
+        return [f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(data)}']
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            if index < len(self.counts):
+                self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """返回计时上下文管理器，退出时记录耗时（秒）"""
+        return _HistogramTimer(self)
+
+    def sample(self):
+        """返回 [各分桶的计数..., 总和, 总数]"""
+        with self._lock:
+            return self.counts + [self.sum, self.count]
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * len(self.buckets)
+            self.sum = 0.0
+            self.count = 0
+
+class _HistogramTimer:
+    __slots__ = ('child', 'start', 'elapsed')
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        self.child.observe(self.elapsed)
+        return False
+
+class Histogram(_Metric):
+    """分桶统计的直方图"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    @staticmethod
+    def merge(total, data):
+        return [a + b for a, b in zip(total, data)]
+
+    def _format(self, values, data):
+        counts, total, count = data[:-2], data[-2], data[-1]
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames + ('le',), values + (_format_value(float(bound)),))
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames + ('le',), values + ('+Inf',))
+        lines.append(f'{self.name}_bucket{labels} {count}')
+        lines.append(f'{self.name}_sum{_format_labels(self.labelnames, values)} {_format_value(total)}')
+        lines.append(f'{self.name}_count{_format_labels(self.labelnames, values)} {count}')
+        return lines
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def snapshot(self):
+        """返回本进程所有指标的数据 {指标名: {标签值元组: 数据}}"""
+        return {metric.name: metric.samples() for metric in self._metrics}
+
+    def reset(self):
+        for metric in self._metrics:
+            metric.reset()
+
+    def render(self, snapshots=(), archive=None):
+        """输出 Prometheus 文本格式
+
+        Args:
+            snapshots (iterable, optional): 其他仍在运行的进程的 snapshot()，与本进程的数据合并
+            archive (dict, optional): 已退出进程的计数器和直方图合计
+        """
+        snapshots = list(snapshots)
+        lines = []
+        for metric in self._metrics:
+            sources = [metric.samples()]
+            sources.extend(snapshot.get(metric.name, {}) for snapshot in snapshots)
+            if archive is not None and not isinstance(metric, Gauge):
+                sources.append(archive.get(metric.name, {}))
+            lines.extend(metric.collect(_merge_samples(metric, sources)))
+        return '\n'.join(lines) + '\n'
+
+def _merge_samples(metric, sources):
+    """合并多个进程中同一指标的数据"""
+    merged = {}
+    for samples in sources:
+        for values, data in samples.items():
+            merged[values] = metric.merge(merged[values], data) if values in merged else data
+    return merged
+
+registry = Registry()
+
+UPSTREAM_LATENCY = registry.register(Histogram(
+    'search_upstream_latency_seconds', '上游搜索引擎请求耗时', ['engine']))
+CONVERSION_LATENCY = registry.register(Histogram(
+    'search_conversion_seconds', '上游响应转换为智谱AI兼容格式的耗时', ['engine']))
+SERIALIZATION_LATENCY = registry.register(Histogram(
+    'search_serialization_seconds', '搜索结果序列化耗时', ['engine']))
+REQUEST_LATENCY = registry.register(Histogram(
+    'search_request_seconds', '/api/search 请求总耗时', ['engine', 'cache']))
+RERANK_LATENCY = registry.register(Histogram(
+    'search_rerank_seconds', '搜索结果重排耗时', ['engine']))
+RESPONSE_SIZE = registry.register(Histogram(
+    'search_response_bytes', '/api/search 响应大小', ['engine'], buckets=SIZE_BUCKETS))
+UPSTREAM_RESPONSE_SIZE = registry.register(Histogram(
+    'search_upstream_response_bytes', '上游搜索引擎响应大小', ['engine'], buckets=SIZE_BUCKETS))
+UPSTREAM_ERRORS = registry.register(Counter(
+    'search_upstream_errors_total', '上游搜索引擎错误次数', ['engine', 'kind']))
+UPSTREAM_TIMEOUTS = registry.register(Counter(
+    'search_upstream_timeouts_total', '上游搜索引擎超时次数', ['engine']))
+CACHE_REQUESTS = registry.register(Counter(
+    'search_cache_requests_total', '按缓存结果统计的搜索请求数', ['engine', 'cache']))
+SINGLEFLIGHT_SHARED = registry.register(Counter(
+    'search_singleflight_shared_total', '共享了并发请求结果（未发出上游请求）的搜索次数', ['engine', 'source']))
+CIRCUIT_STATE = registry.register(Gauge(
+    'search_circuit_state', '熔断器状态（0关闭，1半开，2打开，多个工作进程时取最大值）', ['engine'],
+    multiprocess_mode='max'))
+CIRCUIT_REJECTIONS = registry.register(Counter(
+    'search_circuit_rejections_total', '熔断器拒绝的请求数', ['engine']))
+UPSTREAM_TIMEOUT = registry.register(Gauge(
+    'search_upstream_timeout_seconds', '当前的自适应上游超时时间', ['engine'], multiprocess_mode='max'))
+HEDGED_REQUESTS = registry.register(Counter(
+    'search_hedged_requests_total', '对冲请求次数（sent 为发送次数，won 为对冲请求先返回的次数，skipped 为没有限流令牌而未发送的次数）', ['engine', 'outcome']))
+RATE_LIMIT_QUEUE = registry.register(Gauge(
+    'search_ratelimit_queue_depth', '等待限流令牌的上游请求数', ['provider', 'priority']))
+RATE_LIMIT_WAIT = registry.register(Histogram(
+    'search_ratelimit_wait_seconds', '上游请求等待限流令牌的时间', ['provider', 'priority']))
+RATE_LIMIT_REJECTIONS = registry.register(Counter(
+    'search_ratelimit_rejections_total', '限流拒绝的请求数（queue_full 为队列已满，timeout 为排队超时）', ['provider', 'reason']))
+DUPLICATES_REMOVED = registry.register(Counter(
+    'search_duplicates_removed_total', '去重删除的结果数（url 为链接重复，near 为内容近似重复）', ['engine', 'kind']))
+CACHE_WARM_REQUESTS = registry.register(Counter(
+    'search_cache_warm_requests_total', '缓存预热请求上游的次数（refreshed 为成功，failed 为失败）', ['engine', 'outcome']))
+CACHE_ENTRIES = registry.register(Gauge(
+    'search_cache_entries', '结果缓存条目数'))
+CACHE_BYTES = registry.register(Gauge(
+    'search_cache_bytes', '结果缓存估算占用字节数'))
+
+_exporter_pid = None
+_exporter_lock = threading.Lock()
+
+def shared_dir():
+    """返回汇总多进程指标的共享目录，未设置 METRICS_DIR 时返回None"""
+    return os.getenv('METRICS_DIR') or None
+
+def _encode(snapshot):
+    """标签值元组不能作为JSON的键，每个指标的数据写为 [[标签值列表, 数据], ...]"""
+    return {name: [[list(values), data] for values, data in samples.items()] for name, samples in snapshot.items()}
+
+def _decode(data):
+    return {name: {tuple(values): sample for values, sample in samples} for name, samples in data.items()}
+
+def _read(path):
+    """读取指标文件，不存在或内容无效时返回None"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return _decode(json.load(f))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, TypeError) as e:
+        logger.warning('读取指标文件失败: %s', e, extra={'path': path})
+        return None
+
+def _write(path, snapshot):
+    """原子地写入指标文件，读取方不会读到写了一半的文件"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(_encode(snapshot), f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+class _DirLock:
+    """共享目录的文件锁：输出指标时持有共享锁，归档已退出进程的指标时持有排他锁，
+    保证读取方不会在归档过程中漏读或重复读取同一进程的计数"""
+
+    def __init__(self, directory, exclusive):
+        self.path = os.path.join(directory, LOCK_FILE)
+        self.operation = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a')
+        fcntl.flock(self._file.fileno(), self.operation)
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+
+def _process_path(directory, pid):
+    return os.path.join(directory, f'{pid}.json')
+
+def flush():
+    """把本进程的指标写入共享目录（未设置 METRICS_DIR 时不执行）"""
+    directory = shared_dir()
+    if not directory or fcntl is None:
+        return
+    try:
+        os.makedirs(directory, exist_ok=True)
+        _write(_process_path(directory, os.getpid()), registry.snapshot())
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning('写入指标文件失败: %s', e, extra={'path': directory})
+
+def _flush_loop(interval):
+    while True:
+        time.sleep(interval)
+        flush()
+
+def start_exporter():
+    """在工作进程中启动定期写入指标的后台线程（每个进程一个）
+
+    从主进程派生的工作进程先清零继承的计数，避免主进程派生前的计数被每个工作进程重复统计。
+    """
+    global _exporter_pid
+    if not shared_dir() or fcntl is None:
+        return
+    with _exporter_lock:
+        if _exporter_pid == os.getpid():
+            return
+        _exporter_pid = os.getpid()
+    registry.reset()
+    flush()
+    interval = max(env_float('METRICS_FLUSH_INTERVAL', 5.0), 0.1)
+    threading.Thread(target=_flush_loop, args=(interval,), name='metrics-exporter', daemon=True).start()
+
+def mark_process_dead(pid):
+    """工作进程退出后由主进程调用：把其计数器和直方图累加到归档文件，并删除其指标文件"""
+    directory = shared_dir()
+    if not directory or fcntl is None or not os.path.isdir(directory):
+        return
+    path = _process_path(directory, pid)
+    try:
+        with _DirLock(directory, exclusive=True):
+            snapshot = _read(path)
+            if snapshot is not None:
+                archive_path = os.path.join(directory, ARCHIVE_FILE)
+                archive = _read(archive_path) or {}
+                for metric in registry._metrics:
+                    if isinstance(metric, Gauge) or metric.name not in snapshot:
+                        continue
+                    archive[metric.name] = _merge_samples(
+                        metric, [archive.get(metric.name, {}), snapshot[metric.name]])
+                _write(archive_path, archive)
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+    except OSError as e:
+        logger.warning('归档指标文件失败: %s', e, extra={'path': path})
+
+def clear_shared_dir():
+    """删除共享目录中上次运行留下的指标文件，由主进程在启动时调用"""
+    directory = shared_dir()
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith('.json') or name.endswith('.tmp'):
+            try:
+                os.unlink(os.path.join(directory, name))
+            except OSError:
+                pass
+
+def render():
+    """输出所有指标，设置 METRICS_DIR 时合并所有工作进程的指标"""
+    directory = shared_dir()
+    if not directory or fcntl is None or not os.path.isdir(directory):
+        return registry.render()
+
+    flush()
+    own = f'{os.getpid()}.json'
+    snapshots = []
+    with _DirLock(directory, exclusive=False):
+        archive = _read(os.path.join(directory, ARCHIVE_FILE))
+        for name in os.listdir(directory):
+            if name.endswith('.json') and name not in (own, ARCHIVE_FILE):
+                snapshot = _read(os.path.join(directory, name))
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+    return registry.render(snapshots, archive)
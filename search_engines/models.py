@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+搜索结果模型实现
+
+各搜索引擎模块将上游返回的每条结果转换为 SearchItem，缓存、合并等内部处理都直接使用该对象，
+只在输出响应时序列化一次（format 参数）：
+
+- zhipu（默认）：与智谱AI Web Search API 兼容的格式，缩略图、网站、语言等附加信息以HTML片段
+  拼接到 content 中
+- compact：只包含非空字段的结构化结果，由前端渲染，响应体积更小
+
+encode() 输出响应体时，缓存中的结果的 search_result 按格式保存已编码的JSON，之后命中缓存的请求
+直接拼接这部分字节，只编码 id、meta 等少量字段。
+"""
+
+import threading
+from collections import OrderedDict
+
+from . import codec
+
+# 支持的输出格式
+ZHIPU = 'zhipu'
+COMPACT = 'compact'
+FORMATS = (ZHIPU, COMPACT)
+
+# 最多保存的已编码 search_result 数
+ENCODED_ITEMS_MAX = 256
+
+# compact 格式中即使为空也保留的字段
+_REQUIRED_FIELDS = ('title', 'link')
+
+# zhipu 格式中以HTML片段拼接到 content 的附加信息
+_CONTENT_DETAILS = (
+    ('site', '网站'),
+    ('language', '语言'),
+    ('publisher', '发布者'),
+    ('duration', '时长'),
+    ('upstream', '搜索引擎')
+)
+
+class SearchItem:
+    """单条搜索结果
+
+    Attributes:
+        title (str): 标题
+        link (str): 结果链接，没有链接时为 #
+        content (str): 内容摘要（纯文本）
+        media (str): 来源网站名称或域名
+        icon (str): 网站图标
+        refer (str): 结果类型标记，如 图片、视频、错误
+        published (str): 发布时间
+        site (str): 网站名称
+        language (str): 语言
+        thumbnail (str): 缩略图地址
+        publisher (str): 发布者（视频）
+        duration (str): 时长（视频）
+        upstream (str): SearXNG 中给出该结果的搜索引擎，如 google
+        category (str): SearXNG 结果分类
+        engine (str): 聚合搜索中排名最高的来源搜索引擎
+        sources (list): 聚合搜索中的所有来源搜索引擎
+        score (float): 聚合搜索的融合得分
+    """
+
+    __slots__ = ('title', 'link', 'content', 'media', 'icon', 'refer', 'published', 'site', 'language',
+                 'thumbnail', 'publisher', 'duration', 'upstream', 'category', 'engine', 'sources', 'score')
+
+    def __init__(self, title='', link='#', content='', media='', icon='', refer='', published='', site='',
+                 language='', thumbnail='', publisher='', duration='', upstream='', category='',
+                 engine=None, sources=None, score=None):
+        self.title = title
+        self.link = link
+        self.content = content
+        self.media = media
+        self.icon = icon
+        self.refer = refer
+        self.published = published
+        self.site = site
+        self.language = language
+        self.thumbnail = thumbnail
+        self.publisher = publisher
+        self.duration = duration
+        self.upstream = upstream
+        self.category = category
+        self.engine = engine
+        self.sources = sources
+        self.score = score
+
+    @classmethod
+    def from_dict(cls, data):
+        """从 compact 格式或智谱AI格式的字典创建，忽略未知字段"""
+        fields = {name: data[name] for name in cls.__slots__ if name in data and data[name] is not None}
+        if 'published' not in fields and data.get('publish_date'):
+            fields['published'] = data['publish_date']
+        return cls(**fields)
+
+    def copy(self):
+        """返回浅拷贝"""
+        item = SearchItem.__new__(SearchItem)
+        for name in self.__slots__:
+            setattr(item, name, getattr(self, name))
+        return item
+
+    def to_dict(self):
+        """compact 格式：只包含非空字段"""
+        data = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if value or name in _REQUIRED_FIELDS:
+                data[name] = value
+        return data
+
+    def to_zhipu(self):
+        """智谱AI兼容格式"""
+        parts = [self.content]
+        if self.thumbnail:
+            parts.append(f'<img src="{self.thumbnail}" alt="{self.title}" style="max-width:200px;">')
+        for name, label in _CONTENT_DETAILS:
+            value = getattr(self, name)
+            if value:
+                parts.append(f'<small>{label}: {value}</small>')
+
+        data = {
+            'title': self.title,
+            'link': self.link,
+            'content': '<br>'.join(parts),
+            'media': self.media,
+            'icon': self.icon,
+            'refer': self.refer
+        }
+        if self.published:
+            data['publish_date'] = self.published
+        if self.category:
+            data['category'] = self.category
+        if self.engine is not None:
+            data['engine'] = self.engine
+            data['sources'] = self.sources
+            data['score'] = self.score
+        return data
+
+    def __repr__(self):
+        return f'SearchItem({self.title!r}, {self.link!r})'
+
+def parse_format(value):
+    """解析 format 参数，未指定时返回默认的 zhipu，无效时返回None"""
+    if not value:
+        return ZHIPU
+    value = value.lower()
+    return value if value in FORMATS else None
+
+def serialize_items(items, fmt=ZHIPU):
+    """将 SearchItem 列表序列化为指定格式的字典列表"""
+    if fmt == COMPACT:
+        return [item.to_dict() for item in items]
+    return [item.to_zhipu() for item in items]
+
+# (列表对象的 id, 格式) -> (列表, 已编码的JSON)，引用列表本身以确保 id 不被复用
+_encoded_items = OrderedDict()
+_encoded_lock = threading.Lock()
+
+def encode_items(items, fmt=ZHIPU):
+    """返回 SearchItem 列表序列化后的JSON，同一个列表对象只编码一次
+
+    只用于缓存中不会被修改的列表（缓存中的结果不能被修改）。
+    """
+    key = (id(items), fmt)
+    with _encoded_lock:
+        found = _encoded_items.get(key)
+        if found is not None and found[0] is items:
+            _encoded_items.move_to_end(key)
+            return found[1]
+
+    data = codec.dumps(serialize_items(items, fmt))
+    with _encoded_lock:
+        _encoded_items[key] = (items, data)
+        _encoded_items.move_to_end(key)
+        while len(_encoded_items) > ENCODED_ITEMS_MAX:
+            _encoded_items.popitem(last=False)
+    return data
+
+def encode(result, fmt=ZHIPU, reuse=False):
+    """将结果编码为指定格式的JSON响应体
+
+    Args:
+        result (dict): 搜索结果
+        fmt (str, optional): 输出格式
+        reuse (bool, optional): search_result 是否为缓存中的列表（未经重排、合并等处理），
+            是时复用其已编码的JSON（见 encode_items）
+
+    Returns:
+        bytes: UTF-8编码的JSON
+    """
+    items = result.get('search_result')
+    if not items:
+        return codec.dumps(result, default=json_default)
+    encoded = encode_items(items, fmt) if reuse else codec.dumps(serialize_items(items, fmt))
+    rest = codec.dumps({key: value for key, value in result.items() if key != 'search_result'}, default=json_default)
+    return b'{"search_result":' + encoded + (b',' + rest[1:] if len(rest) > 2 else b'}')
+
+def serialize(result, fmt=ZHIPU):
+    """返回 search_result 已序列化为指定格式的结果副本，用于输出响应"""
+    if not result.get('search_result'):
+        return result
+    return {**result, 'search_result': serialize_items(result['search_result'], fmt)}
+
+def load(result):
+    """将从JSON读取的结果中的 search_result 转换回 SearchItem"""
+    if isinstance(result, dict) and result.get('search_result'):
+        result['search_result'] = [
+            item if isinstance(item, SearchItem) else SearchItem.from_dict(item)
+            for item in result['search_result']
+        ]
+    return result
+
+def json_default(value):
+    """json.dumps 的 default 参数，将 SearchItem 写为 compact 格式，其他对象写为字符串"""
+    if isinstance(value, SearchItem):
+        return value.to_dict()
+    return str(value)
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+分页实现
+
+SearXNG 每次请求只返回一页结果，Bocha AI 每次最多返回 50 条。请求的 count 超过一次上游请求能返回的结果数时，
+按结果区间计算需要的上游页，并发请求后按上游位置截取该区间的结果，再去重（见 dedup 模块）：
+
+- 第 page 页（每页 count 条）对应第 (page-1)*count 到 page*count 条结果，上游第 p 页的第 i 条结果
+  位于第 (p-1)*page_size+i 条。先截取后去重，各页的区间互不重叠、首尾相接，去重只会使本页少于 count 条，
+  不会使后面的页重复或遗漏结果
+- Bocha AI 的 count 不超过 50 时只请求一次（与上游分页一致），超过时按每页 50 条换算上游页码
+- SearXNG 每页的结果数不固定（通常为20条以上），按每页 SEARXNG_PAGE_SIZE 条换算上游页码（pageno），每页最多取该数量。
+  换算必须与页码无关，否则相邻两页的结果会重复或遗漏，因此使用固定值而不是按每次的响应估计：
+  设置得偏大时上游页不足的部分在合并结果中留空，偏小时每页超出的结果被丢弃并多请求上游页
+
+开启 PAGINATION_PREFETCH 后，返回第 page 页时在后台以 background 优先级请求第 page+1 页并写入缓存，
+翻到下一页时直接命中缓存。
+
+配置:
+    SEARXNG_PAGE_SIZE      SearXNG 每页取用的结果数，默认20
+    PAGINATION_MAX_PAGES   每次搜索最多请求的上游页数，默认5
+    PAGINATION_MAX_WORKERS 并发请求上游页的线程池大小，默认16
+    PAGINATION_PREFETCH    是否预取下一页，默认关闭；可用 PAGINATION_PREFETCH_<ENGINE> 单独配置
+"""
+
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from . import bochaai, searxng, dedup, ratelimit
+from .config import env_int, env_bool, engine_env
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# 支持分页的搜索引擎
+ENGINES = ('bochaai', 'searxng')
+
+# 未指定 count 时的默认结果数
+DEFAULT_COUNT = 10
+
+# SearXNG 每页取用的默认结果数（SearXNG 合并各引擎的结果，每页通常为20条以上）
+SEARXNG_PAGE_SIZE = 20
+
+# 并发请求上游页共享的线程池
+_executor = ThreadPoolExecutor(
+    max_workers=env_int('PAGINATION_MAX_WORKERS', 16),
+    thread_name_prefix='pagination'
+)
+
+class Plan:
+    """一次搜索需要请求的上游页
+
+    Attributes:
+        pages (list): 上游页码
+        page_size (int): 每个上游页请求的结果数
+        skip (int): 从第一个上游页起跳过的条数（按上游位置计）
+        count (int): 截取的条数
+    """
+
+    __slots__ = ('pages', 'page_size', 'skip', 'count')
+
+    def __init__(self, pages, page_size, skip, count):
+        self.pages = pages
+        self.page_size = page_size
+        self.skip = skip
+        self.count = count
+
+def _page_size(engine, count):
+    if engine == 'bochaai':
+        return count if count <= bochaai.MAX_COUNT else bochaai.MAX_COUNT
+    return max(1, env_int('SEARXNG_PAGE_SIZE', SEARXNG_PAGE_SIZE))
+
+def plan(engine, count, page):
+    """计算第 page 页（每页 count 条）需要请求的上游页
+
+    Args:
+        engine (str): bochaai 或 searxng
+        count (int): 每页结果数
+        page (int): 页码，从1开始
+
+    Returns:
+        Plan: 上游页和截取范围
+    """
+    count = max(1, count)
+    page = max(1, page)
+    page_size = _page_size(engine, count)
+
+    start = (page - 1) * count
+    first = start // page_size + 1
+    last = (start + count - 1) // page_size + 1
+    max_pages = max(1, env_int('PAGINATION_MAX_PAGES', 5))
+    if last - first + 1 > max_pages:
+        last = first + max_pages - 1
+    return Plan(list(range(first, last + 1)), page_size, start - (first - 1) * page_size, count)
+
+def _page_params(params, plan, page):
+    """上游页的请求参数"""
+    return {**params, 'count': plan.page_size, 'page': page}
+
+def _fetch_page(engine, query, params):
+    """请求单个上游页"""
+    if engine == 'bochaai':
+        return bochaai.search(query, **params)
+    return searxng.search(query, **params)
+
+async def _async_fetch_page(engine, query, params):
+    """_fetch_page() 的异步版本"""
+    if engine == 'bochaai':
+        return await bochaai.async_search(query, **params)
+    return await searxng.async_search(query, **params)
+
+def _fetch_extra_page(engine, query, params):
+    """请求第一页之外的上游页，每页单独取得限流令牌"""
+    ratelimit.acquire(engine)
+    return _fetch_page(engine, query, params)
+
+async def _async_fetch_extra_page(engine, query, params):
+    """_fetch_extra_page() 的异步版本"""
+    await ratelimit.async_acquire(engine)
+    return await _async_fetch_page(engine, query, params)
+
+def _is_failed(result):
+    """上游页是否请求失败"""
+    return 'error' in result or any(item.refer == '错误' for item in result.get('search_result', []))
+
+def _combine(engine, plan, results):
+    """合并各上游页的结果：第一页失败时返回第一页，其余失败的页被忽略
+
+    Args:
+        engine (str): 搜索引擎
+        plan (Plan): 上游页
+        results (list): 与 plan.pages 对应的上游结果或异常
+
+    Returns:
+        dict: 截取并去重后的结果，meta.pages 为请求的上游页数
+    """
+    first = results[0]
+    if isinstance(first, BaseException):
+        raise first
+    if _is_failed(first):
+        return first
+
+    items = []
+    failed = 0
+    end = plan.skip + plan.count
+    for index, (page, result) in enumerate(zip(plan.pages, results)):
+        if isinstance(result, BaseException) or _is_failed(result):
+            failed += 1
+            logger.warning('第 %d 个上游页请求失败: %s', page,
+                           result if isinstance(result, BaseException) else result.get('error', ''),
+                           extra={'engine': engine})
+            continue
+        # 按上游位置截取：本页的结果位于 [offset, offset+page_size)，不足一页时后面的位置留空
+        offset = index * plan.page_size
+        page_items = result.get('search_result', [])[:plan.page_size]
+        items.extend(page_items[max(0, plan.skip - offset):max(0, end - offset)])
+
+    combined = dedup.dedupe(engine, {**first, 'search_result': items, 'meta': dict(first.get('meta') or {})})
+    combined['meta']['pages'] = len(plan.pages)
+    if failed:
+        combined['meta']['pagesFailed'] = failed
+    return combined
+
+def _needs_pages(engine, params):
+    """是否需要按分页规则请求（否则直接请求一次，保持上游原有行为）"""
+    count = params.get('count')
+    page = params.get('page') or 1
+    if engine == 'bochaai':
+        return count is not None and count > bochaai.MAX_COUNT
+    return (count or DEFAULT_COUNT) > _page_size(engine, count) or page > 1
+
+def search(engine, query, params):
+    """执行搜索，count 超过一次上游请求的结果数时并发请求多个上游页
+
+    Args:
+        engine (str): bochaai 或 searxng
+        query (str): 搜索查询
+        params (dict): 该搜索引擎 search() 函数的关键字参数
+
+    Returns:
+        dict: 去重后的搜索结果
+    """
+    if not _needs_pages(engine, params):
+        return dedup.dedupe(engine, _fetch_page(engine, query, params))
+
+    page_plan = plan(engine, params.get('count') or DEFAULT_COUNT, params.get('page') or 1)
+    futures = [
+        # 复制当前上下文，使线程池中的日志带上请求ID并继承限流优先级
+        _executor.submit(contextvars.copy_context().run, _fetch_extra_page, engine, query,
+                         _page_params(params, page_plan, page))
+        for page in page_plan.pages[1:]
+    ]
+    results = []
+    try:
+        results.append(_fetch_page(engine, query, _page_params(params, page_plan, page_plan.pages[0])))
+    except Exception as e:
+        results.append(e)
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+    return _combine(engine, page_plan, results)
+
+async def async_search(engine, query, params):
+    """search() 的异步版本"""
+    if not _needs_pages(engine, params):
+        return dedup.dedupe(engine, await _async_fetch_page(engine, query, params))
+
+    page_plan = plan(engine, params.get('count') or DEFAULT_COUNT, params.get('page') or 1)
+    results = await asyncio.gather(
+        _async_fetch_page(engine, query, _page_params(params, page_plan, page_plan.pages[0])),
+        *[
+            _async_fetch_extra_page(engine, query, _page_params(params, page_plan, page))
+            for page in page_plan.pages[1:]
+        ],
+        return_exceptions=True
+    )
+    return _combine(engine, page_plan, results)
+
+def next_page_params(engine, params, result):
+    """返回预取下一页的参数，未开启预取或没有下一页时返回None
+
+    Args:
+        engine (str): 搜索引擎
+        params (dict): parse_params() 返回的参数
+        result (dict): 本页的正常搜索结果
+
+    Returns:
+        dict|None: 下一页的参数
+    """
+    if engine not in ENGINES or not engine_env('PAGINATION_PREFETCH', engine, False, parse=env_bool):
+        return None
+    # 本页（去重前）结果不足 count 条时认为没有下一页
+    returned = len(result.get('search_result', [])) + (result.get('meta') or {}).get('duplicates', 0)
+    if returned < (params.get('count') or DEFAULT_COUNT):
+        return None
+    return {**params, 'page': (params.get('page') or 1) + 1}
@@ -0,0 +1,359 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+上游实例池实现
+
+同一搜索引擎配置了多个实例（如多个 SearXNG 实例）时，按健康状况和延迟在实例间负载均衡：
+
+- 每个实例记录延迟的指数加权移动平均（EWMA）和进行中的请求数，
+  每次从两个随机的健康实例中选择 EWMA×(进行中请求数+1) 较小的一个
+- 请求失败（连接错误、超时、5xx）的实例暂时停用，连续失败时停用时间指数增长
+- 对冲请求：主实例在最近请求耗时的 p95 内没有响应时，向另一个实例发送相同的请求，
+  采用先返回的结果；主实例很快失败时也会立即改用另一个实例（故障转移）
+
+主请求在调用方的线程（或协程）中执行，只有对冲请求使用线程池。对冲请求是额外的上游请求，
+发送前不等待地取得一个限流令牌，没有令牌时不发送。先返回的一方获胜后，落后的一方被中断
+（同步请求关闭其连接，异步请求取消），已返回的响应被关闭。
+
+配置（均可用 _<ENGINE> 后缀单独配置，如 HEDGE_DELAY_SEARXNG）:
+    HEDGE_REQUESTS    是否发送对冲请求，默认开启
+    HEDGE_DELAY       发送对冲请求前的等待时间（秒），默认0表示使用最近请求耗时的p95
+    INSTANCE_BACKOFF  实例失败后的停用时间（秒），默认5，连续失败时翻倍，最长60
+"""
+
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from . import http_client, breaker, metrics, ratelimit
+from .config import env_int, env_float, env_bool, engine_env
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# EWMA 的平滑系数
+EWMA_ALPHA = 0.3
+
+# 实例最长停用时间（秒）
+MAX_BACKOFF = 60
+
+# 使用 p95 作为对冲等待时间所需的最少样本数，不足时使用 DEFAULT_HEDGE_DELAY
+MIN_HEDGE_SAMPLES = 20
+DEFAULT_HEDGE_DELAY = 1.0
+
+# 同步对冲请求的状态
+_WAITING = 'waiting'
+_SENT = 'sent'
+
+_PRIMARY = 'primary'
+_HEDGE = 'hedge'
+
+# 同步对冲请求使用的线程池
+_executor = ThreadPoolExecutor(max_workers=env_int('HEDGE_MAX_WORKERS', 32), thread_name_prefix='hedge')
+
+def parse_urls(value):
+    """解析逗号（或空白）分隔的实例地址列表，去掉末尾的 /"""
+    urls = []
+    for url in (value or '').replace(',', ' ').split():
+        url = url.rstrip('/')
+        if url and url not in urls:
+            urls.append(url)
+    return urls
+
+class Instance:
+    """单个上游实例的健康和延迟统计"""
+
+    __slots__ = ('url', 'ewma', 'inflight', 'failures', 'down_until', 'requests', 'errors')
+
+    def __init__(self, url):
+        self.url = url
+        self.ewma = None
+        self.inflight = 0
+        self.failures = 0
+        self.down_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    def score(self):
+        """负载均衡得分，越小越优先。还没有延迟数据的实例优先，以便尽快获得数据"""
+        return (self.ewma or 0.0) * (self.inflight + 1)
+
+class _Hedge:
+    """同步请求的一次对冲：主请求在调用线程中执行，对冲请求在线程池中延迟发送"""
+
+    __slots__ = ('lock', 'done', 'state', 'winner', 'primary', 'secondary', 'future')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # 主请求已结束
+        self.done = threading.Event()
+        self.state = _WAITING
+        self.winner = None
+        # 中断落后的一方
+        self.primary = http_client.Interrupt()
+        self.secondary = http_client.Interrupt()
+        self.future = None
+
+class InstancePool:
+    """搜索引擎的上游实例池"""
+
+    def __init__(self, engine, urls):
+        self.engine = engine
+        self.instances = [Instance(url) for url in urls]
+        self._lock = threading.Lock()
+
+    def ranked(self):
+        """返回按优先级排列的实例：第一个为主实例，其余按得分排序，停用中的实例排在最后"""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [instance for instance in self.instances if instance.down_until <= now]
+            down = sorted((instance for instance in self.instances if instance.down_until > now),
+                          key=lambda instance: instance.down_until)
+            if len(healthy) >= 2:
+                # 两个随机选择（power of two choices），避免所有请求集中到同一个实例
+                first, second = random.sample(healthy, 2)
+                primary = first if first.score() <= second.score() else second
+            elif healthy:
+                primary = healthy[0]
+            else:
+                primary = down.pop(0)
+            rest = sorted((instance for instance in healthy if instance is not primary), key=Instance.score)
+            return [primary] + rest + down
+
+    def hedge_delay(self):
+        """发送对冲请求前的等待时间（秒），不发送对冲请求时返回None"""
+        if len(self.instances) < 2 or not engine_env('HEDGE_REQUESTS', self.engine, True, parse=env_bool):
+            return None
+        delay = engine_env('HEDGE_DELAY', self.engine, 0, parse=env_float)
+        if delay > 0:
+            return delay
+        p95 = breaker.get(self.engine).percentile(0.95, MIN_HEDGE_SAMPLES)
+        return p95 if p95 is not None else DEFAULT_HEDGE_DELAY
+
+    def _begin(self, instance):
+        with self._lock:
+            instance.inflight += 1
+            instance.requests += 1
+        return time.perf_counter()
+
+    def _end(self, instance, start, failed, cancelled=False):
+        """记录一次请求的结果，失败的实例暂时停用
+
+        被取消的请求（对冲中落后的一方）的耗时只是实际延迟的下限，只用于更新 EWMA。
+        """
+        latency = time.perf_counter() - start
+        with self._lock:
+            instance.inflight -= 1
+            if cancelled:
+                instance.ewma = latency if instance.ewma is None else max(instance.ewma, latency)
+            elif failed:
+                instance.errors += 1
+                instance.failures += 1
+                backoff = engine_env('INSTANCE_BACKOFF', self.engine, 5, parse=env_float)
+                instance.down_until = time.monotonic() + min(MAX_BACKOFF, backoff * 2 ** (instance.failures - 1))
+            else:
+                instance.failures = 0
+                instance.down_until = 0.0
+                instance.ewma = latency if instance.ewma is None else (
+                    EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * instance.ewma)
+
+    def _attempt(self, instance, path, params, timeout, interrupt=None):
+        """向一个实例发送请求，5xx 响应视为失败并抛出 HTTPError"""
+        start = self._begin(instance)
+        failed = True
+        try:
+            response = http_client.get(instance.url + path, params=params, timeout=timeout, engine=self.engine,
+                                       interrupt=interrupt)
+            if response.status_code >= 500:
+                response.raise_for_status()
+            failed = False
+            return response
+        finally:
+            # 被对冲请求中断的主请求不计为实例失败
+            self._end(instance, start, failed, cancelled=failed and interrupt is not None and interrupt.interrupted)
+
+    async def _async_attempt(self, instance, path, params, timeout):
+        """_attempt() 的异步版本"""
+        start = self._begin(instance)
+        failed = True
+        cancelled = False
+        try:
+            response = await http_client.async_get(instance.url + path, params=params, timeout=timeout, engine=self.engine)
+            if response.status_code >= 500:
+                response.raise_for_status()
+            failed = False
+            return response
+        except asyncio.CancelledError:
+            # 对冲请求中落后的一方被取消，不计为实例失败
+            cancelled = True
+            raise
+        finally:
+            self._end(instance, start, failed, cancelled)
+
+    def _hedged(self, instance):
+        logger.debug('发送对冲请求: %s', instance.url, extra={'engine': self.engine})
+        metrics.HEDGED_REQUESTS.labels(self.engine, 'sent').inc()
+
+    def _can_hedge(self):
+        """取得对冲请求的限流令牌，没有令牌时不发送对冲请求"""
+        if ratelimit.try_acquire(self.engine):
+            return True
+        metrics.HEDGED_REQUESTS.labels(self.engine, 'skipped').inc()
+        return False
+
+    def _send_hedge(self, hedge, instance, path, params, timeout, delay):
+        """主请求 delay 秒内没有结束时发送对冲请求
+
+        Returns:
+            requests.Response|None: 对冲请求获胜时返回其响应，未发送或落后时返回None
+        """
+        if hedge.done.wait(delay) or not self._can_hedge():
+            return None
+        with hedge.lock:
+            if hedge.done.is_set():
+                return None
+            hedge.state = _SENT
+        self._hedged(instance)
+        response = self._attempt(instance, path, params, timeout, interrupt=hedge.secondary)
+        with hedge.lock:
+            if hedge.winner is None:
+                hedge.winner = _HEDGE
+        if hedge.winner != _HEDGE:
+            response.close()
+            return None
+        metrics.HEDGED_REQUESTS.labels(self.engine, 'won').inc()
+        hedge.primary.interrupt()
+        return response
+
+    def get(self, path, params=None, timeout=None):
+        """发送GET请求，必要时向第二个实例发送对冲请求
+
+        Args:
+            path (str): 请求路径，如 /search
+            params (dict, optional): 查询参数
+            timeout (float, optional): 超时时间（秒）
+
+        Returns:
+            requests.Response: 先返回的成功响应
+
+        Raises:
+            requests.exceptions.RequestException: 所有尝试的实例都失败时抛出最后一个错误
+        """
+        instances = self.ranked()
+        delay = self.hedge_delay()
+        if delay is None:
+            return self._attempt(instances[0], path, params, timeout)
+
+        hedge = _Hedge()
+        hedge.future = _executor.submit(contextvars.copy_context().run, self._send_hedge, hedge, instances[1],
+                                        path, params, timeout, delay)
+        response = error = None
+        try:
+            response = self._attempt(instances[0], path, params, timeout, interrupt=hedge.primary)
+        except requests.exceptions.RequestException as e:
+            error = e
+        with hedge.lock:
+            hedge.done.set()
+            if error is None and hedge.winner is None:
+                hedge.winner = _PRIMARY
+            sent = hedge.state == _SENT
+
+        if hedge.winner == _PRIMARY:
+            if sent:
+                hedge.secondary.interrupt()
+            return response
+        if response is not None:
+            response.close()
+        if sent:
+            # 对冲请求已获胜或仍在进行，等待其结果；对冲请求也失败时抛出其错误
+            return hedge.future.result()
+        # 主请求在发送对冲请求前失败：故障转移到另一个实例，替代失败的请求，不另取令牌
+        self._hedged(instances[1])
+        return self._attempt(instances[1], path, params, timeout)
+
+    async def async_get(self, path, params=None, timeout=None):
+        """get() 的异步版本，落后的请求会被取消"""
+        instances = self.ranked()
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._async_attempt(instances[0], path, params, timeout)
+
+        candidates = instances[:2]
+        tasks = {asyncio.ensure_future(self._async_attempt(candidates[0], path, params, timeout)): 0}
+        started = 1
+        hedging = True
+        last_error = None
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(tasks, timeout=delay if started < len(candidates) and hedging else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index = tasks.pop(task)
+                    try:
+                        response = task.result()
+                    except requests.exceptions.RequestException as e:
+                        last_error = e
+                        continue
+                    if index > 0:
+                        metrics.HEDGED_REQUESTS.labels(self.engine, 'won').inc()
+                    return response
+
+                if started < len(candidates) and (not done or not tasks):
+                    # 等待超时时发送对冲请求（需要限流令牌）；已发出的请求全部失败时故障转移，不另取令牌
+                    if not done and not self._can_hedge():
+                        hedging = False
+                        continue
+                    self._hedged(candidates[started])
+                    tasks[asyncio.ensure_future(self._async_attempt(candidates[started], path, params, timeout))] = started
+                    started += 1
+            raise last_error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def snapshot(self):
+        """返回各实例的状态，用于 /api/health"""
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                'url': instance.url,
+                'healthy': instance.down_until <= now,
+                'ewma': round(instance.ewma, 3) if instance.ewma is not None else None,
+                'inflight': instance.inflight,
+                'requests': instance.requests,
+                'errors': instance.errors
+            } for instance in self.instances]
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(engine, value):
+    """获取（或创建）搜索引擎的实例池
+
+    Args:
+        engine (str): 搜索引擎
+        value (str): 逗号分隔的实例地址列表，变化时会创建新的实例池
+
+    Returns:
+        InstancePool|None: 实例池，没有有效地址时返回None
+    """
+    key = (engine, value)
+    pool = _pools.get(key)
+    if pool is not None:
+        return pool
+
+    urls = parse_urls(value)
+    if not urls:
+        return None
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = InstancePool(engine, urls)
+            _pools[key] = pool
+    return pool
@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+查询日志实现
+
+/api/search 和 /api/search/stream 的每次成功搜索追加一行到 QUERY_LOG_PATH，所有工作进程写入同一个文件
+（O_APPEND，每行一次写入），供缓存预热统计热门查询（见 warmer 模块）。每行是一个 compact JSON 数组：
+
+    [时间戳, 进程号, "搜索引擎", "规范化的查询", {影响缓存键的参数}, 耗时毫秒]
+
+文件超过 QUERY_LOG_MAX_BYTES 时轮转为 <QUERY_LOG_PATH>.1（只保留一份）。
+Reader 从上次读到的位置继续读取新写入的行，文件轮转后先读完旧文件再从头读取新文件。
+
+配置:
+    QUERY_LOG_PATH       日志文件路径，未设置时不记录
+    QUERY_LOG_MAX_BYTES  文件大小上限（字节），默认16MB
+"""
+
+import os
+import json
+import time
+import threading
+
+from .config import env_int
+from .log import get_logger
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = get_logger(__name__)
+
+# 轮转后的文件名后缀
+ROTATED_SUFFIX = '.1'
+
+# 单次读取的最大字节数
+READ_SIZE = 1024 * 1024
+
+class Entry:
+    """查询日志中的一行
+
+    Attributes:
+        time (float): Unix时间戳
+        pid (int): 记录该行的进程号
+        engine (str): 搜索引擎
+        query (str): 规范化的查询
+        params (dict): 影响缓存键的参数
+        elapsed_ms (float): 请求耗时（毫秒）
+    """
+
+    __slots__ = ('time', 'pid', 'engine', 'query', 'params', 'elapsed_ms')
+
+    def __init__(self, time, pid, engine, query, params, elapsed_ms):
+        self.time = time
+        self.pid = pid
+        self.engine = engine
+        self.query = query
+        self.params = params
+        self.elapsed_ms = elapsed_ms
+
+def parse_line(line):
+    """解析一行日志，格式无效时返回None"""
+    try:
+        fields = json.loads(line)
+        timestamp, pid, engine, query, params, elapsed_ms = fields
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(engine, str) or not isinstance(query, str) or not isinstance(params, dict):
+        return None
+    return Entry(timestamp, pid, engine, query, params, elapsed_ms)
+
+class QueryLog:
+    """追加写入的查询日志，fork 出的子进程会重新打开文件"""
+
+    def __init__(self, path, max_bytes=None):
+        self.path = path
+        self.max_bytes = max_bytes if max_bytes is not None else env_int('QUERY_LOG_MAX_BYTES', 16 * 1024 * 1024)
+        self._fd = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.errors = 0
+
+    def _open(self):
+        """打开日志文件（调用方持有锁）"""
+        if self._fd is not None and self._pid == os.getpid():
+            return self._fd
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._pid = os.getpid()
+        return self._fd
+
+    def _reopen(self):
+        os.close(self._fd)
+        self._fd = None
+        return self._open()
+
+    def _rotate(self, fd):
+        """文件超过大小上限时轮转（调用方持有锁），多个进程中只有一个执行，其他进程重新打开新文件"""
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            try:
+                current = os.stat(self.path)
+            except FileNotFoundError:
+                current = None
+            if current is not None and current.st_ino == os.fstat(fd).st_ino:
+                os.replace(self.path, self.path + ROTATED_SUFFIX)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        return self._reopen()
+
+    def record(self, engine, query, params, elapsed):
+        """追加一次搜索
+
+        Args:
+            engine (str): 搜索引擎
+            query (str): 规范化的查询
+            params (dict): 影响缓存键的参数
+            elapsed (float): 请求耗时（秒）
+        """
+        line = json.dumps(
+            [int(time.time()), os.getpid(), engine, query, params, round(elapsed * 1000, 1)],
+            ensure_ascii=False, separators=(',', ':')
+        ) + '\n'
+        try:
+            with self._lock:
+                fd = self._open()
+                if os.fstat(fd).st_size >= self.max_bytes:
+                    fd = self._rotate(fd)
+                os.write(fd, line.encode('utf-8'))
+                self.written += 1
+        except OSError as e:
+            self.errors += 1
+            logger.warning('写入查询日志失败: %s', e)
+
+    def stats(self):
+        """返回查询日志统计信息"""
+        return {'path': self.path, 'maxBytes': self.max_bytes, 'written': self.written, 'errors': self.errors}
+
+class Reader:
+    """从上次读到的位置继续读取查询日志
+
+    第一次读取时先读轮转后的旧文件，再读当前文件。只返回完整的行，写到一半的行留到下次读取。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._inode = None
+        self._buffer = b''
+        self._started = False
+
+    def _open_current(self):
+        try:
+            self._file = open(self.path, 'rb')
+        except FileNotFoundError:
+            self._file = None
+            self._inode = None
+            return
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        self._buffer = b''
+
+    def _drain(self):
+        """读取当前打开的文件中的新内容，返回完整的行"""
+        lines = []
+        while True:
+            chunk = self._file.read(READ_SIZE)
+            if not chunk:
+                return lines
+            data = self._buffer + chunk
+            end = data.rfind(b'\n') + 1
+            lines.extend(data[:end].splitlines())
+            self._buffer = data[end:]
+
+    def read(self):
+        """读取新写入的行
+
+        Returns:
+            list: Entry 列表，按写入顺序排列
+        """
+        lines = []
+        if not self._started:
+            # 第一次读取：先读轮转后的旧文件
+            self._started = True
+            try:
+                with open(self.path + ROTATED_SUFFIX, 'rb') as rotated:
+                    lines.extend(rotated.read().splitlines())
+            except FileNotFoundError:
+                pass
+        if self._file is None:
+            self._open_current()
+
+        if self._file is not None:
+            lines.extend(self._drain())
+            try:
+                rotated = os.stat(self.path).st_ino != self._inode
+            except FileNotFoundError:
+                rotated = False
+            if rotated:
+                # 轮转前打开了旧文件的其他进程在重新打开前仍可能追加，先读完旧文件中新追加的行，再从头读取新文件
+                lines.extend(self._drain())
+                self._file.close()
+                self._open_current()
+                if self._file is not None:
+                    lines.extend(self._drain())
+
+        entries = []
+        for line in lines:
+            entry = parse_line(line)
+            if entry is not None:
+                entries.append(entry)
+        return entries
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def from_env():
+    """根据 QUERY_LOG_PATH 创建查询日志，未设置时返回None"""
+    path = os.getenv('QUERY_LOG_PATH')
+    return QueryLog(path) if path else None
+
+# 全局查询日志
+query_log = from_env()
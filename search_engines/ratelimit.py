@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+上游限流实现
+
+每个上游服务（同一个API密钥）一个令牌桶，令牌按 RATE_LIMIT_<PROVIDER> 的速率补充。
+没有令牌时请求进入优先级队列等待，而不是直接发出后被上游以 429 等错误拒绝：
+
+- interactive：页面和 /api/search 的搜索请求（默认）
+- batch：批量搜索
+- background：后台刷新过期缓存、缓存预热
+
+有令牌时总是先放行优先级高的请求，同一优先级按到达顺序放行。等待超过 RATE_LIMIT_MAX_WAIT
+或队列已满时抛出 RateLimitError。限流在每个工作进程内分别进行，多进程部署时应按进程数分配速率。
+
+配置（均可用 _<PROVIDER> 后缀单独配置，如 RATE_LIMIT_ZHIPUAI）:
+    RATE_LIMIT            每秒允许的请求数，默认0表示不限流
+    RATE_LIMIT_BURST      令牌桶容量（允许的突发请求数），默认与 RATE_LIMIT 相同（至少为1）
+    RATE_LIMIT_MAX_WAIT   最长排队时间（秒），默认10
+    RATE_LIMIT_MAX_QUEUE  最多排队的请求数，默认100
+"""
+
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from . import metrics
+from .config import env_int, env_float, engine_env
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# 优先级，数值越小越优先
+INTERACTIVE = 0
+BATCH = 1
+BACKGROUND = 2
+PRIORITY_NAMES = ('interactive', 'batch', 'background')
+
+# 搜索引擎使用的上游服务，同一服务的搜索引擎共享API密钥和限流
+PROVIDERS = {
+    'search_std': 'zhipuai',
+    'bochaai': 'bochaai',
+    'searxng': 'searxng'
+}
+
+# 当前请求的优先级，线程池和异步任务中通过复制上下文继承
+priority_var = contextvars.ContextVar('ratelimit_priority', default=INTERACTIVE)
+
+# 排队请求的状态
+_WAITING = 0
+_GRANTED = 1
+_CANCELLED = 2
+
+class RateLimitError(Exception):
+    """排队超时或队列已满时拒绝请求"""
+
+    def __init__(self, provider, retry_after, message):
+        super().__init__(message)
+        self.provider = provider
+        self.retry_after = retry_after
+
+@contextmanager
+def priority(level):
+    """在 with 块内以指定优先级发出上游请求
+
+    Args:
+        level (int): INTERACTIVE、BATCH 或 BACKGROUND
+    """
+    token = priority_var.set(level)
+    try:
+        yield
+    finally:
+        priority_var.reset(token)
+
+def provider_of(engine):
+    """返回搜索引擎对应的上游服务"""
+    return PROVIDERS.get(engine, engine)
+
+class _Waiter:
+    """排队中的请求，同步请求等待 event，异步请求等待 future"""
+
+    __slots__ = ('priority', 'state', 'event', 'future', 'loop')
+
+    def __init__(self, priority, loop=None):
+        self.priority = priority
+        self.state = _WAITING
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def grant(self):
+        self.state = _GRANTED
+        if self.event is not None:
+            self.event.set()
+            return
+        try:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+        except RuntimeError:
+            # 事件循环已关闭，请求方已不再等待
+            pass
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+class TokenBucket:
+    """单个上游服务的令牌桶和优先级等待队列
+
+    排队的请求由一个后台线程在令牌补充后按优先级放行。
+    """
+
+    def __init__(self, provider, rate, burst, max_wait, max_queue):
+        self.provider = provider
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.tokens = float(burst)
+        self.depth = [0] * len(PRIORITY_NAMES)
+        self._updated = time.monotonic()
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+        for level, name in enumerate(PRIORITY_NAMES):
+            metrics.RATE_LIMIT_QUEUE.labels(provider, name).set_function(lambda level=level: self.depth[level])
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _take_or_enqueue(self, waiter):
+        """有令牌且没有排队的请求时直接取得令牌并返回None，否则让 waiter 排队并返回 waiter"""
+        with self._cond:
+            self._refill()
+            if self.tokens >= 1 and not any(self.depth):
+                self.tokens -= 1
+                return None
+
+            if sum(self.depth) >= self.max_queue:
+                self._reject('queue_full')
+                raise RateLimitError(self.provider, self._retry_after(),
+                                     f'请求过于频繁，排队请求已达 {self.max_queue} 个')
+
+            heapq.heappush(self._queue, (waiter.priority, next(self._seq), waiter))
+            self.depth[waiter.priority] += 1
+            if self._thread is None or not self._thread.is_alive():
+                # 按需启动（fork 出的子进程中也会重新启动）
+                self._thread = threading.Thread(target=self._run, name=f'ratelimit-{self.provider}', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+            return waiter
+
+    def _cancel(self, waiter):
+        """取消排队，请求已被放行时返回False"""
+        with self._cond:
+            if waiter.state != _WAITING:
+                return False
+            waiter.state = _CANCELLED
+            self.depth[waiter.priority] -= 1
+            return True
+
+    def _retry_after(self):
+        """排队的请求全部放行大约需要的时间（秒）"""
+        return (sum(self.depth) + 1) / self.rate
+
+    def _reject(self, reason):
+        metrics.RATE_LIMIT_REJECTIONS.labels(self.provider, reason).inc()
+
+    def _timed_out(self):
+        self._reject('timeout')
+        raise RateLimitError(self.provider, self._retry_after(),
+                             f'请求过于频繁，排队超过 {self.max_wait:g} 秒')
+
+    def _observe(self, level, start):
+        wait = time.perf_counter() - start
+        metrics.RATE_LIMIT_WAIT.labels(self.provider, PRIORITY_NAMES[level]).observe(wait)
+        if wait >= 0.1:
+            logger.debug('%s 限流排队 %.3f 秒', self.provider, wait)
+        return wait
+
+    def _run(self):
+        """按优先级放行排队的请求"""
+        with self._cond:
+            while True:
+                self._refill()
+                while self._queue and self.tokens >= 1:
+                    _, _, waiter = heapq.heappop(self._queue)
+                    if waiter.state != _WAITING:
+                        continue
+                    self.tokens -= 1
+                    self.depth[waiter.priority] -= 1
+                    waiter.grant()
+
+                if self._queue:
+                    self._cond.wait((1 - self.tokens) / self.rate)
+                else:
+                    self._cond.wait()
+
+    def acquire(self, level=None):
+        """取得一个令牌，必要时排队等待
+
+        Args:
+            level (int, optional): 优先级，默认使用当前上下文的优先级
+
+        Returns:
+            float: 等待时间（秒）
+
+        Raises:
+            RateLimitError: 队列已满或等待超时
+        """
+        level = priority_var.get() if level is None else level
+        start = time.perf_counter()
+        waiter = self._take_or_enqueue(_Waiter(level))
+        if waiter is not None and not waiter.event.wait(self.max_wait) and self._cancel(waiter):
+            self._timed_out()
+        return self._observe(level, start)
+
+    async def async_acquire(self, level=None):
+        """acquire() 的异步版本"""
+        level = priority_var.get() if level is None else level
+        start = time.perf_counter()
+        waiter = self._take_or_enqueue(_Waiter(level, asyncio.get_running_loop()))
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(waiter.future, self.max_wait)
+            except asyncio.TimeoutError:
+                if self._cancel(waiter):
+                    self._timed_out()
+            except asyncio.CancelledError:
+                self._cancel(waiter)
+                raise
+        return self._observe(level, start)
+
+    def try_acquire(self):
+        """有令牌且没有排队的请求时取得一个令牌，不等待
+
+        Returns:
+            bool: 是否取得令牌
+        """
+        with self._cond:
+            self._refill()
+            if self.tokens >= 1 and not any(self.depth):
+                self.tokens -= 1
+                return True
+            return False
+
+    def snapshot(self):
+        """返回限流状态，用于 /api/health"""
+        with self._cond:
+            self._refill()
+            return {
+                'rate': self.rate,
+                'burst': self.burst,
+                'tokens': round(self.tokens, 2),
+                'queued': dict(zip(PRIORITY_NAMES, self.depth))
+            }
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def get(provider):
+    """获取（或创建）上游服务的令牌桶，未配置限流时返回None"""
+    if provider in _buckets:
+        return _buckets[provider]
+
+    with _buckets_lock:
+        if provider not in _buckets:
+            rate = engine_env('RATE_LIMIT', provider, 0.0, parse=env_float)
+            bucket = None
+            if rate > 0:
+                bucket = TokenBucket(
+                    provider,
+                    rate,
+                    max(1.0, engine_env('RATE_LIMIT_BURST', provider, rate, parse=env_float)),
+                    engine_env('RATE_LIMIT_MAX_WAIT', provider, 10.0, parse=env_float),
+                    max(1, engine_env('RATE_LIMIT_MAX_QUEUE', provider, 100, parse=env_int))
+                )
+            _buckets[provider] = bucket
+    return _buckets[provider]
+
+def acquire(engine):
+    """搜索引擎发出上游请求前取得令牌，未配置限流时立即返回"""
+    bucket = get(provider_of(engine))
+    return bucket.acquire() if bucket is not None else 0.0
+
+async def async_acquire(engine):
+    """acquire() 的异步版本"""
+    bucket = get(provider_of(engine))
+    return await bucket.async_acquire() if bucket is not None else 0.0
+
+def try_acquire(engine):
+    """不等待地取得令牌，用于可以放弃的额外上游请求（如对冲请求），未配置限流时返回True"""
+    bucket = get(provider_of(engine))
+    return bucket.try_acquire() if bucket is not None else True
+
+def snapshot(engine):
+    """返回搜索引擎所用上游服务的限流状态，未配置限流时返回None"""
+    bucket = get(provider_of(engine))
+    return bucket.snapshot() if bucket is not None else None
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+结果重排实现
+
+各搜索引擎按自己的排序返回结果，翻页合并或聚合搜索后的顺序不一定反映与查询的相关性。
+请求带 rerank=bm25 时，按 BM25 计算每条结果的标题和摘要与查询的相关性，按得分从高到低重新排序：
+
+- 分词：英文、数字等以空格分隔的文字按单词切分；中文、日文等按相邻两个字（二元组）切分，
+  只有一个字时按单字切分。中英文混合的查询（如 "python 教程"）同时包含两种词
+- 标题中的词按 TITLE_WEIGHT 倍计入词频
+- 逆文档频率以本次返回的结果为语料计算
+- 安装了 numpy 时以矩阵批量计算所有结果的得分，否则逐条计算
+
+重排只作用于本次响应，缓存中保存的仍是上游的原始顺序。得分相同的结果（如都不包含查询词）保持原有顺序。
+
+配置:
+    RERANK_K1  BM25 的词频饱和参数 k1，默认1.2
+    RERANK_B   BM25 的文档长度归一化参数 b，默认0.75
+"""
+
+import re
+import math
+import unicodedata
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from . import metrics
+from .config import env_float
+
+# 支持的重排方式
+NONE = 'none'
+BM25 = 'bm25'
+METHODS = (NONE, BM25)
+
+# 标题中的词的词频倍数
+TITLE_WEIGHT = 2
+
+# 参与计算的最大摘要长度
+MAX_TEXT = 1000
+
+# 查询词的类型：单词、单字、二元组
+_WORD = 0
+_CHAR = 1
+_BIGRAM = 2
+
+# 按字切分的文字：中日韩统一表意文字（含扩展A和兼容区）、日文假名
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_TOKEN_RE = re.compile(f'([{_CJK}]+)|([^\\W_{_CJK}]+)')
+_CJK_RE = re.compile(f'[{_CJK}]+')
+_WORD_RE = re.compile(f'[^\\W_{_CJK}]+')
+
+def parse_method(value):
+    """解析 rerank 参数，未指定时返回 none，无效时返回None"""
+    if not value:
+        return NONE
+    value = str(value).lower()
+    return value if value in METHODS else None
+
+def _normalize(text):
+    if text.isascii():
+        return text.lower()
+    return unicodedata.normalize('NFKC', text).casefold()
+
+def tokenize(text):
+    """将文本切分为词（忽略大小写和全角半角差异）
+
+    Args:
+        text (str): 查询、标题或摘要
+
+    Returns:
+        list: 词列表，中文等按二元组切分
+    """
+    tokens = []
+    for cjk, word in _TOKEN_RE.findall(_normalize(text)):
+        if word:
+            tokens.append(word)
+        elif len(cjk) == 1:
+            tokens.append(cjk)
+        else:
+            tokens.extend(cjk[start:start + 2] for start in range(len(cjk) - 1))
+    return tokens
+
+def _count_terms(text, terms, row, weight):
+    """统计文本中各查询词的词频（累加到 row），返回文本的词数
+
+    与 tokenize() 的切分结果一致，但不逐个生成二元组：单词和中文片段分别提取后，
+    用字符串和列表的 count 统计查询词出现的次数。
+    """
+    text = _normalize(text)
+    words = _WORD_RE.findall(text)
+    runs = [] if text.isascii() else _CJK_RE.findall(text)
+    joined = ' '.join(runs) if runs else ''
+    for column, (term, kind) in enumerate(terms):
+        if kind == _WORD:
+            n = words.count(term)
+        elif kind == _CHAR:
+            n = runs.count(term)
+        else:
+            # 叠字（如"哈哈"）的二元组可能重叠出现，str.count 只统计不重叠的次数
+            n = joined.count(term) if term[0] != term[1] else len(re.findall(f'(?={re.escape(term)})', joined))
+        if n:
+            row[column] += n * weight
+    # 每个中文片段的二元组数为字数减1，单个字的片段算1个词
+    sizes = list(map(len, runs))
+    return len(words) + len(joined) + 1 - 2 * len(runs) + sizes.count(1) if runs else len(words)
+
+def _term_kind(term):
+    if _CJK_RE.fullmatch(term) is None:
+        return _WORD
+    return _CHAR if len(term) == 1 else _BIGRAM
+
+def _term_frequencies(items, terms):
+    """统计每条结果中各查询词的词频和结果的长度（词数）
+
+    Returns:
+        tuple: (词频矩阵（每条结果一行，按 terms 顺序）, 长度列表)
+    """
+    terms = [(term, _term_kind(term)) for term in terms]
+    rows = []
+    lengths = []
+    for item in items:
+        row = [0] * len(terms)
+        length = _count_terms(item.title or '', terms, row, TITLE_WEIGHT) * TITLE_WEIGHT
+        length += _count_terms((item.content or '')[:MAX_TEXT], terms, row, 1)
+        rows.append(row)
+        lengths.append(length)
+    return rows, lengths
+
+def bm25_scores(query, items, k1=None, b=None):
+    """计算各条结果相对查询的 BM25 得分
+
+    Args:
+        query (str): 搜索查询
+        items (list): SearchItem 列表
+        k1 (float, optional): 词频饱和参数，默认 RERANK_K1
+        b (float, optional): 文档长度归一化参数，默认 RERANK_B
+
+    Returns:
+        list: 与 items 对应的得分
+    """
+    k1 = env_float('RERANK_K1', 1.2) if k1 is None else k1
+    b = env_float('RERANK_B', 0.75) if b is None else b
+    # 查询中重复的词只计一次
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not items or not terms:
+        return [0.0] * len(items)
+
+    rows, lengths = _term_frequencies(items, terms)
+    count = len(items)
+    average = sum(lengths) / count or 1.0
+
+    if np is not None:
+        tf = np.array(rows, dtype=np.float64)
+        df = np.count_nonzero(tf, axis=0)
+        idf = np.log((count - df + 0.5) / (df + 0.5) + 1.0)
+        norm = k1 * (1.0 - b + b * np.array(lengths, dtype=np.float64) / average)
+        return (tf * (k1 + 1.0) / (tf + norm[:, None]) @ idf).tolist()
+
+    df = [sum(1 for row in rows if row[column]) for column in range(len(terms))]
+    idf = [math.log((count - n + 0.5) / (n + 0.5) + 1.0) for n in df]
+    scores = []
+    for row, length in zip(rows, lengths):
+        norm = k1 * (1.0 - b + b * length / average)
+        scores.append(sum(weight * tf * (k1 + 1.0) / (tf + norm) for weight, tf in zip(idf, row) if tf))
+    return scores
+
+def apply(engine, result, query, method):
+    """按重排方式重新排序结果，返回结果副本（缓存中的结果不能被修改）
+
+    Args:
+        engine (str): 搜索引擎
+        result (dict): 搜索结果
+        query (str): 搜索查询
+        method (str): parse_method() 返回的重排方式
+
+    Returns:
+        dict: 重新排序的结果，meta.rerank 为重排方式；不需要重排时返回原结果
+    """
+    items = result.get('search_result')
+    if method != BM25 or not items or len(items) < 2 or 'error' in result:
+        return result
+
+    with metrics.RERANK_LATENCY.labels(engine).time():
+        scores = bm25_scores(query, items)
+        # sorted 是稳定排序，得分相同的结果保持原有顺序
+        order = sorted(range(len(items)), key=lambda index: -scores[index])
+
+    result = dict(result)
+    result['search_result'] = [items[index] for index in order]
+    result['meta'] = {**(result.get('meta') or {}), 'rerank': method}
+    return result
@@ -3,6 +3,8 @@
 
 """
 SearXNG搜索引擎实现
+
+SEARXNG_API_HOST 可以是逗号分隔的多个实例地址，请求会在实例间负载均衡并发送对冲请求（见 pool 模块）。
 """
 
 import os
@@ -11,25 +13,36 @@ import time
 import requests
 from urllib.parse import urlparse
 
-def search(query, engines=None, language='auto', safesearch=1, time_range=None, count=None):
-    """
-    使用SearXNG搜索引擎执行搜索
+from . import metrics, breaker, pool, codec
+from .models import SearchItem
+from .log import get_logger, log_payload
 
-    Args:
-        query (str): 搜索查询
-        engines (str, optional): 要使用的搜索引擎，用逗号分隔。默认为None，使用SearXNG默认引擎。
-        language (str, optional): 搜索结果的语言。默认为'auto'。
-        safesearch (int, optional): 安全搜索级别(0-2)。默认为1。
-        time_range (str, optional): 搜索结果的时间范围。可选值: day, week, month, year。
-        count (int, optional): 返回结果的数量。默认为None，使用SearXNG默认值。
+logger = get_logger(__name__)
+
+def upstream_urls():
+    """返回需要预热的上游地址列表（每个实例一个）"""
+    return [f'{url}/' for url in pool.parse_urls(os.getenv('SEARXNG_API_HOST'))]
+
+def instance_pool():
+    """返回SearXNG实例池，未配置SEARXNG_API_HOST时返回None"""
+    return pool.get_pool('searxng', os.getenv('SEARXNG_API_HOST'))
+
+def pool_snapshot():
+    """返回各SearXNG实例的状态"""
+    instances = instance_pool()
+    return instances.snapshot() if instances is not None else []
+
+def _prepare(query, engines, language, safesearch, time_range, count, page):
+    """准备SearXNG请求
 
     Returns:
-        dict: 搜索结果，格式化为与智谱AI兼容的格式
+        tuple|dict: (实例池, 查询参数, 待填充的转换结果, 最大结果数)；
+                    未配置主机地址时返回错误结果
     """
-    # 获取API主机地址
-    api_host = os.getenv('SEARXNG_API_HOST')
+    # 获取实例池
+    instances = instance_pool()
 
-    if not api_host:
+    if instances is None:
         return {
             'id': f'searxng_error_{int(time.time())}',
             'created': int(time.time()),
@@ -41,14 +54,12 @@ def search(query, engines=None, language='auto', safesearch=1, time_range=None,
                 }
             ],
             'search_result': [
-                {
-                    'title': 'SearXNG API配置错误',
-                    'link': '#',
-                    'content': 'SearXNG API主机地址未配置。请在.env文件中设置SEARXNG_API_HOST环境变量。',
-                    'media': 'SearXNG',
-                    'icon': '',
-                    'refer': '错误'
-                }
+                SearchItem(
+                    title='SearXNG API配置错误',
+                    content='SearXNG API主机地址未配置。请在.env文件中设置SEARXNG_API_HOST环境变量。',
+                    media='SearXNG',
+                    refer='错误'
+                )
             ]
         }
 
@@ -67,14 +78,17 @@ def search(query, engines=None, language='auto', safesearch=1, time_range=None,
     if time_range:
         params['time_range'] = time_range
 
+    if page is not None and page > 1:
+        params['pageno'] = page
+
     # 如果指定了结果数量，添加到参数中
     # 注意：SearXNG API可能不直接支持count参数，我们会在后续处理中限制结果数量
     max_results = 10  # 默认值
     if count is not None:
         max_results = count
 
-    print(f'SearXNG 请求URL: {api_host.rstrip("/")}/search')
-    print(f'SearXNG 请求参数: {json.dumps(params)}')
+    logger.debug('SearXNG 实例: %s', ', '.join(instance.url for instance in instances.instances))
+    log_payload(logger, 'SearXNG 请求参数', params)
 
     # 创建一个与智谱AI响应格式兼容的结果
     converted_result = {
@@ -101,183 +115,200 @@ def search(query, engines=None, language='auto', safesearch=1, time_range=None,
         }
     }
 
-    try:
-        # 执行搜索请求
-        response = requests.get(
-            f"{api_host.rstrip('/')}/search",
-            params=params,
-            timeout=10
-        )
-        response.raise_for_status()
-
-        # 解析结果
-        result = response.json()
-        print(f'SearXNG 响应结构: {json.dumps(result)[:500]}...')
-
-        # 处理搜索结果
-        if 'results' in result and isinstance(result['results'], list):
-            # 限制结果数量
-            results = result['results'][:max_results]
-
-            # 添加元数据
-            converted_result['meta']['totalResults'] = result.get('number_of_results', len(results))
-            converted_result['meta']['time'] = result.get('search_time', 0)
-
-            # 处理建议、纠正和答案
-            if 'suggestions' in result and isinstance(result['suggestions'], list):
-                converted_result['suggestions'] = result['suggestions']
-
-            if 'corrections' in result and isinstance(result['corrections'], list):
-                converted_result['corrections'] = result['corrections']
-
-            if 'answers' in result and isinstance(result['answers'], list):
-                for answer in result['answers']:
-                    answer_item = {
-                        'title': answer.get('title', '答案'),
-                        'content': answer.get('content', ''),
-                        'link': answer.get('url', '#'),
-                        'media': 'SearXNG',
-                        'icon': '',
-                        'refer': '答案'
-                    }
-                    converted_result['answers'].append(answer_item)
-
-            if 'infoboxes' in result and isinstance(result['infoboxes'], list):
-                for infobox in result['infoboxes']:
-                    infobox_item = {
-                        'title': infobox.get('title', '信息框'),
-                        'content': infobox.get('content', ''),
-                        'link': infobox.get('url', '#'),
-                        'media': infobox.get('engine', 'SearXNG'),
-                        'icon': infobox.get('img_src', ''),
-                        'id': infobox.get('id', ''),
-                        'infobox': True
-                    }
-                    converted_result['infoboxes'].append(infobox_item)
-
-            # 转换每个搜索结果
-            for item in results:
-                # 提取必要的字段
-                title = item.get('title', '')
-                url = item.get('url', '#')
-                content = item.get('content', '')
-                engine = item.get('engine', '')
-                template = item.get('template', '')
-
-                # 尝试提取网站名称
-                try:
-                    domain = urlparse(url).netloc
-                    media = domain
-                except:
-                    media = engine or 'SearXNG'
-
-                # 提取更多信息（如果有）
-                img_src = item.get('img_src', '')
-                thumbnail = item.get('thumbnail', '')
-                publishedDate = item.get('publishedDate', '')
-
-                # 确定结果类型
-                refer = ''
-                if template == 'images.html' or 'images' in engine.lower() or img_src or thumbnail:
-                    refer = '图片'
-                elif template == 'videos.html' or 'videos' in engine.lower():
-                    refer = '视频'
-                elif template == 'torrent.html' or 'torrent' in engine.lower():
-                    refer = '种子'
-                elif template == 'map.html' or 'map' in engine.lower():
-                    refer = '地图'
-
-                # 构建内容
-                if img_src:
-                    content += f'<br><img src="{img_src}" alt="{title}" style="max-width:200px;">'
-                elif thumbnail:
-                    content += f'<br><img src="{thumbnail}" alt="{title}" style="max-width:200px;">'
-
-                # 添加元数据到内容
-                if publishedDate:
-                    content += f'<br><small>发布时间: {publishedDate}</small>'
-
-                if engine:
-                    content += f'<br><small>搜索引擎: {engine}</small>'
-
-                # 创建搜索结果项
-                search_item = {
-                    'title': title,
-                    'link': url,
-                    'content': content,
-                    'media': media,
-                    'icon': '',
-                    'refer': refer
-                }
+    return instances, params, converted_result, max_results
+
+def _convert_response(response, converted_result, max_results):
+    """将SearXNG的响应转换后填充到 converted_result 中"""
+    response.raise_for_status()
 
-                # 添加其他可能的字段
-                for key in ['score', 'category', 'pretty_url', 'parsed_url', 'positions']:
-                    if key in item:
-                        search_item[key] = item[key]
+    # 解析结果
+    result = codec.loads(response.content)
+    log_payload(logger, 'SearXNG 响应结构', result)
 
-                converted_result['search_result'].append(search_item)
+    # 处理搜索结果
+    if 'results' in result and isinstance(result['results'], list):
+        # 限制结果数量
+        results = result['results'][:max_results]
 
+        # 添加元数据
+        converted_result['meta']['totalResults'] = result.get('number_of_results', len(results))
+        converted_result['meta']['time'] = result.get('search_time', 0)
+
+        # 处理建议、纠正和答案
+        if 'suggestions' in result and isinstance(result['suggestions'], list):
+            converted_result['suggestions'] = result['suggestions']
+
+        if 'corrections' in result and isinstance(result['corrections'], list):
+            converted_result['corrections'] = result['corrections']
+
+        if 'answers' in result and isinstance(result['answers'], list):
+            for answer in result['answers']:
+                answer_item = {
+                    'title': answer.get('title', '答案'),
+                    'content': answer.get('content', ''),
+                    'link': answer.get('url', '#'),
+                    'media': 'SearXNG',
+                    'icon': '',
+                    'refer': '答案'
+                }
+                converted_result['answers'].append(answer_item)
+
+        if 'infoboxes' in result and isinstance(result['infoboxes'], list):
+            for infobox in result['infoboxes']:
+                infobox_item = {
+                    'title': infobox.get('title', '信息框'),
+                    'content': infobox.get('content', ''),
+                    'link': infobox.get('url', '#'),
+                    'media': infobox.get('engine', 'SearXNG'),
+                    'icon': infobox.get('img_src', ''),
+                    'id': infobox.get('id', ''),
+                    'infobox': True
+                }
+                converted_result['infoboxes'].append(infobox_item)
+
+        # 转换每个搜索结果
+        for item in results:
+            # 提取必要的字段
+            title = item.get('title', '')
+            url = item.get('url', '#')
+            content = item.get('content', '')
+            engine = item.get('engine', '')
+            template = item.get('template', '')
+
+            # 尝试提取网站名称
+            try:
+                domain = urlparse(url).netloc
+                media = domain
+            except:
+                media = engine or 'SearXNG'
+
+            # 提取更多信息（如果有）
+            img_src = item.get('img_src', '')
+            thumbnail = item.get('thumbnail', '')
+
+            # 确定结果类型
+            refer = ''
+            if template == 'images.html' or 'images' in engine.lower() or img_src or thumbnail:
+                refer = '图片'
+            elif template == 'videos.html' or 'videos' in engine.lower():
+                refer = '视频'
+            elif template == 'torrent.html' or 'torrent' in engine.lower():
+                refer = '种子'
+            elif template == 'map.html' or 'map' in engine.lower():
+                refer = '地图'
+
+            # 创建搜索结果项，附加信息作为单独的字段（不复制 parsed_url、positions 等较大的字段）
+            converted_result['search_result'].append(SearchItem(
+                title=title,
+                link=url,
+                content=content,
+                media=media,
+                refer=refer,
+                published=item.get('publishedDate') or '',
+                thumbnail=img_src or thumbnail,
+                upstream=engine,
+                category=item.get('category') or ''
+            ))
+
+    else:
+        # 如果没有找到结果
+        if 'error' in result:
+            error_message = result.get('error', 'SearXNG未返回搜索结果')
         else:
-            # 如果没有找到结果
-            if 'error' in result:
-                error_message = result.get('error', 'SearXNG未返回搜索结果')
-            else:
-                error_message = '未找到搜索结果'
-
-            # 处理其他可能的字段
-            if 'suggestions' in result and isinstance(result['suggestions'], list):
-                converted_result['suggestions'] = result['suggestions']
-
-            if 'corrections' in result and isinstance(result['corrections'], list):
-                converted_result['corrections'] = result['corrections']
-
-            if 'answers' in result and isinstance(result['answers'], list):
-                for answer in result['answers']:
-                    answer_item = {
-                        'title': answer.get('title', '答案'),
-                        'content': answer.get('content', ''),
-                        'link': answer.get('url', '#'),
-                        'media': 'SearXNG',
-                        'icon': '',
-                        'refer': '答案'
-                    }
-                    converted_result['answers'].append(answer_item)
-
-            # 添加错误信息到搜索结果
-            search_item = {
-                'title': 'SearXNG 搜索结果',
-                'link': '#',
-                'content': error_message,
-                'media': 'SearXNG',
-                'icon': '',
-                'refer': ''
-            }
-            converted_result['search_result'].append(search_item)
+            error_message = '未找到搜索结果'
 
-    except requests.exceptions.RequestException as e:
-        print(f'SearXNG API请求错误: {str(e)}')
-        # 创建一个错误响应
-        search_item = {
-            'title': 'SearXNG 搜索错误',
-            'link': '#',
-            'content': f'请求SearXNG搜索引擎时发生错误: {str(e)}',
-            'media': 'SearXNG',
-            'icon': '',
-            'refer': '错误'
-        }
-        converted_result['search_result'].append(search_item)
+        # 处理其他可能的字段
+        if 'suggestions' in result and isinstance(result['suggestions'], list):
+            converted_result['suggestions'] = result['suggestions']
+
+        if 'corrections' in result and isinstance(result['corrections'], list):
+            converted_result['corrections'] = result['corrections']
 
-    except json.JSONDecodeError as e:
-        print(f'SearXNG 响应JSON解析错误: {str(e)}')
+        if 'answers' in result and isinstance(result['answers'], list):
+            for answer in result['answers']:
+                answer_item = {
+                    'title': answer.get('title', '答案'),
+                    'content': answer.get('content', ''),
+                    'link': answer.get('url', '#'),
+                    'media': 'SearXNG',
+                    'icon': '',
+                    'refer': '答案'
+                }
+                converted_result['answers'].append(answer_item)
+
+        # 添加错误信息到搜索结果
+        converted_result['search_result'].append(SearchItem(
+            title='SearXNG 搜索结果',
+            content=error_message,
+            media='SearXNG'
+        ))
+
+def _error_item(e):
+    """请求或解析SearXNG响应失败时的搜索结果项"""
+    if isinstance(e, requests.exceptions.RequestException):
+        logger.warning('SearXNG API请求错误: %s', e)
         # 创建一个错误响应
-        search_item = {
-            'title': 'SearXNG 响应格式错误',
-            'link': '#',
-            'content': f'无法解析SearXNG的响应: {str(e)}',
-            'media': 'SearXNG',
-            'icon': '',
-            'refer': '错误'
-        }
-        converted_result['search_result'].append(search_item)
+        return SearchItem(
+            title='SearXNG 搜索错误',
+            content=f'请求SearXNG搜索引擎时发生错误: {str(e)}',
+            media='SearXNG',
+            refer='错误'
+        )
+
+    logger.warning('SearXNG 响应JSON解析错误: %s', e)
+    # 创建一个错误响应
+    return SearchItem(
+        title='SearXNG 响应格式错误',
+        content=f'无法解析SearXNG的响应: {str(e)}',
+        media='SearXNG',
+        refer='错误'
+    )
+
+def search(query, engines=None, language='auto', safesearch=1, time_range=None, count=None, page=None):
+    """
+    使用SearXNG搜索引擎执行搜索
+
+    Args:
+        query (str): 搜索查询
+        engines (str, optional): 要使用的搜索引擎，用逗号分隔。默认为None，使用SearXNG默认引擎。
+        language (str, optional): 搜索结果的语言。默认为'auto'。
+        safesearch (int, optional): 安全搜索级别(0-2)。默认为1。
+        time_range (str, optional): 搜索结果的时间范围。可选值: day, week, month, year。
+        count (int, optional): 返回结果的数量。默认为None，使用SearXNG默认值。
+        page (int, optional): SearXNG的页码，默认为1。
+
+    Returns:
+        dict: 搜索结果，格式化为与智谱AI兼容的格式
+    """
+    prepared = _prepare(query, engines, language, safesearch, time_range, count, page)
+    if isinstance(prepared, dict):
+        return prepared
+    instances, params, converted_result, max_results = prepared
+
+    try:
+        # 执行搜索请求
+        response = instances.get('/search', params=params, timeout=breaker.timeout('searxng'))
+        with metrics.CONVERSION_LATENCY.labels('searxng').time():
+            _convert_response(response, converted_result, max_results)
+    except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+        converted_result['search_result'].append(_error_item(e))
+
+    return converted_result
+
+async def async_search(query, engines=None, language='auto', safesearch=1, time_range=None, count=None, page=None):
+    """
+    使用SearXNG搜索引擎异步执行搜索，参数和返回值与 search() 相同
+    """
+    prepared = _prepare(query, engines, language, safesearch, time_range, count, page)
+    if isinstance(prepared, dict):
+        return prepared
+    instances, params, converted_result, max_results = prepared
+
+    try:
+        response = await instances.async_get('/search', params=params, timeout=breaker.timeout('searxng'))
+        with metrics.CONVERSION_LATENCY.labels('searxng').time():
+            _convert_response(response, converted_result, max_results)
+    except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+        converted_result['search_result'].append(_error_item(e))
 
     return converted_result
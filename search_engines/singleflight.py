@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+请求合并（single-flight）实现
+
+同一时刻对同一缓存键只发出一次上游请求，其他并发调用等待并共享该请求的结果。
+
+- 进程内：线程之间通过 threading.Event 共享结果，协程之间通过 asyncio.Future 共享结果
+- 进程间：设置 SINGLEFLIGHT_DIR 后，同步调用额外使用文件锁（fcntl.flock）在工作进程之间合并请求，
+  先拿到锁的进程执行请求并把结果写入共享文件，等待锁的进程读取该结果。
+  不支持 fcntl 的平台以及异步调用只在进程内合并。
+
+配置:
+    SINGLEFLIGHT_DIR        进程间共享锁文件和结果的目录，未设置时只在进程内合并
+    SINGLEFLIGHT_FILE_TTL   共享目录中文件的保留时间（秒），默认600
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+import tempfile
+import threading
+
+from . import models, codec
+from .config import env_float, env_int
+from .log import get_logger
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = get_logger(__name__)
+
+# do() 返回的结果来源
+LEADER = 'leader'    # 由本次调用执行
+THREAD = 'thread'    # 共享了本进程内其他调用的结果
+PROCESS = 'process'  # 共享了其他工作进程的结果
+
+class _Call:
+    """进行中的调用"""
+
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class Group:
+    """按键合并并发调用"""
+
+    def __init__(self, shared_dir=None):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._async_calls = {}
+        self.shared_dir = shared_dir
+        self._writes = 0
+
+    def do(self, key, fn):
+        """执行 fn()，同一键同时只执行一次
+
+        Args:
+            key (str): 合并键
+            fn (callable): 无参数函数
+
+        Returns:
+            tuple: (fn 的返回值, 结果来源 LEADER/THREAD/PROCESS)
+
+        Raises:
+            Exception: fn 抛出的异常会传递给所有等待者
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, THREAD
+
+        try:
+            call.value, source = self._do_across_processes(key, fn)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.value, source
+
+    async def do_async(self, key, coro_fn):
+        """do() 的异步版本，coro_fn 为返回协程的无参数函数，只在进程内合并"""
+        loop = asyncio.get_running_loop()
+        calls = self._async_calls.setdefault(loop, {})
+        future = calls.get(key)
+        if future is not None:
+            # shield 避免等待者被取消时取消共享的请求
+            return await asyncio.shield(future), THREAD
+
+        future = loop.create_future()
+        calls[key] = future
+        try:
+            value = await coro_fn()
+        except BaseException as e:
+            if not future.cancelled():
+                future.set_exception(e)
+                # 没有等待者时避免出现 "exception was never retrieved" 警告
+                future.exception()
+            raise
+        else:
+            future.set_result(value)
+            return value, LEADER
+        finally:
+            calls.pop(key, None)
+            if not calls:
+                self._async_calls.pop(loop, None)
+
+    def _do_across_processes(self, key, fn):
+        """通过文件锁在工作进程之间合并调用"""
+        if not self.shared_dir or fcntl is None:
+            return fn(), LEADER
+
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        lock_path = os.path.join(self.shared_dir, f'{digest}.lock')
+        result_path = os.path.join(self.shared_dir, f'{digest}.json')
+        started = time.time()
+
+        with open(lock_path, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # 其他进程正在执行同一请求，等待其完成后读取结果
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                value = _read_shared(result_path, started)
+                if value is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                    return value, PROCESS
+
+            try:
+                value = fn()
+                _write_shared(result_path, value)
+                self._writes += 1
+                if self._writes % 256 == 0:
+                    _prune(self.shared_dir)
+                return value, LEADER
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def _read_shared(path, since):
+    """读取其他进程写入的结果，只接受在 since 之后写入的结果"""
+    try:
+        if os.path.getmtime(path) < since - env_float('SINGLEFLIGHT_CLOCK_SKEW', 0.05):
+            return None
+        with open(path, 'rb') as f:
+            return models.load(codec.loads(f.read()))
+    except (OSError, ValueError):
+        return None
+
+def _write_shared(path, value):
+    """原子地写入共享结果"""
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(codec.dumps(value, default=models.json_default))
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning('写入共享结果失败: %s', e)
+
+def _prune(shared_dir):
+    """删除共享目录中过期的锁文件和结果文件
+
+    删除仍被持有的锁文件只会让该键暂时失去进程间合并，不影响结果正确性。
+    """
+    expires = time.time() - env_int('SINGLEFLIGHT_FILE_TTL', 600)
+    try:
+        with os.scandir(shared_dir) as entries:
+            for entry in entries:
+                try:
+                    if entry.stat().st_mtime < expires:
+                        os.unlink(entry.path)
+                except OSError:
+                    pass
+    except OSError as e:
+        logger.warning('清理 SINGLEFLIGHT_DIR 失败: %s', e)
+
+def _default_shared_dir():
+    """SINGLEFLIGHT_DIR 指定的共享目录，未设置时返回None（只在进程内合并）"""
+    shared_dir = os.getenv('SINGLEFLIGHT_DIR')
+    if not shared_dir:
+        return None
+    try:
+        os.makedirs(shared_dir, exist_ok=True)
+    except OSError as e:
+        logger.warning('无法创建 SINGLEFLIGHT_DIR: %s', e)
+        return None
+    return shared_dir
+
+# 搜索请求共享的合并组
+group = Group(_default_shared_dir())
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+流式搜索实现
+
+/api/search/stream 以 NDJSON（每行一个JSON对象）逐步输出搜索结果，前端收到一部分即可渲染：
+
+    {"type": "start", "engine": "all", "engines": ["bochaai", "searxng"], "query": "..."}
+    {"type": "engine", "engine": "searxng", "name": "SearXNG", "status": "ok", "cache": "MISS", "time": 0.52, "count": 10}
+    {"type": "results", "engine": "searxng", "offset": 0, "items": [...]}
+    {"type": "extras", "engine": "searxng", "suggestions": [...]}
+    {"type": "done", "cache": "MISS", "meta": {...}, "search_intent": [...], "search_result": [...]}
+
+engine=all 时每个搜索引擎完成后立即输出其结果，首批结果的等待时间取决于最快的搜索引擎；
+最后的 done 事件带有合并排序后的完整结果列表。单个搜索引擎时结果按 STREAM_CHUNK_SIZE 分块输出，
+done 事件不再重复结果列表。结果项的格式由 format 参数决定（见 models 模块）。
+rerank=bm25 时 engine=all 只重排 done 事件中合并后的结果，各搜索引擎的 results 事件保持原有顺序。
+"""
+
+import time
+
+from . import dispatcher, federated, models, rerank, codec
+from .config import env_int
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# SearXNG 特有的附加字段
+EXTRA_FIELDS = ('suggestions', 'corrections', 'answers', 'infoboxes')
+
+def encode(event):
+    """将事件编码为一行NDJSON"""
+    return codec.dumps(event) + b'\n'
+
+def _result_events(engine, result, fmt):
+    """单个搜索引擎结果的 results 和 extras 事件"""
+    chunk_size = max(1, env_int('STREAM_CHUNK_SIZE', 5))
+    items = result.get('search_result', [])
+    for offset in range(0, len(items), chunk_size):
+        yield {
+            'type': 'results',
+            'engine': engine,
+            'offset': offset,
+            'items': models.serialize_items(items[offset:offset + chunk_size], fmt)
+        }
+
+    extras = {field: result[field] for field in EXTRA_FIELDS if result.get(field)}
+    if extras:
+        yield {'type': 'extras', 'engine': engine, **extras}
+
+def _done_event(result, cache_status, include_results, fmt):
+    event = {
+        'type': 'done',
+        'cache': cache_status,
+        'meta': result.get('meta') or {},
+        'search_intent': result.get('search_intent', [])
+    }
+    if include_results:
+        event['search_result'] = models.serialize_items(result.get('search_result', []), fmt)
+    if 'error' in result:
+        event['error'] = result['error']
+    return event
+
+def single_events(engine, query, result, cache_status, fmt=models.ZHIPU):
+    """单个搜索引擎已完成的结果（经过 dispatcher.finish_request() 处理）对应的事件"""
+    yield {'type': 'start', 'engine': engine, 'engines': [engine], 'query': query}
+    yield {
+        'type': 'engine',
+        'engine': engine,
+        'name': dispatcher.ENGINE_NAMES[engine],
+        'status': 'ok',
+        'cache': cache_status,
+        'time': (result.get('meta') or {}).get('elapsed'),
+        'count': len(result.get('search_result', []))
+    }
+    yield from _result_events(engine, result, fmt)
+    yield _done_event(result, cache_status, False, fmt)
+
+def federated_events(query, params, bypass_cache=False, fmt=models.ZHIPU):
+    """聚合搜索的事件，每个搜索引擎完成后立即输出"""
+    start = time.perf_counter()
+    futures = federated.submit(query, params, bypass_cache)
+    if futures is None:
+        yield {'type': 'error', 'error': '没有已配置的搜索引擎'}
+        return
+
+    yield {'type': 'start', 'engine': 'all', 'engines': list(futures), 'query': query}
+    outcomes = {}
+    for engine in federated.iter_completed(futures):
+        outcomes[engine] = federated.engine_outcome(engine, futures[engine])
+        yield from _engine_events(engine, outcomes[engine], fmt)
+
+    result, cache_status = federated.combine(query, futures, bypass_cache, outcomes)
+    elapsed = time.perf_counter() - start
+    logger.info('搜索请求: %s', query, extra={'engine': 'all', 'cache': cache_status, 'elapsed_ms': round(elapsed * 1000, 2)})
+    result = dispatcher.finish_request('all', result, cache_status, elapsed)
+    result = rerank.apply('all', result, query, params.get('rerank'))
+    dispatcher.record_search('all', query, params, result, elapsed)
+    yield _done_event(result, cache_status, True, fmt)
+
+async def async_federated_events(query, params, bypass_cache=False, fmt=models.ZHIPU):
+    """federated_events() 的异步版本"""
+    start = time.perf_counter()
+    tasks = federated.async_submit(query, params, bypass_cache)
+    if tasks is None:
+        yield {'type': 'error', 'error': '没有已配置的搜索引擎'}
+        return
+
+    yield {'type': 'start', 'engine': 'all', 'engines': list(tasks), 'query': query}
+    outcomes = {}
+    async for engine in federated.async_iter_completed(tasks):
+        outcomes[engine] = federated.engine_outcome(engine, tasks[engine])
+        for event in _engine_events(engine, outcomes[engine], fmt):
+            yield event
+
+    result, cache_status = federated.combine(query, tasks, bypass_cache, outcomes)
+    elapsed = time.perf_counter() - start
+    logger.info('搜索请求: %s', query, extra={'engine': 'all', 'cache': cache_status, 'elapsed_ms': round(elapsed * 1000, 2)})
+    result = dispatcher.finish_request('all', result, cache_status, elapsed)
+    result = rerank.apply('all', result, query, params.get('rerank'))
+    dispatcher.record_search('all', query, params, result, elapsed)
+    yield _done_event(result, cache_status, True, fmt)
+
+def _engine_events(engine, outcome, fmt):
+    """聚合搜索中单个搜索引擎完成时的事件"""
+    engine_meta, result, _ = outcome
+    yield {'type': 'engine', 'engine': engine, **engine_meta}
+    if result is not None:
+        yield from _result_events(engine, result, fmt)
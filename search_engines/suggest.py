@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+搜索建议实现
+
+/api/suggest 根据输入的前缀返回补全建议，数据来自：
+
+- 用户的搜索：每次有结果的搜索（/api/search 和 /api/search/stream）使该查询的权重加1
+- SearXNG 返回的 suggestions 和 corrections：权重按 SUGGEST_EXTERNAL_WEIGHT 累加
+
+建议保存在进程内的前缀索引中：规范化（NFKC、忽略大小写、合并空白）后的查询按字典序排列，
+以二分查找定位前缀对应的区间，取区间内权重最高的若干条。新查询以二分插入加入索引，无需重建。
+前缀很短时区间可能很大，区间超过 SUGGEST_MAX_SCAN 条时该前缀的结果缓存 WIDE_PREFIX_TTL 秒。
+条目数超过 SUGGEST_MAX_ENTRIES 时淘汰权重最低的 EVICT_RATIO 比例的条目。
+
+每个工作进程有自己的索引；设置了查询日志时，其他进程的搜索由缓存预热线程定期读入（见 warmer 模块）。
+
+配置:
+    SUGGEST_MAX_ENTRIES      索引最多保存的查询数，默认50000
+    SUGGEST_MAX_SCAN         直接扫描的最大区间，超过时缓存该前缀的结果，默认2000
+    SUGGEST_EXTERNAL_WEIGHT  SearXNG 每条建议累加的权重，默认0.5
+    SUGGEST_LIMIT            默认返回的建议数，默认8
+"""
+
+import re
+import time
+import heapq
+import bisect
+import threading
+import unicodedata
+
+from .config import env_int, env_float
+
+# 单次请求最多返回的建议数
+MAX_LIMIT = 20
+
+# 加入索引的查询的最大长度（字符数）
+MAX_LENGTH = 100
+
+# 区间较大的前缀的结果缓存时间（秒）
+WIDE_PREFIX_TTL = 30
+
+# 超过条目数上限时一次淘汰的比例
+EVICT_RATIO = 0.1
+
+# 所有以前缀开头的键都小于 前缀 + _MAX_CHAR
+_MAX_CHAR = '\U0010ffff'
+
+_SPACE_RE = re.compile(r'\s+')
+
+def normalize(text):
+    """返回用于索引和匹配的规范化文本（NFKC、忽略大小写、合并空白）"""
+    return _SPACE_RE.sub(' ', unicodedata.normalize('NFKC', text).casefold()).strip()
+
+class SuggestIndex:
+    """带权重的前缀索引
+
+    Args:
+        max_entries (int, optional): 最多保存的查询数，默认 SUGGEST_MAX_ENTRIES
+        max_scan (int, optional): 直接扫描的最大区间，默认 SUGGEST_MAX_SCAN
+    """
+
+    def __init__(self, max_entries=None, max_scan=None):
+        self.max_entries = max_entries if max_entries is not None else env_int('SUGGEST_MAX_ENTRIES', 50000)
+        self.max_scan = max_scan if max_scan is not None else env_int('SUGGEST_MAX_SCAN', 2000)
+        # 规范化的查询，按字典序排列
+        self._keys = []
+        # 规范化的查询 -> [显示的文本（第一次出现时的写法）, 权重]
+        self._entries = {}
+        # 区间较大的前缀 -> (过期时间, 按权重排序的键)
+        self._wide = {}
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, text, weight=1.0):
+        """加入查询或累加其权重
+
+        Args:
+            text (str): 查询
+            weight (float, optional): 累加的权重
+        """
+        if not isinstance(text, str):
+            return
+        text = text.strip()
+        key = normalize(text)
+        if not key or len(key) > MAX_LENGTH:
+            return
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[1] += weight
+                return
+            self._entries[key] = [_SPACE_RE.sub(' ', text), weight]
+            bisect.insort(self._keys, key)
+            if len(self._keys) > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        """淘汰权重最低的条目（调用方持有锁）"""
+        count = max(1, int(len(self._keys) * EVICT_RATIO))
+        for key in heapq.nsmallest(count, self._keys, key=lambda key: self._entries[key][1]):
+            del self._entries[key]
+        self._keys = sorted(self._entries)
+        self._wide.clear()
+        self.evicted += count
+
+    def complete(self, prefix, limit=None):
+        """返回以 prefix 开头、权重最高的查询（不包括与前缀完全相同的查询）
+
+        Args:
+            prefix (str): 输入的前缀
+            limit (int, optional): 返回的条数，默认 SUGGEST_LIMIT
+
+        Returns:
+            list: 查询列表，按权重从高到低排列（权重相同时按字典序）
+        """
+        limit = min(MAX_LIMIT, max(1, limit or env_int('SUGGEST_LIMIT', 8)))
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        with self._lock:
+            start = bisect.bisect_left(self._keys, prefix)
+            end = bisect.bisect_left(self._keys, prefix + _MAX_CHAR, start)
+            if end - start > self.max_scan:
+                keys = self._wide_prefix(prefix, start, end)
+            else:
+                keys = heapq.nlargest(MAX_LIMIT + 1, self._keys[start:end], key=lambda key: self._entries[key][1])
+            return [self._entries[key][0] for key in keys if key != prefix][:limit]
+
+    def _wide_prefix(self, prefix, start, end):
+        """区间较大的前缀：在缓存时间内复用上次的结果（调用方持有锁）"""
+        now = time.monotonic()
+        cached = self._wide.get(prefix)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        keys = heapq.nlargest(MAX_LIMIT + 1, self._keys[start:end], key=lambda key: self._entries[key][1])
+        self._wide[prefix] = (now + WIDE_PREFIX_TTL, keys)
+        return keys
+
+    def stats(self):
+        """返回索引统计信息"""
+        with self._lock:
+            return {
+                'entries': len(self._keys),
+                'maxEntries': self.max_entries,
+                'evicted': self.evicted,
+                'widePrefixes': len(self._wide)
+            }
+
+# 进程内共享的搜索建议索引
+index = SuggestIndex()
+
+def observe(query, result):
+    """根据一次搜索更新索引：有结果时累加查询的权重，并加入 SearXNG 的建议和纠正
+
+    Args:
+        query (str): 搜索查询
+        result (dict): 搜索结果（错误结果被忽略）
+    """
+    if 'error' in result or not result.get('search_result'):
+        return
+    if any(item.refer == '错误' for item in result['search_result']):
+        return
+
+    index.add(query)
+    weight = env_float('SUGGEST_EXTERNAL_WEIGHT', 0.5)
+    if weight > 0:
+        for field in ('suggestions', 'corrections'):
+            for text in result.get(field) or ():
+                index.add(text, weight)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+缓存预热实现
+
+部署或重启后缓存为空，所有查询都要请求上游。设置 QUERY_LOG_PATH 后，每个工作进程的后台线程每隔
+WARM_INTERVAL 秒从查询日志（见 querylog 模块）读取新记录，统计最近 WARM_WINDOW 秒内的热门查询：
+
+1. 每个搜索引擎取请求次数最多的 WARM_TOP_N 个查询（聚合搜索的查询计入每个已配置的搜索引擎）
+2. 按热度依次检查缓存，没有结果或结果将在下一轮之前过期的查询重新请求上游并写入缓存
+3. 每个搜索引擎每轮最多请求上游 WARM_BUDGET 次；请求依次发出（不并发），以 background 优先级
+   排在页面搜索和批量搜索之后（见 ratelimit 模块），熔断或限流排队失败时本轮不再预热该搜索引擎
+
+设置 DISK_CACHE_PATH 时预热的结果通过磁盘缓存共享给所有工作进程，每轮只有一个进程执行预热（文件锁）；
+否则每个工作进程分别预热自己的缓存。其他进程记录的查询同时加入本进程的搜索建议（见 suggest 模块）。
+
+配置:
+    WARM_INTERVAL  预热周期（秒），默认300，0表示不启动后台线程
+    WARM_TOP_N     每个搜索引擎预热的热门查询数，默认50，0表示只读取查询日志（用于搜索建议）
+    WARM_WINDOW    统计热门查询的时间范围（秒），默认86400
+    WARM_BUDGET    每个搜索引擎每轮最多请求上游的次数，默认20；可用 WARM_BUDGET_<ENGINE> 单独配置
+"""
+
+import os
+import json
+import time
+import threading
+from collections import Counter
+
+from . import dispatcher, cache, querylog, suggest, breaker, ratelimit, metrics
+from .config import env_int, engine_env
+from .log import get_logger
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = get_logger(__name__)
+
+# 热门查询按时间分桶计数，超出统计时间范围的桶整体丢弃
+BUCKETS = 24
+
+# 已结束的时间桶最多保留的查询数（只保留次数最多的）
+BUCKET_MAX_KEYS = 10000
+
+# 进程启动后第一轮预热前的等待时间（秒）
+INITIAL_DELAY = 10
+
+class Warmer:
+    """读取查询日志并定期预热热门查询的缓存
+
+    Args:
+        log_path (str): 查询日志路径
+        interval (float, optional): 预热周期（秒），默认 WARM_INTERVAL
+    """
+
+    def __init__(self, log_path, interval=None):
+        self.interval = interval if interval is not None else env_int('WARM_INTERVAL', 300)
+        self.top_n = env_int('WARM_TOP_N', 50)
+        self.window = max(BUCKETS, env_int('WARM_WINDOW', 86400))
+        self.reader = querylog.Reader(log_path)
+        self.lock_path = log_path + '.warm'
+        # 时间桶 -> Counter((搜索引擎, 查询, 参数JSON))
+        self._buckets = {}
+        self._pid = None
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.refreshed = 0
+        self.failed = 0
+        self.last_run = None
+
+    def start(self):
+        """在当前进程中启动后台线程（每个进程一个）"""
+        with self._lock:
+            if self._pid == os.getpid() or self.interval <= 0:
+                return
+            self._pid = os.getpid()
+            # fork 前打开的文件和计数不属于本进程
+            self.reader = querylog.Reader(self.reader.path)
+            self._buckets = {}
+        threading.Thread(target=self._loop, name='cache-warmer', daemon=True).start()
+
+    def _loop(self):
+        ratelimit.priority_var.set(ratelimit.BACKGROUND)
+        time.sleep(INITIAL_DELAY)
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.warning('缓存预热失败: %s', e)
+            time.sleep(self.interval)
+
+    def ingest(self):
+        """读取查询日志的新记录，返回读取的条数"""
+        entries = self.reader.read()
+        bucket_size = self.window / BUCKETS
+        own_pid = os.getpid()
+        for entry in entries:
+            params = json.dumps(entry.params, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+            bucket = self._buckets.setdefault(int(entry.time // bucket_size), Counter())
+            bucket[(entry.engine, entry.query, params)] += 1
+            if entry.pid != own_pid:
+                suggest.index.add(entry.query)
+
+        current = int(time.time() // bucket_size)
+        for bucket in list(self._buckets):
+            if bucket <= current - BUCKETS:
+                del self._buckets[bucket]
+            elif bucket < current and len(self._buckets[bucket]) > BUCKET_MAX_KEYS:
+                self._buckets[bucket] = Counter(dict(self._buckets[bucket].most_common(BUCKET_MAX_KEYS)))
+        return len(entries)
+
+    def hot_queries(self):
+        """返回每个已配置的搜索引擎的热门查询
+
+        Returns:
+            dict: 搜索引擎 -> [(查询, 参数), ...]，按请求次数从多到少排列
+        """
+        configured = dispatcher.configured_engines()
+        counts = {engine: Counter() for engine in configured}
+        for bucket in self._buckets.values():
+            for (engine, query, params), count in bucket.items():
+                for target in (configured if engine == 'all' else (engine,)):
+                    if target in counts:
+                        counts[target][(query, params)] += count
+
+        hot = {}
+        for engine, counter in counts.items():
+            queries = []
+            for (query, params), _ in counter.most_common(self.top_n):
+                queries.append((query, dispatcher.engine_params(engine, json.loads(params))))
+            hot[engine] = queries
+        return hot
+
+    def _claim(self):
+        """在所有工作进程中认领本轮预热
+
+        只有设置了磁盘缓存时才需要认领（否则每个进程预热自己的缓存）。
+
+        Returns:
+            file|None|bool: 持有锁的文件（预热完成后关闭）；不需要认领时为None；本轮已由其他进程执行时为False
+        """
+        if cache.result_cache.backing is None or fcntl is None:
+            return None
+        lock_file = open(self.lock_path, 'a+')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        try:
+            last_run = float(lock_file.read() or 0)
+        except ValueError:
+            last_run = 0
+        now = time.time()
+        if now - last_run < self.interval * 0.9:
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(now))
+        lock_file.flush()
+        return lock_file
+
+    def run_once(self):
+        """执行一轮：读取查询日志，并预热热门查询
+
+        Returns:
+            dict|None: 各搜索引擎刷新的查询数，本轮不需要预热或已由其他进程执行时返回None
+        """
+        self.ingest()
+        if self.top_n <= 0:
+            return None
+        claim = self._claim()
+        if claim is False:
+            return None
+        try:
+            refreshed = {engine: self._warm_engine(engine, queries) for engine, queries in self.hot_queries().items()}
+        finally:
+            if claim is not None:
+                claim.close()
+        self.runs += 1
+        self.last_run = time.time()
+        if any(refreshed.values()):
+            logger.info('缓存预热完成', extra={'refreshed': refreshed})
+        return refreshed
+
+    def _warm_engine(self, engine, queries):
+        """按热度预热一个搜索引擎的查询，返回请求上游的次数"""
+        budget = engine_env('WARM_BUDGET', engine, 20)
+        used = 0
+        for query, params in queries:
+            if used >= budget:
+                break
+            # 在下一轮之前仍然有效的结果不需要刷新
+            remaining = cache.result_cache.expires_in(cache.make_key(engine, query, params))
+            if remaining is not None and remaining > self.interval:
+                continue
+
+            used += 1
+            try:
+                result = dispatcher.refresh(engine, query, params)
+            except (breaker.CircuitOpenError, ratelimit.RateLimitError) as e:
+                # 上游不可用或繁忙时不再占用其配额
+                self._count(engine, 'failed')
+                logger.info('停止预热: %s', e, extra={'engine': engine})
+                break
+            except Exception as e:
+                self._count(engine, 'failed')
+                logger.warning('预热失败: %s', e, extra={'engine': engine})
+                continue
+            self._count(engine, 'failed' if dispatcher.is_error_result(result) else 'refreshed')
+        return used
+
+    def _count(self, engine, outcome):
+        if outcome == 'refreshed':
+            self.refreshed += 1
+        else:
+            self.failed += 1
+        metrics.CACHE_WARM_REQUESTS.labels(engine, outcome).inc()
+
+    def stats(self):
+        """返回预热统计信息"""
+        return {
+            'interval': self.interval,
+            'topN': self.top_n,
+            'runs': self.runs,
+            'lastRun': self.last_run,
+            'refreshed': self.refreshed,
+            'failed': self.failed,
+            'queries': sum(len(bucket) for bucket in list(self._buckets.values()))
+        }
+
+# 设置了查询日志时的全局预热器
+warmer = Warmer(querylog.query_log.path) if querylog.query_log is not None else None
+
+def start():
+    """启动当前进程的缓存预热线程（未设置查询日志时不启动）"""
+    if warmer is not None:
+        warmer.start()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+静态资源和响应压缩实现
+
+启动时读取前端资源（index.html、script.js、styles.css），为每个资源计算内容哈希，
+并预先生成 gzip 和 brotli（安装了 brotli 包时）压缩版本：
+
+- 资源以带哈希的文件名提供（如 script.3f2a9c1b7d4e.js），index.html 中的引用会被替换为该文件名，
+  响应带有 Cache-Control: immutable，浏览器一年内无需重新请求
+- index.html 和不带哈希的文件名每次都需要重新验证，响应带有强 ETag，未变化时返回 304
+- 根据 Accept-Encoding 返回预先压缩的版本
+
+资源文件修改后会在下一次请求时重新生成（开发时无需重启）。
+
+API 的 JSON 响应超过 COMPRESS_MIN_SIZE 字节时按 Accept-Encoding 即时压缩。
+
+配置:
+    COMPRESS_MIN_SIZE  即时压缩JSON响应的最小字节数，默认1024，0表示不压缩
+    COMPRESS_LEVEL     即时压缩的 gzip 压缩级别（1-9），默认6；brotli 使用质量4
+"""
+
+import os
+import gzip
+import hashlib
+import threading
+
+from flask import Response, request
+
+from search_engines.config import env_int
+from search_engines.log import get_logger
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli 为可选依赖
+    brotli = None
+
+logger = get_logger(__name__)
+
+# 前端资源，index.html 中对其他资源的引用会被替换为带哈希的文件名
+ASSETS = ('index.html', 'script.js', 'styles.css')
+INDEX = 'index.html'
+
+MIME_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+    '.css': 'text/css; charset=utf-8'
+}
+
+# 带哈希的文件名内容不会变化，可以长期缓存
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+# 按优先顺序排列的压缩编码
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+def compress(data, encoding, level=None):
+    """压缩数据
+
+    Args:
+        data (bytes): 原始数据
+        encoding (str): br 或 gzip
+        level (int, optional): 压缩级别，默认使用最高级别（用于预先压缩）
+
+    Returns:
+        bytes: 压缩后的数据
+    """
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if level is None else level)
+    return gzip.compress(data, compresslevel=9 if level is None else level, mtime=0)
+
+def negotiate(accept_encoding, available=ENCODINGS):
+    """根据 Accept-Encoding 选择压缩编码
+
+    Args:
+        accept_encoding (str): 请求的 Accept-Encoding 头
+        available (tuple): 可用的编码，按优先顺序排列
+
+    Returns:
+        str|None: 选中的编码，客户端不接受任何可用编码时返回None
+    """
+    weights = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding] = weight
+
+    best, best_weight = None, 0.0
+    for coding in available:
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+class Asset:
+    """单个静态资源及其压缩版本"""
+
+    __slots__ = ('name', 'hashed_name', 'mimetype', 'digest', 'variants')
+
+    def __init__(self, name, data):
+        self.name = name
+        self.mimetype = MIME_TYPES.get(os.path.splitext(name)[1], 'application/octet-stream')
+        self.digest = hashlib.sha256(data).hexdigest()[:12]
+        stem, ext = os.path.splitext(name)
+        self.hashed_name = f'{stem}.{self.digest}{ext}'
+
+        # 编码 -> 内容，只保留比原始内容更小的压缩版本
+        self.variants = {None: data}
+        for encoding in ENCODINGS:
+            compressed = compress(data, encoding)
+            if len(compressed) < len(data):
+                self.variants[encoding] = compressed
+
+    def etag(self, encoding):
+        """强 ETag，不同压缩编码的内容不同，ETag 也不同"""
+        return f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+
+class AssetPipeline:
+    """前端静态资源"""
+
+    def __init__(self, root, names=ASSETS):
+        self.root = root
+        self.names = names
+        self._assets = {}
+        self._by_path = {}
+        self._built_mtimes = {}
+        self._lock = threading.Lock()
+        self._build()
+
+    def _mtimes(self):
+        mtimes = {}
+        for name in self.names:
+            try:
+                mtimes[name] = os.stat(os.path.join(self.root, name)).st_mtime_ns
+            except OSError:
+                mtimes[name] = None
+        return mtimes
+
+    def _build(self):
+        """读取并压缩所有资源，index.html 中的引用替换为带哈希的文件名"""
+        mtimes = self._mtimes()
+        contents = {}
+        for name in self.names:
+            try:
+                with open(os.path.join(self.root, name), 'rb') as f:
+                    contents[name] = f.read()
+            except OSError as e:
+                logger.warning('读取静态资源失败: %s, %s', name, e)
+
+        assets = {name: Asset(name, data) for name, data in contents.items() if name != INDEX}
+        if INDEX in contents:
+            html = contents[INDEX].decode('utf-8')
+            for asset in assets.values():
+                html = html.replace(f'"{asset.name}"', f'"{asset.hashed_name}"')
+            assets[INDEX] = Asset(INDEX, html.encode('utf-8'))
+
+        by_path = {}
+        for asset in assets.values():
+            by_path[asset.name] = (asset, False)
+            by_path[asset.hashed_name] = (asset, True)
+
+        self._assets = assets
+        self._by_path = by_path
+        self._built_mtimes = mtimes
+        logger.debug('静态资源: %s', ', '.join(asset.hashed_name for asset in assets.values()))
+
+    def _refresh(self):
+        """资源文件有修改时重新生成"""
+        if self._mtimes() != self._built_mtimes:
+            with self._lock:
+                if self._mtimes() != self._built_mtimes:
+                    self._build()
+
+    def response(self, path):
+        """返回资源的响应（当前 Flask 请求），资源不存在时返回None
+
+        Args:
+            path (str): 请求路径（不带开头的 /），可以是原文件名或带哈希的文件名
+
+        Returns:
+            flask.Response|None: 200 或 304 响应
+        """
+        self._refresh()
+        found = self._by_path.get(path)
+        if found is None:
+            return None
+        asset, immutable = found
+
+        encoding = negotiate(request.headers.get('Accept-Encoding'), [e for e in ENCODINGS if e in asset.variants])
+        etag = asset.etag(encoding)
+        headers = {
+            'ETag': etag,
+            'Cache-Control': IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+            'Vary': 'Accept-Encoding'
+        }
+
+        if_none_match = _parse_if_none_match(request.headers.get('If-None-Match'))
+        if etag in if_none_match or '*' in if_none_match:
+            return Response(status=304, headers=headers)
+
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return Response(asset.variants[encoding], mimetype=asset.mimetype, headers=headers)
+
+def _parse_if_none_match(value):
+    """解析 If-None-Match 头中的 ETag 列表（忽略弱验证前缀 W/）"""
+    if not value:
+        return ()
+    etags = []
+    for part in value.split(','):
+        part = part.strip()
+        if part.startswith('W/'):
+            part = part[2:]
+        etags.append(part)
+    return etags
+
+def compress_json_response(response):
+    """按 Accept-Encoding 压缩较大的JSON响应（用于 Flask after_request）"""
+    min_size = env_int('COMPRESS_MIN_SIZE', 1024)
+    if (min_size <= 0 or response.status_code != 200 or response.direct_passthrough
+            or response.is_streamed or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(request.headers.get('Accept-Encoding'))
+    if encoding:
+        response.set_data(compress_body(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+def compress_body(body, encoding):
+    """即时压缩响应体"""
+    return compress(body, encoding, 4 if encoding == 'br' else env_int('COMPRESS_LEVEL', 6))
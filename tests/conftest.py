@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试环境配置
+
+在导入应用和搜索引擎模块之前设置环境变量：API密钥置空（load_dotenv 不会覆盖已设置的变量，
+避免读取 .env 中的真实密钥），关闭磁盘缓存、查询日志、跨进程请求合并和连接预热。
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for name in ('ZHIPUAI_API_KEY', 'BOCHAAI_API_KEY', 'SEARXNG_API_HOST', 'DISK_CACHE_PATH', 'QUERY_LOG_PATH',
+             'SINGLEFLIGHT_DIR', 'CASSETTE_MODE'):
+    os.environ[name] = ''
+os.environ['HTTP_PREWARM_ON_IMPORT'] = '0'
+os.environ['LOG_LEVEL'] = 'WARNING'
+
+import pytest
+
+from search_engines import cache, breaker, models
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    """每个测试使用空的结果缓存和熔断器状态"""
+    cache.result_cache.clear()
+    breaker._breakers.clear()
+    yield
+    cache.result_cache.clear()
+    breaker._breakers.clear()
+
+def make_result(titles, prefix='https://example.com/'):
+    """构造搜索结果，每个标题对应一条结果"""
+    return {
+        'id': 'test',
+        'created': 0,
+        'search_intent': [],
+        'search_result': [models.SearchItem(title=title, link=f'{prefix}{index}', content=title)
+                          for index, title in enumerate(titles)]
+    }
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+ASGI版本测试
+"""
+
+import json
+import asyncio
+
+import pytest
+
+import asgi
+import app as app_module
+from search_engines import dispatcher
+from conftest import make_result
+
+def _get(path, query_string):
+    """调用 ASGI 应用，返回 (状态码, 响应头, 响应体)"""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': query_string.encode('ascii'),
+             'headers': []}
+    asyncio.run(asgi.app(scope, receive, send))
+    start = messages[0]
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    return start['status'], dict(start['headers']), body
+
+def _error_result():
+    result = make_result(['部分结果'])
+    result['error'] = '所有搜索引擎均请求失败'
+    return result
+
+@pytest.fixture
+def failing(monkeypatch):
+    async def async_cached_search(engine, query, params, bypass_cache=False):
+        return _error_result(), 'MISS'
+
+    monkeypatch.setattr(dispatcher, 'async_cached_search', async_cached_search)
+    monkeypatch.setattr(dispatcher, 'cached_search', lambda engine, query, params, bypass_cache=False: (_error_result(), 'MISS'))
+
+@pytest.mark.parametrize('path', ['/api/search', '/api/search/stream'])
+@pytest.mark.parametrize('fmt', ['zhipu', 'compact'])
+def test_error_response_matches_flask(failing, path, fmt):
+    query_string = f'engine=searxng&query=python&format={fmt}'
+    status, _, body = _get(path, query_string)
+    flask_response = app_module.app.test_client().get(f'{path}?{query_string}')
+    assert status == flask_response.status_code == 500
+    assert json.loads(body) == flask_response.get_json()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+批量搜索测试（/api/search/batch）
+"""
+
+import json
+
+import pytest
+
+import app as app_module
+from search_engines import dispatcher
+from conftest import make_result
+
+@pytest.fixture
+def client(monkeypatch):
+    """上游搜索替换为按查询返回固定结果"""
+    calls = []
+
+    def fake_search(engine, query, params):
+        calls.append((engine, query, params))
+        return make_result([f'{engine} {query}'])
+
+    monkeypatch.setattr(dispatcher, 'search', fake_search)
+    test_client = app_module.app.test_client()
+    test_client.calls = calls
+    return test_client
+
+MALFORMED = [
+    {'query': 'a', 'engine': 'bochaai', 'count': [1]},
+    {'query': 'b', 'engine': 'bochaai', 'page': {'n': 2}},
+    {'query': 'c', 'engine': 'searxng', 'safesearch': [0]},
+    {'query': 'd', 'engine': 'searxng', 'rerank': ['bm25']},
+    {'query': 'e', 'engine': 'nope'},
+    {'query': '', 'engine': 'searxng'},
+    {'query': 'f', 'engine': 'searxng', 'count': '5'}
+]
+
+def test_malformed_items_yield_per_item_results(client):
+    response = client.post('/api/search/batch', json={'queries': MALFORMED})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['count'] == len(MALFORMED)
+    assert [entry['index'] for entry in data['results']] == list(range(len(MALFORMED)))
+
+    statuses = [entry['status'] for entry in data['results']]
+    # 列表、对象等无效的整数参数按未指定处理
+    assert statuses[:3] == ['ok', 'ok', 'ok']
+    assert statuses[3:6] == ['error', 'error', 'error']
+    assert statuses[6] == 'ok'
+    assert data['errors'] == 3
+
+    params = {query: params for _, query, params in client.calls}
+    assert params['a']['count'] is None
+    assert params['b']['page'] is None
+    assert params['c']['safesearch'] == 1
+    assert params['f']['count'] == 5
+
+def test_malformed_items_stream(client):
+    response = client.post('/api/search/batch', json={'queries': MALFORMED, 'stream': True})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [entry['index'] for entry in lines] == list(range(len(MALFORMED)))
+
+def test_item_exception_is_isolated(client, monkeypatch):
+    original = dispatcher.parse_params
+
+    def parse_params(engine, args):
+        if args.get('explode'):
+            raise RuntimeError('boom')
+        return original(engine, args)
+
+    monkeypatch.setattr(dispatcher, 'parse_params', parse_params)
+    response = client.post('/api/search/batch', json={'queries': [
+        {'query': 'x', 'engine': 'searxng', 'explode': True},
+        {'query': 'y', 'engine': 'searxng'}
+    ]})
+    results = response.get_json()['results']
+    assert results[0]['status'] == 'error' and 'boom' in results[0]['error']
+    assert results[1]['status'] == 'ok'
+
+def test_defaults_and_order(client):
+    response = client.post('/api/search/batch', json={
+        'engine': 'searxng',
+        'params': {'language': 'en'},
+        'queries': ['one', {'query': 'two', 'engine': 'bochaai'}, 'three'],
+        'format': 'compact'
+    })
+    results = response.get_json()['results']
+    assert [(entry['query'], entry['engine']) for entry in results] == [
+        ('one', 'searxng'), ('two', 'bochaai'), ('three', 'searxng')]
+    assert results[0]['result']['search_result'][0]['title'] == 'searxng one'
+    assert {query: params.get('language') for _, query, params in client.calls}['one'] == 'en'
+
+def test_invalid_request(client):
+    assert client.post('/api/search/batch', json={'queries': []}).status_code == 400
+    assert client.post('/api/search/batch', data='x', content_type='text/plain').status_code == 400
+
+def test_engine_limit_does_not_block_other_engines(monkeypatch):
+    """某个搜索引擎排队的查询不占用其他搜索引擎的线程"""
+    import threading
+    from search_engines import batch
+
+    monkeypatch.setenv('BATCH_CONCURRENCY_SEARXNG', '2')
+    monkeypatch.setattr(batch, '_executors', {})
+    release = threading.Event()
+    lock = threading.Lock()
+    running = {'now': 0, 'max': 0}
+
+    def fake_search(engine, query, params):
+        if engine == 'searxng':
+            with lock:
+                running['now'] += 1
+                running['max'] = max(running['max'], running['now'])
+            release.wait(5)
+            with lock:
+                running['now'] -= 1
+        return make_result([query])
+
+    monkeypatch.setattr(dispatcher, 'search', fake_search)
+    items, _ = batch.parse_request({'queries': [{'query': f's{index}', 'engine': 'searxng'} for index in range(10)]
+                                    + [{'query': 'b', 'engine': 'bochaai'}]})
+    futures = batch.submit(items, bypass_cache=True)
+    try:
+        assert futures[-1].result(timeout=5)['status'] == 'ok'
+        assert not futures[0].done() or not futures[9].done()
+    finally:
+        release.set()
+    entries = [future.result(timeout=10) for future in futures]
+    assert all(entry['status'] == 'ok' for entry in entries)
+    assert running['max'] == 2
+
+def test_all_items_count_against_engine_limits(monkeypatch):
+    """engine=all 的查询对各搜索引擎的请求计入该搜索引擎的批量并发数"""
+    import threading
+    from search_engines import batch
+
+    monkeypatch.setenv('SEARXNG_API_HOST', 'http://searxng.invalid')
+    monkeypatch.setenv('BOCHAAI_API_KEY', 'test')
+    monkeypatch.setenv('BATCH_CONCURRENCY_SEARXNG', '1')
+    monkeypatch.setenv('BATCH_CONCURRENCY_ALL', '4')
+    monkeypatch.setattr(batch, '_executors', {})
+    lock = threading.Lock()
+    running = {'now': 0, 'max': 0}
+
+    def fake_search(engine, query, params):
+        if engine == 'searxng':
+            with lock:
+                running['now'] += 1
+                running['max'] = max(running['max'], running['now'])
+            threading.Event().wait(0.05)
+            with lock:
+                running['now'] -= 1
+        return make_result([f'{engine} {query}'], prefix=f'https://{engine}.example.com/')
+
+    monkeypatch.setattr(dispatcher, 'search', fake_search)
+    items, _ = batch.parse_request({'queries': [{'query': f'a{index}', 'engine': 'all'} for index in range(4)]
+                                    + [{'query': 's', 'engine': 'searxng'}]})
+    entries = list(batch.iter_results(batch.submit(items, bypass_cache=True)))
+    assert [entry['status'] for entry in entries] == ['ok'] * 5
+    assert running['max'] == 1
+    assert set(entries[0]['result']['meta']['engines']) == {'bochaai', 'searxng'}
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+熔断器测试
+"""
+
+import time
+import asyncio
+
+import pytest
+
+from search_engines import breaker, dispatcher, ratelimit
+from conftest import make_result
+
+@pytest.fixture
+def env(monkeypatch):
+    for name, value in {
+        'BREAKER_WINDOW': '4',
+        'BREAKER_MIN_REQUESTS': '4',
+        'BREAKER_ERROR_RATE': '0.5',
+        'BREAKER_OPEN_SECONDS': '0.05',
+        'UPSTREAM_TIMEOUT': '10',
+        'UPSTREAM_TIMEOUT_MIN': '1',
+        'BREAKER_SLOW_SECONDS': '5'
+    }.items():
+        monkeypatch.setenv(name, value)
+
+def _open(engine='searxng'):
+    circuit = breaker.get(engine)
+    for _ in range(4):
+        circuit.record(True, 0.1)
+    assert circuit.state == breaker.OPEN
+    return circuit
+
+def _half_open(engine='searxng'):
+    circuit = _open(engine)
+    time.sleep(0.06)
+    return circuit
+
+def test_opens_at_error_rate(env):
+    circuit = breaker.get('searxng')
+    circuit.record(False, 0.1)
+    circuit.record(True, 0.1)
+    circuit.record(False, 0.1)
+    assert circuit.state == breaker.CLOSED
+    circuit.record(True, 0.1)
+    assert circuit.state == breaker.OPEN
+    with pytest.raises(breaker.CircuitOpenError):
+        circuit.allow()
+
+def test_slow_requests_count_as_failures(env):
+    circuit = breaker.get('searxng')
+    for _ in range(4):
+        circuit.record(False, 6)
+    assert circuit.state == breaker.OPEN
+
+def test_half_open_allows_single_probe(env):
+    circuit = _half_open()
+    probe = circuit.allow()
+    assert probe is not None
+    assert circuit.state == breaker.HALF_OPEN
+    with pytest.raises(breaker.CircuitOpenError):
+        circuit.allow()
+    circuit.record(False, 0.1)
+    assert circuit.state == breaker.CLOSED
+    assert circuit.allow() is None
+
+def test_failed_probe_reopens(env):
+    circuit = _half_open()
+    circuit.allow()
+    circuit.record(True, 0.1)
+    assert circuit.state == breaker.OPEN
+
+def test_release_unrecorded_probe(env):
+    circuit = _half_open()
+    probe = circuit.allow()
+    circuit.release(probe)
+    # 探测没有发出上游请求，下一个请求可以立即探测
+    assert circuit.allow() is not None
+
+def test_release_after_record_is_noop(env):
+    circuit = _half_open()
+    probe = circuit.allow()
+    circuit.record(True, 0.1)
+    circuit.release(probe)
+    assert circuit.state == breaker.OPEN
+    with pytest.raises(breaker.CircuitOpenError):
+        circuit.allow()
+
+def test_adaptive_timeout(env):
+    circuit = breaker.get('searxng')
+    assert circuit.timeout() == 10
+    for _ in range(breaker.MIN_LATENCY_SAMPLES):
+        circuit.record(False, 0.2)
+    # p99 的两倍，不低于下限
+    assert circuit.timeout() == 1
+    for _ in range(breaker.LATENCY_SAMPLES):
+        circuit.record(False, 2)
+    assert circuit.timeout() == 4
+
+def test_rate_limited_probe_is_released(env, monkeypatch):
+    _half_open()
+    calls = []
+
+    def acquire(engine):
+        if not calls:
+            calls.append(engine)
+            raise ratelimit.RateLimitError(engine, 1, '请求过于频繁')
+
+    monkeypatch.setattr(ratelimit, 'acquire', acquire)
+    monkeypatch.setattr(dispatcher, 'search', lambda engine, query, params: make_result(['ok']))
+
+    with pytest.raises(ratelimit.RateLimitError):
+        dispatcher._fetch('searxng', 'q', {})
+    # 限流拒绝的探测被释放，下一个请求立即探测而不是被熔断器拒绝到超时
+    result = dispatcher._fetch('searxng', 'q', {})
+    assert result['search_result'][0].title == 'ok'
+
+def test_async_rate_limited_probe_is_released(env, monkeypatch):
+    _half_open()
+    calls = []
+
+    async def async_acquire(engine):
+        if not calls:
+            calls.append(engine)
+            raise ratelimit.RateLimitError(engine, 1, '请求过于频繁')
+
+    async def async_search(engine, query, params):
+        return make_result(['ok'])
+
+    monkeypatch.setattr(ratelimit, 'async_acquire', async_acquire)
+    monkeypatch.setattr(dispatcher, 'async_search', async_search)
+
+    with pytest.raises(ratelimit.RateLimitError):
+        asyncio.run(dispatcher._async_fetch('searxng', 'q', {}))
+    result = asyncio.run(dispatcher._async_fetch('searxng', 'q', {}))
+    assert result['search_result'][0].title == 'ok'
@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+搜索结果缓存测试
+"""
+
+import time
+import asyncio
+import threading
+
+import pytest
+
+import app as app_module
+from search_engines import cache, dispatcher, disk_cache
+from conftest import make_result
+
+class _Clock:
+    """可手动推进的时钟，替换 cache 模块中的 time"""
+
+    def __init__(self):
+        self.now = 1000000.0
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = _Clock()
+    monkeypatch.setattr(cache, 'time', fake)
+    return fake
+
+def test_make_key_normalizes_query():
+    key = cache.make_key('searxng', '  ＰＹＴＨＯＮ   教程 ', {'count': 10, 'page': None})
+    assert key == cache.make_key('searxng', 'python 教程', {'count': 10})
+    assert key != cache.make_key('searxng', 'python 教程', {'count': 20})
+    assert key != cache.make_key('bochaai', 'python 教程', {'count': 10})
+
+def test_ttl_expiry(clock):
+    result_cache = cache.ResultCache(max_entries=10, max_bytes=1 << 20)
+    result_cache.set('a', make_result(['a']), ttl=10)
+    assert result_cache.get('a')['search_result'][0].title == 'a'
+    clock.advance(9.9)
+    assert result_cache.get('a') is not None
+    clock.advance(0.2)
+    assert result_cache.lookup('a') == (None, None)
+    stats = result_cache.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 1
+    assert stats['expirations'] == 1
+    assert stats['entries'] == 0
+
+def test_zero_ttl_is_not_cached():
+    result_cache = cache.ResultCache(max_entries=10, max_bytes=1 << 20)
+    result_cache.set('a', make_result(['a']), ttl=0)
+    assert result_cache.get('a') is None
+
+def test_lru_eviction_by_entries():
+    result_cache = cache.ResultCache(max_entries=2, max_bytes=1 << 20)
+    result_cache.set('a', make_result(['a']), ttl=60)
+    result_cache.set('b', make_result(['b']), ttl=60)
+    # 访问 a 后 b 成为最久未使用的条目
+    assert result_cache.get('a') is not None
+    result_cache.set('c', make_result(['c']), ttl=60)
+    assert result_cache.get('b') is None
+    assert result_cache.get('a') is not None
+    assert result_cache.get('c') is not None
+    assert result_cache.stats()['evictions'] == 1
+
+def test_lru_eviction_by_bytes():
+    size = len(cache._serialize(make_result(['x' * 100])))
+    result_cache = cache.ResultCache(max_entries=100, max_bytes=size * 2)
+    for key in ('a', 'b', 'c'):
+        result_cache.set(key, make_result(['x' * 100]), ttl=60)
+    assert result_cache.get('a') is None
+    assert result_cache.stats()['bytes'] <= size * 2
+    # 超过内存上限的单个结果不缓存
+    result_cache.set('big', make_result(['x' * 1000]), ttl=60)
+    assert result_cache.get('big') is None
+
+@pytest.fixture
+def client(monkeypatch):
+    calls = []
+
+    def fake_search(engine, query, params):
+        calls.append(query)
+        return make_result([f'{engine} {query}'])
+
+    monkeypatch.setattr(dispatcher, 'search', fake_search)
+    test_client = app_module.app.test_client()
+    test_client.calls = calls
+    return test_client
+
+def test_search_endpoint_uses_cache(client):
+    first = client.get('/api/search?engine=searxng&query=python')
+    second = client.get('/api/search?engine=searxng&query=%20PYTHON%20')
+    assert first.headers['X-Cache'] == 'MISS'
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.get_json()['search_result'] == first.get_json()['search_result']
+    assert client.calls == ['python']
+
+    bypass = client.get('/api/search?engine=searxng&query=python&nocache=1')
+    assert bypass.headers['X-Cache'] == 'BYPASS'
+    assert len(client.calls) == 2
+
+def _error_result():
+    result = make_result(['上游错误'])
+    result['search_result'][0].refer = '错误'
+    return result
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, '后台刷新超时'
+        time.sleep(0.01)
+
+def test_stale_entry_and_refresh_claim(clock):
+    result_cache = cache.ResultCache(max_entries=10, max_bytes=1 << 20)
+    result_cache.set('a', make_result(['a']), ttl=10, stale_ttl=5)
+    clock.advance(11)
+    value, state = result_cache.lookup('a')
+    assert state == cache.STALE and value is not None
+    # 只有第一个请求认领后台刷新
+    assert result_cache.claim_refresh('a') is True
+    assert result_cache.claim_refresh('a') is False
+    clock.advance(5)
+    assert result_cache.lookup('a') == (None, None)
+
+def test_negative_entry(clock):
+    result_cache = cache.ResultCache(max_entries=10, max_bytes=1 << 20)
+    result_cache.set('a', _error_result(), ttl=3, negative=True)
+    assert result_cache.lookup('a')[1] == cache.NEGATIVE
+    assert result_cache.claim_refresh('a') is False
+    assert result_cache.expires_in('a') is None
+    clock.advance(3)
+    assert result_cache.lookup('a') == (None, None)
+
+def test_stale_while_revalidate(clock, monkeypatch):
+    calls = []
+
+    def fake_search(engine, query, params):
+        calls.append(query)
+        return make_result([f'{query} {len(calls)}'])
+
+    monkeypatch.setattr(dispatcher, 'search', fake_search)
+    params = dispatcher.parse_params('searxng', {})
+    result, status = dispatcher.cached_search('searxng', 'q', params)
+    assert status == 'MISS'
+
+    clock.advance(cache.DEFAULT_TTL + 1)
+    result, status = dispatcher.cached_search('searxng', 'q', params)
+    # 直接返回过期结果，并在后台刷新
+    assert status == 'STALE'
+    assert result['search_result'][0].title == 'q 1'
+    key = cache.make_key('searxng', 'q', dispatcher.engine_params('searxng', params))
+    _wait_for(lambda: (cache.result_cache.expires_in(key) or 0) > 0)
+    result, status = dispatcher.cached_search('searxng', 'q', params)
+    assert status == 'HIT'
+    assert result['search_result'][0].title == 'q 2'
+    assert len(calls) == 2
+
+def test_negative_caching(clock, monkeypatch):
+    calls = []
+
+    def failing_search(engine, query, params):
+        calls.append(query)
+        return _error_result()
+
+    monkeypatch.setattr(dispatcher, 'search', failing_search)
+    params = dispatcher.parse_params('searxng', {})
+    assert dispatcher.cached_search('searxng', 'q', params)[1] == 'MISS'
+    assert dispatcher.cached_search('searxng', 'q', params)[1] == 'NEGATIVE'
+    assert len(calls) == 1
+    clock.advance(cache.DEFAULT_NEGATIVE_TTL)
+    assert dispatcher.cached_search('searxng', 'q', params)[1] == 'MISS'
+    assert len(calls) == 2
+
+def test_failed_refresh_keeps_stale_result(clock, monkeypatch):
+    calls = []
+
+    def search(engine, query, params):
+        calls.append(query)
+        return make_result(['good']) if len(calls) == 1 else _error_result()
+
+    monkeypatch.setattr(dispatcher, 'search', search)
+    params = dispatcher.parse_params('searxng', {})
+    dispatcher.cached_search('searxng', 'q', params)
+    key = cache.make_key('searxng', 'q', dispatcher.engine_params('searxng', params))
+
+    clock.advance(cache.DEFAULT_TTL + 1)
+    assert dispatcher.cached_search('searxng', 'q', params)[1] == 'STALE'
+    # 刷新得到错误结果时不覆盖过期结果，而是推迟下一次刷新
+    entry = cache.result_cache._entries[key]
+    _wait_for(lambda: len(calls) == 2 and entry.refresh_after == clock.now + cache.DEFAULT_NEGATIVE_TTL)
+    result, status = dispatcher.cached_search('searxng', 'q', params)
+    assert status == 'STALE'
+    assert result['search_result'][0].title == 'good'
+    assert cache.result_cache.claim_refresh(key) is False
+
+class _RecordingDiskCache(disk_cache.DiskCache):
+    """记录读写所在线程的磁盘缓存"""
+
+    def __init__(self, path):
+        super().__init__(path, compact_interval=0)
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.current_thread())
+        return super().get(key)
+
+    def set(self, key, data, expires_at, stale_until, negative=False):
+        self.threads.append(threading.current_thread())
+        super().set(key, data, expires_at, stale_until, negative)
+
+def test_async_search_keeps_disk_cache_off_the_event_loop(tmp_path, monkeypatch):
+    backing = _RecordingDiskCache(str(tmp_path / 'cache.sqlite3'))
+    monkeypatch.setattr(cache, 'result_cache', cache.ResultCache(max_entries=10, max_bytes=1 << 20, backing=backing))
+    calls = []
+
+    async def fake_async_search(engine, query, params):
+        calls.append(query)
+        return make_result([query])
+
+    monkeypatch.setattr(dispatcher, 'async_search', fake_async_search)
+    params = dispatcher.parse_params('searxng', {})
+
+    async def search():
+        return await dispatcher.async_cached_search('searxng', 'q', params)
+
+    assert asyncio.run(search())[1] == 'MISS'
+    # 未命中时的磁盘读取和写入都在线程中执行
+    assert len(backing.threads) == 2
+    assert threading.main_thread() not in backing.threads
+
+    # 内存命中不访问磁盘缓存
+    assert asyncio.run(search())[1] == 'HIT'
+    assert len(backing.threads) == 2
+
+    # 其他工作进程写入的结果从磁盘缓存读取
+    cache.result_cache.clear()
+    result, status = asyncio.run(search())
+    assert status == 'HIT'
+    assert result['search_result'][0].title == 'q'
+    assert cache.result_cache.stats()['diskHits'] == 1
+    assert threading.main_thread() not in backing.threads
+    assert calls == ['q']
+
+def test_async_concurrent_misses_share_until_stored(monkeypatch):
+    calls = []
+
+    async def fake_async_search(engine, query, params):
+        calls.append(query)
+        await asyncio.sleep(0.01)
+        return make_result([query])
+
+    monkeypatch.setattr(dispatcher, 'async_search', fake_async_search)
+    params = dispatcher.parse_params('searxng', {})
+
+    async def main():
+        return await asyncio.gather(*(dispatcher.async_cached_search('searxng', 'q', params) for _ in range(5)))
+
+    statuses = sorted(status for _, status in asyncio.run(main()))
+    assert statuses == ['MISS'] + ['SHARED'] * 4
+    assert calls == ['q']
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+结果去重测试
+"""
+
+import pytest
+
+from search_engines import dedup, models
+
+TEXT = 'Python 是一种广泛使用的解释型、高级和通用的编程语言，它支持多种编程范式，包括函数式、指令式和面向对象编程。'
+
+def _item(link, title='标题', content=''):
+    return models.SearchItem(title=title, link=link, content=content)
+
+def _result(items):
+    return {'id': 'test', 'search_result': items, 'meta': {}}
+
+@pytest.mark.parametrize('url, expected', [
+    ('https://www.example.com/a/', 'example.com/a'),
+    ('http://example.com/a#top', 'example.com/a'),
+    ('https://example.com:443/a', 'example.com/a'),
+    ('https://example.com:8443/a', 'example.com:8443/a'),
+    ('https://EXAMPLE.com./a?b=2&a=1', 'example.com/a?a=1&b=2'),
+    ('https://example.com/a?utm_source=x&fbclid=y&id=3', 'example.com/a?id=3'),
+    ('https://example.com/a?q=', 'example.com/a?q='),
+    ('not a url', None),
+    ('', None)
+])
+def test_canonical_url(url, expected):
+    assert dedup.canonical_url(url) == expected
+
+def test_url_duplicates_keep_first():
+    result = dedup.dedupe('searxng', _result([
+        _item('https://example.com/a', '第一条'),
+        _item('https://example.com/b', '第二条'),
+        _item('http://www.example.com/a/?utm_medium=web', '重复')
+    ]))
+    assert [item.title for item in result['search_result']] == ['第一条', '第二条']
+    assert result['meta']['duplicates'] == 1
+
+def test_near_duplicates_across_hosts():
+    result = dedup.dedupe('searxng', _result([
+        _item('https://example.com/python', 'Python 简介', TEXT),
+        _item('https://mirror.example.org/python', 'Python 简介', TEXT + '。'),
+        _item('https://other.example.net/java', 'Java 简介', 'Java 是一种面向对象的编程语言，由 Sun 公司于1995年推出，具有跨平台的特性。')
+    ]))
+    assert [item.link for item in result['search_result']] == [
+        'https://example.com/python', 'https://other.example.net/java'
+    ]
+    assert result['meta']['duplicates'] == 1
+
+def test_similar_pages_on_same_host_are_kept():
+    result = dedup.dedupe('searxng', _result([
+        _item('https://docs.example.com/3.11/intro', 'Python 简介', TEXT),
+        _item('https://docs.example.com/3.12/intro', 'Python 简介', TEXT)
+    ]))
+    assert len(result['search_result']) == 2
+    assert 'duplicates' not in result['meta']
+
+def test_short_text_is_not_compared():
+    items = [_item('https://a.example.com/', '天气'), _item('https://b.example.com/', '天气')]
+    assert len(dedup.dedupe('searxng', _result(items))['search_result']) == 2
+
+def test_error_items_are_not_compared():
+    items = [_item('https://a.example.com/', '错误', TEXT), _item('https://b.example.com/', '错误', TEXT)]
+    for item in items:
+        item.refer = '错误'
+    assert len(dedup.dedupe('searxng', _result(items))['search_result']) == 2
+
+def _mirrors():
+    return [_item('https://a.example.com/', 'Python 简介', TEXT), _item('https://b.example.com/', 'Python 简介', TEXT)]
+
+def test_similarity_threshold(monkeypatch):
+    monkeypatch.setenv('DEDUP_SIMILARITY_SEARXNG', '0')
+    # 阈值为0时只按链接去重
+    assert len(dedup.dedupe('searxng', _result(_mirrors()))['search_result']) == 2
+    assert len(dedup.dedupe('bochaai', _result(_mirrors()))['search_result']) == 1
+
+def test_dedup_can_be_disabled(monkeypatch):
+    monkeypatch.setenv('DEDUP_SEARXNG', 'false')
+    items = [_item('https://example.com/a'), _item('https://example.com/a')]
+    assert len(dedup.dedupe('searxng', _result(items))['search_result']) == 2
+    assert len(dedup.dedupe('bochaai', _result(list(items)))['search_result']) == 1
+
+def test_deduplicator_returns_kept_index():
+    deduplicator = dedup.Deduplicator(0.7)
+    assert deduplicator.add(_item('https://a.example.com/1', 'Python 简介', TEXT)) is None
+    assert deduplicator.add(_item('https://a.example.com/2', '其他')) is None
+    assert deduplicator.add(_item('https://a.example.com/2/')) == 1
+    assert deduplicator.add(_item('https://b.example.com/1', 'Python 简介', TEXT)) == 0
+    # 近似重复的链接也记为重复
+    assert deduplicator.add(_item('https://b.example.com/1')) == 0
+    assert (deduplicator.url_duplicates, deduplicator.near_duplicates) == (2, 1)
+
+def test_similarity():
+    a = dedup.shingles(TEXT)
+    assert dedup.similarity(a, a) == 1
+    assert dedup.similarity(a, dedup.shingles('完全不同的内容')) == 0
+    assert dedup.similarity(set(), set()) == 0
+    # 忽略大小写、全角字符和标点
+    assert dedup.shingles('ＡＢＣ，def') == dedup.shingles('abc def')
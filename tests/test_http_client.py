@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+共享HTTP客户端测试
+"""
+
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from search_engines import http_client
+
+class _Upstream:
+    """本地HTTP服务，总是返回 502"""
+
+    def __init__(self):
+        self.requests = []
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                self.rfile.read(length)
+                upstream.requests.append(self.command)
+                self.send_response(502)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            do_GET = do_POST = _respond
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def upstream(monkeypatch):
+    monkeypatch.setenv('HTTP_STATUS_RETRIES', '1')
+    monkeypatch.setenv('HTTP_BACKOFF_FACTOR', '0')
+    http_client.reset()
+    server = _Upstream()
+    yield server
+    server.close()
+    http_client.reset()
+
+def test_get_retries_gateway_errors(upstream):
+    response = http_client.get(upstream.url, timeout=5)
+    assert response.status_code == 502
+    assert upstream.requests == ['GET', 'GET']
+
+def test_post_is_not_retried_on_gateway_errors(upstream):
+    # 上游可能已经执行（并计费）了搜索
+    response = http_client.post(upstream.url, json={'q': 'python'}, timeout=5)
+    assert response.status_code == 502
+    assert upstream.requests == ['POST']
+
+def test_post_retries_connection_errors(monkeypatch):
+    monkeypatch.setenv('HTTP_MAX_RETRIES', '2')
+    retry = http_client._build_retry()
+    # 连接失败时请求尚未发出，POST 也可以重试
+    error = NewConnectionError(None, '连接被拒绝')
+    retry = retry.increment(method='POST', url='/', error=error)
+    retry = retry.increment(method='POST', url='/', error=error)
+    with pytest.raises(MaxRetryError):
+        retry.increment(method='POST', url='/', error=error)
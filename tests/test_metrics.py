@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+指标测试
+"""
+
+import os
+import json
+
+import pytest
+
+from search_engines import metrics
+
+def test_metric_base_is_abstract():
+    with pytest.raises(TypeError):
+        metrics._Metric('test_metric', 'test')
+
+    class Incomplete(metrics._Metric):
+        type_name = 'counter'
+
+    with pytest.raises(TypeError):
+        Incomplete('test_metric', 'test')
+
+def test_counter_and_gauge_collect():
+    counter = metrics.Counter('test_requests_total', '请求次数', ['engine'])
+    counter.labels('searxng').inc()
+    counter.labels('searxng').inc(2)
+    assert counter.labels('searxng') is counter.labels('searxng')
+
+    gauge = metrics.Gauge('test_depth', '深度', ['engine'])
+    gauge.labels('bochaai').set_function(lambda: 3)
+
+    assert counter.collect() == [
+        '# HELP test_requests_total 请求次数',
+        '# TYPE test_requests_total counter',
+        'test_requests_total{engine="searxng"} 3'
+    ]
+    assert gauge.collect()[-1] == 'test_depth{engine="bochaai"} 3'
+
+def test_histogram_buckets():
+    histogram = metrics.Histogram('test_latency_seconds', '延迟', ['engine'], buckets=(0.1, 1))
+    child = histogram.labels('searxng')
+    for value in (0.05, 0.5, 5):
+        child.observe(value)
+    lines = histogram.collect()
+    assert any(line.startswith('test_latency_seconds_bucket{engine="searxng",le="0.1"') and line.endswith(' 1')
+               for line in lines)
+    assert any('le="+Inf"' in line and line.endswith(' 3') for line in lines)
+    assert any(line.startswith('test_latency_seconds_count') and line.endswith(' 3') for line in lines)
+
+@pytest.fixture
+def shared(tmp_path, monkeypatch):
+    """使用临时的共享目录和只包含测试指标的注册表"""
+    monkeypatch.setenv('METRICS_DIR', str(tmp_path))
+    registry = metrics.Registry()
+    registry.counter = registry.register(metrics.Counter('test_requests_total', '请求次数', ['engine']))
+    registry.histogram = registry.register(metrics.Histogram(
+        'test_latency_seconds', '延迟', ['engine'], buckets=(0.1, 1)))
+    registry.depth = registry.register(metrics.Gauge('test_depth', '深度'))
+    registry.state = registry.register(metrics.Gauge('test_state', '状态', ['engine'], multiprocess_mode='max'))
+    monkeypatch.setattr(metrics, 'registry', registry)
+    return registry
+
+def _write_process(directory, pid, requests, latency, depth, state):
+    """模拟另一个工作进程写入的指标文件"""
+    snapshot = {
+        'test_requests_total': {('searxng',): requests},
+        'test_latency_seconds': {('searxng',): [1, 0, latency, 1]},
+        'test_depth': {(): depth},
+        'test_state': {('searxng',): state}
+    }
+    with open(os.path.join(directory, f'{pid}.json'), 'w', encoding='utf-8') as f:
+        json.dump(metrics._encode(snapshot), f)
+
+def _value(output, series):
+    for line in output.splitlines():
+        if line.startswith(series + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+def test_render_aggregates_worker_processes(shared, tmp_path):
+    shared.counter.labels('searxng').inc(2)
+    shared.histogram.labels('searxng').observe(0.5)
+    shared.depth.labels().set(1)
+    shared.state.labels('searxng').set(0)
+    _write_process(str(tmp_path), 999991, requests=3, latency=0.05, depth=4, state=2)
+    _write_process(str(tmp_path), 999992, requests=5, latency=0.05, depth=2, state=1)
+
+    output = metrics.render()
+    assert 'pid=' not in output
+    assert _value(output, 'test_requests_total{engine="searxng"}') == 10
+    assert _value(output, 'test_latency_seconds_bucket{engine="searxng",le="0.1"}') == 2
+    assert _value(output, 'test_latency_seconds_count{engine="searxng"}') == 3
+    assert _value(output, 'test_depth') == 7
+    assert _value(output, 'test_state{engine="searxng"}') == 2
+    # 响应的进程也写入了自己的指标，供其他工作进程汇总
+    assert (tmp_path / f'{os.getpid()}.json').exists()
+
+def test_exited_worker_counts_are_archived(shared, tmp_path):
+    shared.counter.labels('searxng').inc()
+    _write_process(str(tmp_path), 999991, requests=3, latency=0.05, depth=4, state=2)
+    before = metrics.render()
+
+    metrics.mark_process_dead(999991)
+    assert not (tmp_path / '999991.json').exists()
+    after = metrics.render()
+    assert _value(after, 'test_requests_total{engine="searxng"}') == _value(before, 'test_requests_total{engine="searxng"}') == 4
+    assert _value(after, 'test_latency_seconds_count{engine="searxng"}') == 1
+    # 已退出进程的 Gauge 不再计入
+    assert _value(after, 'test_depth') is None
+    assert _value(after, 'test_state{engine="searxng"}') is None
+
+    # 再次退出的工作进程累加到同一个归档文件，文件数不随重启次数增长
+    _write_process(str(tmp_path), 999992, requests=5, latency=0.05, depth=2, state=1)
+    metrics.mark_process_dead(999992)
+    assert _value(metrics.render(), 'test_requests_total{engine="searxng"}') == 9
+    assert sorted(path.name for path in tmp_path.glob('*.json')) == sorted([metrics.ARCHIVE_FILE, f'{os.getpid()}.json'])
+
+def test_forked_worker_starts_from_zero(shared, tmp_path, monkeypatch):
+    """工作进程不重复统计主进程派生前的计数"""
+    shared.counter.labels('searxng').inc(3)
+    shared.depth.labels().set_function(lambda: 5)
+    monkeypatch.setattr(metrics, '_exporter_pid', None)
+    monkeypatch.setenv('METRICS_FLUSH_INTERVAL', '3600')
+    metrics.start_exporter()
+    output = metrics.render()
+    assert _value(output, 'test_requests_total{engine="searxng"}') == 0
+    assert _value(output, 'test_depth') == 5
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+分页测试
+"""
+
+import pytest
+
+from search_engines import pagination, models
+
+@pytest.fixture(autouse=True)
+def page_env(monkeypatch):
+    for name in ('SEARXNG_PAGE_SIZE', 'PAGINATION_MAX_PAGES'):
+        monkeypatch.delenv(name, raising=False)
+
+@pytest.mark.parametrize('count, page, pages, skip', [
+    (10, 1, [1], 0),
+    (20, 1, [1], 0),
+    (10, 2, [1], 10),
+    (10, 3, [2], 0),
+    (30, 1, [1, 2], 0),
+    (15, 2, [1, 2], 15),
+    (25, 3, [3, 4], 10),
+    (200, 1, [1, 2, 3, 4, 5], 0)
+])
+def test_searxng_plan(count, page, pages, skip):
+    plan = pagination.plan('searxng', count, page)
+    assert plan.pages == pages
+    assert plan.page_size == pagination.SEARXNG_PAGE_SIZE
+    assert plan.skip == skip
+    assert plan.count == count
+
+def test_searxng_page_size_env(monkeypatch):
+    monkeypatch.setenv('SEARXNG_PAGE_SIZE', '10')
+    plan = pagination.plan('searxng', 20, 1)
+    assert plan.pages == [1, 2]
+    assert plan.page_size == 10
+
+@pytest.mark.parametrize('count, page, pages, page_size, skip', [
+    (10, 1, [1], 10, 0),
+    (10, 3, [3], 10, 0),
+    (50, 2, [2], 50, 0),
+    (120, 1, [1, 2, 3], 50, 0),
+    (80, 2, [2, 3, 4], 50, 30)
+])
+def test_bochaai_plan(count, page, pages, page_size, skip):
+    plan = pagination.plan('bochaai', count, page)
+    assert plan.pages == pages
+    assert plan.page_size == page_size
+    assert plan.skip == skip
+
+@pytest.mark.parametrize('engine, params, expected', [
+    # SearXNG 一页能返回 count 条时只请求一次，保持上游原有行为
+    ('searxng', {'count': None, 'page': None}, False),
+    ('searxng', {'count': 20, 'page': None}, False),
+    ('searxng', {'count': 21, 'page': None}, True),
+    ('searxng', {'count': 10, 'page': 2}, True),
+    ('bochaai', {'count': 50, 'page': 3}, False),
+    ('bochaai', {'count': 51, 'page': None}, True)
+])
+def test_needs_pages(engine, params, expected):
+    assert pagination._needs_pages(engine, params) is expected
+
+def _result(links):
+    return {'search_result': [models.SearchItem(title=f'title {link}', link=link, content='') for link in links]}
+
+def _links(count):
+    return [f'https://example.com/{index}' for index in range(count)]
+
+def _upstream(links, page_size):
+    """按 pageno 返回 links 中对应一页（最多 count 条）的上游"""
+    calls = []
+
+    def fetch_page(engine, query, params):
+        calls.append(params.get('page') or 1)
+        start = ((params.get('page') or 1) - 1) * page_size
+        return _result(links[start:start + page_size][:params.get('count') or page_size])
+
+    fetch_page.calls = calls
+    return fetch_page
+
+def _page_links(result):
+    return [item.link for item in result['search_result']]
+
+@pytest.mark.parametrize('count', [7, 15, 30])
+def test_pages_are_contiguous(monkeypatch, count):
+    links = _links(120)
+    monkeypatch.setattr(pagination, '_fetch_page', _upstream(links, pagination.SEARXNG_PAGE_SIZE))
+
+    seen = []
+    for page in range(1, 100 // count + 1):
+        seen.extend(_page_links(pagination.search('searxng', 'q', {'count': count, 'page': page})))
+    assert seen == links[:100 // count * count]
+
+def test_duplicates_do_not_shift_later_pages(monkeypatch):
+    links = _links(60)
+    links[21] = links[20]
+    upstream = _upstream(links, pagination.SEARXNG_PAGE_SIZE)
+    monkeypatch.setattr(pagination, '_fetch_page', upstream)
+
+    result = pagination.search('searxng', 'q', {'count': 10, 'page': 3})
+    assert upstream.calls == [2]
+    # 第21条与第20条重复：本页少一条，下一页仍从第30条开始
+    assert _page_links(result) == [links[20]] + links[22:30]
+    assert result['meta']['duplicates'] == 1
+    assert _page_links(pagination.search('searxng', 'q', {'count': 10, 'page': 4})) == links[30:40]
+
+def test_short_and_failed_pages(monkeypatch):
+    links = _links(100)
+    size = pagination.SEARXNG_PAGE_SIZE
+
+    def fetch_page(engine, query, params):
+        if params['page'] == 2:
+            raise RuntimeError('upstream down')
+        start = (params['page'] - 1) * size
+        # 上游页不足 page_size 条时后面的位置留空，不影响其他页的位置
+        return _result(links[start:start + size - 2])
+
+    monkeypatch.setattr(pagination, '_fetch_page', fetch_page)
+    result = pagination.search('searxng', 'q', {'count': 50, 'page': 1})
+    assert _page_links(result) == links[:size - 2] + links[2 * size:2 * size + 10]
+    assert result['meta']['pages'] == 3
+    assert result['meta']['pagesFailed'] == 1
+
+def test_next_page_counts_removed_duplicates(monkeypatch):
+    monkeypatch.setenv('PAGINATION_PREFETCH', '1')
+    params = {'count': 10, 'page': 2}
+    result = _result(_links(9))
+    assert pagination.next_page_params('searxng', params, result) is None
+    result['meta'] = {'duplicates': 1}
+    assert pagination.next_page_params('searxng', params, result)['page'] == 3
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+上游实例池测试（负载均衡、对冲请求、故障转移）
+"""
+
+import time
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+import requests
+
+from search_engines import pool, ratelimit, http_client
+
+class _Upstream:
+    """本地HTTP服务，按设置的延迟和状态码响应"""
+
+    def __init__(self, delay=0.0, status=200):
+        self.delay = delay
+        self.status = status
+        self.requests = 0
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                upstream.requests += 1
+                time.sleep(upstream.delay)
+                body = b'{}'
+                try:
+                    self.send_response(upstream.status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except OSError:
+                    # 对冲请求中落后的一方已被中断
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def upstreams(monkeypatch):
+    monkeypatch.setenv('HEDGE_DELAY', '0.1')
+    monkeypatch.setattr(ratelimit, '_buckets', {})
+    created = []
+
+    def make(*specs):
+        servers = [_Upstream(**spec) for spec in specs]
+        created.extend(servers)
+        instance_pool = pool.InstancePool('searxng', [server.url for server in servers])
+        # 第一个服务的得分最低，总是作为主实例
+        for index, instance in enumerate(instance_pool.instances):
+            instance.ewma = 0.001 * (index + 1)
+        return instance_pool, servers
+
+    yield make
+    for server in created:
+        server.close()
+
+def _instance(instance_pool, server):
+    return next(instance for instance in instance_pool.instances if instance.url == server.url)
+
+def _settle(instance_pool):
+    """等待被中断的请求结束（上游的延迟远大于等待时间，未被中断的请求不会在此期间结束）"""
+    deadline = time.monotonic() + 0.5
+    while any(instance.inflight for instance in instance_pool.instances) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def test_fast_primary_sends_no_hedge(upstreams):
+    instance_pool, (primary, secondary) = upstreams({}, {})
+    response = instance_pool.get('/search')
+    assert response.status_code == 200
+    time.sleep(0.2)
+    assert primary.requests == 1
+    assert secondary.requests == 0
+
+def test_hedge_wins_and_interrupts_primary(upstreams, monkeypatch):
+    instance_pool, (slow, fast) = upstreams({'delay': 3.0}, {'delay': 0.0})
+    threads = {}
+    get = http_client.get
+
+    def record_thread(url, **kwargs):
+        threads[url.split('/search')[0]] = threading.current_thread()
+        return get(url, **kwargs)
+
+    monkeypatch.setattr(http_client, 'get', record_thread)
+    start = time.perf_counter()
+    response = instance_pool.get('/search', timeout=5)
+    elapsed = time.perf_counter() - start
+
+    assert response.url.startswith(fast.url)
+    assert elapsed < 1.0
+    _settle(instance_pool)
+    # 被中断的主请求不计为实例失败
+    assert _instance(instance_pool, slow).errors == 0
+    assert _instance(instance_pool, slow).inflight == 0
+    assert fast.requests == 1
+    # 主请求在调用线程中执行，只有对冲请求使用线程池
+    assert threads[slow.url] is threading.current_thread()
+    assert threads[fast.url] is not threading.current_thread()
+
+def test_primary_wins_over_slow_hedge(upstreams):
+    instance_pool, (primary, secondary) = upstreams({'delay': 0.3}, {'delay': 3.0})
+    start = time.perf_counter()
+    response = instance_pool.get('/search', timeout=5)
+    assert response.url.startswith(primary.url)
+    assert time.perf_counter() - start < 1.0
+    _settle(instance_pool)
+    assert secondary.requests == 1
+    assert _instance(instance_pool, secondary).errors == 0
+    assert _instance(instance_pool, secondary).inflight == 0
+
+def test_hedge_needs_rate_limit_token(upstreams, monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_SEARXNG', '0.01')
+    instance_pool, (slow, fast) = upstreams({'delay': 0.4}, {})
+    # 唯一的令牌已被本次搜索取得
+    ratelimit.acquire('searxng')
+    response = instance_pool.get('/search', timeout=5)
+    assert response.url.startswith(slow.url)
+    assert fast.requests == 0
+
+def test_fast_failure_fails_over(upstreams):
+    instance_pool, (broken, healthy) = upstreams({'status': 500}, {})
+    response = instance_pool.get('/search', timeout=5)
+    assert response.url.startswith(healthy.url)
+    assert _instance(instance_pool, broken).errors == 1
+
+def test_all_instances_fail(upstreams):
+    instance_pool, _ = upstreams({'status': 500}, {'status': 503})
+    with pytest.raises(requests.exceptions.HTTPError):
+        instance_pool.get('/search', timeout=5)
+
+def test_async_hedge_wins(upstreams):
+    instance_pool, (slow, fast) = upstreams({'delay': 2.0}, {})
+    start = time.perf_counter()
+    response = asyncio.run(instance_pool.async_get('/search', timeout=5))
+    assert response.url.startswith(fast.url)
+    assert time.perf_counter() - start < 1.0
+
+def test_async_hedge_needs_rate_limit_token(upstreams, monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_SEARXNG', '0.01')
+    instance_pool, (slow, fast) = upstreams({'delay': 0.4}, {})
+    ratelimit.acquire('searxng')
+    response = asyncio.run(instance_pool.async_get('/search', timeout=5))
+    assert response.url.startswith(slow.url)
+    assert fast.requests == 0
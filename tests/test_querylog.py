@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+查询日志测试
+"""
+
+import os
+import json
+
+from search_engines import querylog
+
+def _line(query):
+    return (json.dumps([0, 1, 'searxng', query, {}, 1.0]) + '\n').encode('utf-8')
+
+def _queries(entries):
+    return [entry.query for entry in entries]
+
+def test_reads_rotated_file_first(tmp_path):
+    path = str(tmp_path / 'queries.log')
+    with open(path + querylog.ROTATED_SUFFIX, 'wb') as f:
+        f.write(_line('old'))
+    log = querylog.QueryLog(path)
+    log.record('searxng', 'new', {}, 0.001)
+
+    reader = querylog.Reader(path)
+    assert _queries(reader.read()) == ['old', 'new']
+    assert reader.read() == []
+    log.record('searxng', 'next', {}, 0.001)
+    assert _queries(reader.read()) == ['next']
+
+def test_partial_line_waits_for_newline(tmp_path):
+    path = str(tmp_path / 'queries.log')
+    line = _line('partial')
+    with open(path, 'wb') as f:
+        f.write(line[:10])
+    reader = querylog.Reader(path)
+    assert reader.read() == []
+    with open(path, 'ab') as f:
+        f.write(line[10:] + b'not json\n')
+    assert _queries(reader.read()) == ['partial']
+
+def test_follows_rotation(tmp_path):
+    path = str(tmp_path / 'queries.log')
+    log = querylog.QueryLog(path, max_bytes=200)
+    reader = querylog.Reader(path)
+    written = []
+    read = []
+    for index in range(20):
+        query = f'query {index}'
+        log.record('searxng', query, {}, 0.001)
+        written.append(query)
+        if index % 3 == 0:
+            read.extend(_queries(reader.read()))
+    read.extend(_queries(reader.read()))
+    assert os.path.exists(path + querylog.ROTATED_SUFFIX)
+    assert read == written
+
+def test_drains_lines_appended_to_old_file_after_rotation(tmp_path, monkeypatch):
+    path = str(tmp_path / 'queries.log')
+    with open(path, 'wb') as f:
+        f.write(_line('a'))
+    reader = querylog.Reader(path)
+    assert _queries(reader.read()) == ['a']
+
+    # 另一个进程在轮转前打开了旧文件
+    stale = os.open(path, os.O_WRONLY | os.O_APPEND)
+    os.replace(path, path + querylog.ROTATED_SUFFIX)
+    with open(path, 'wb') as f:
+        f.write(_line('c'))
+
+    stat = os.stat
+    appended = []
+
+    def stat_after_append(target, *args, **kwargs):
+        # 读者读完旧文件、检查是否轮转之前，旧文件又被追加了一行
+        if target == path and not appended:
+            appended.append(True)
+            os.write(stale, _line('b'))
+        return stat(target, *args, **kwargs)
+
+    monkeypatch.setattr(querylog.os, 'stat', stat_after_append)
+    try:
+        assert _queries(reader.read()) == ['b', 'c']
+    finally:
+        os.close(stale)
+        reader.close()
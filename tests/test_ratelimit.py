@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+上游限流测试
+"""
+
+import time
+import asyncio
+import threading
+
+import pytest
+
+from search_engines import ratelimit
+
+class _Clock:
+    """可手动推进的时钟，替换 ratelimit 模块中的 time"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = _Clock()
+    monkeypatch.setattr(ratelimit, 'time', fake)
+    return fake
+
+@pytest.fixture(autouse=True)
+def buckets(monkeypatch):
+    monkeypatch.setattr(ratelimit, '_buckets', {})
+
+def _bucket(rate=10.0, burst=1.0, max_wait=5.0, max_queue=100):
+    return ratelimit.TokenBucket('test', rate, burst, max_wait, max_queue)
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, '等待超时'
+        time.sleep(0.005)
+
+def test_burst_and_refill(clock):
+    bucket = _bucket(rate=2, burst=3)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    clock.advance(0.4)
+    assert bucket.try_acquire() is False
+    clock.advance(0.1)
+    assert bucket.try_acquire() is True
+    # 令牌不会超过桶容量
+    clock.advance(100)
+    assert bucket.snapshot()['tokens'] == 3
+
+def test_acquire_without_waiting(clock):
+    bucket = _bucket(burst=2)
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+    assert bucket.snapshot()['tokens'] == 0
+
+def test_queued_requests_released_by_priority():
+    bucket = _bucket(rate=5)
+    assert bucket.try_acquire()
+    granted = []
+    lock = threading.Lock()
+
+    def acquire(name, level):
+        bucket.acquire(level)
+        with lock:
+            granted.append(name)
+
+    threads = []
+    for name, level in (('background', ratelimit.BACKGROUND), ('batch 1', ratelimit.BATCH),
+                        ('interactive', ratelimit.INTERACTIVE), ('batch 2', ratelimit.BATCH)):
+        thread = threading.Thread(target=acquire, args=(name, level))
+        thread.start()
+        threads.append(thread)
+        queued = len(threads)
+        _wait_for(lambda: sum(bucket.depth) == queued)
+    assert bucket.snapshot()['queued'] == {'interactive': 1, 'batch': 2, 'background': 1}
+
+    for thread in threads:
+        thread.join(5)
+    # 高优先级先放行，同一优先级按到达顺序放行
+    assert granted == ['interactive', 'batch 1', 'batch 2', 'background']
+    assert sum(bucket.depth) == 0
+
+def test_try_acquire_does_not_jump_the_queue():
+    bucket = _bucket(rate=5, burst=2)
+    assert bucket.try_acquire() and bucket.try_acquire()
+    thread = threading.Thread(target=bucket.acquire)
+    thread.start()
+    _wait_for(lambda: sum(bucket.depth) == 1)
+    assert bucket.try_acquire() is False
+    thread.join(5)
+
+def test_wait_timeout():
+    bucket = _bucket(rate=0.1, max_wait=0.05)
+    assert bucket.try_acquire()
+    with pytest.raises(ratelimit.RateLimitError) as info:
+        bucket.acquire()
+    assert info.value.provider == 'test'
+    assert info.value.retry_after > 0
+    assert bucket.depth == [0, 0, 0]
+
+def test_queue_full():
+    bucket = _bucket(rate=0.1, max_wait=0.3, max_queue=1)
+    assert bucket.try_acquire()
+    waiting = threading.Thread(target=lambda: pytest.raises(ratelimit.RateLimitError, bucket.acquire))
+    waiting.start()
+    _wait_for(lambda: sum(bucket.depth) == 1)
+    start = time.monotonic()
+    with pytest.raises(ratelimit.RateLimitError):
+        bucket.acquire()
+    # 队列已满时立即拒绝，不排队等待
+    assert time.monotonic() - start < 0.1
+    waiting.join(5)
+
+def test_priority_from_context():
+    bucket = _bucket(rate=5)
+    assert bucket.try_acquire()
+    with ratelimit.priority(ratelimit.BACKGROUND):
+        assert ratelimit.priority_var.get() == ratelimit.BACKGROUND
+        thread = threading.Thread(target=bucket.acquire, args=(ratelimit.priority_var.get(),))
+        thread.start()
+    assert ratelimit.priority_var.get() == ratelimit.INTERACTIVE
+    _wait_for(lambda: bucket.depth[ratelimit.BACKGROUND] == 1)
+    thread.join(5)
+
+def test_async_acquire_waits_for_token():
+    bucket = _bucket(rate=20)
+    assert bucket.try_acquire()
+
+    async def main():
+        return await asyncio.gather(bucket.async_acquire(), bucket.async_acquire())
+
+    waits = asyncio.run(main())
+    assert all(wait > 0 for wait in waits)
+    assert bucket.depth == [0, 0, 0]
+
+def test_async_timeout_and_cancel():
+    bucket = _bucket(rate=0.1, max_wait=0.05)
+    assert bucket.try_acquire()
+    with pytest.raises(ratelimit.RateLimitError):
+        asyncio.run(bucket.async_acquire())
+
+    async def cancelled():
+        task = asyncio.ensure_future(bucket.async_acquire())
+        await asyncio.sleep(0.01)
+        assert sum(bucket.depth) == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancelled())
+    # 取消的请求离开队列
+    assert bucket.depth == [0, 0, 0]
+
+def test_unlimited_by_default(monkeypatch):
+    monkeypatch.delenv('RATE_LIMIT', raising=False)
+    monkeypatch.delenv('RATE_LIMIT_SEARXNG', raising=False)
+    assert ratelimit.get('searxng') is None
+    assert ratelimit.acquire('searxng') == 0.0
+    assert ratelimit.try_acquire('searxng') is True
+    assert ratelimit.snapshot('searxng') is None
+    assert asyncio.run(ratelimit.async_acquire('searxng')) == 0.0
+
+def test_provider_settings(monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT', '0.5')
+    monkeypatch.setenv('RATE_LIMIT_ZHIPUAI', '4')
+    monkeypatch.setenv('RATE_LIMIT_BURST_ZHIPUAI', '2')
+    # search_std 使用智谱的限流
+    bucket = ratelimit.get(ratelimit.provider_of('search_std'))
+    assert (bucket.provider, bucket.rate, bucket.burst) == ('zhipuai', 4, 2)
+    assert ratelimit.get('zhipuai') is bucket
+    assert ratelimit.snapshot('search_std') == {'rate': 4, 'burst': 2, 'tokens': 2,
+                                                'queued': {'interactive': 0, 'batch': 0, 'background': 0}}
+    # 桶容量至少为1
+    assert ratelimit.get('searxng').burst == 1
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+结果重排测试
+"""
+
+from collections import Counter
+
+import pytest
+
+import app as app_module
+from search_engines import rerank, dispatcher, models
+from conftest import make_result
+
+def _item(title, content=''):
+    return models.SearchItem(title=title, link='https://example.com/', content=content)
+
+def _result(items):
+    return {'id': 'test', 'search_result': items, 'meta': {'engine': 'searxng'}}
+
+@pytest.mark.parametrize('value, expected', [
+    (None, rerank.NONE),
+    ('', rerank.NONE),
+    ('BM25', rerank.BM25),
+    ('none', rerank.NONE),
+    ('tfidf', None)
+])
+def test_parse_method(value, expected):
+    assert rerank.parse_method(value) == expected
+
+@pytest.mark.parametrize('text, expected', [
+    ('Python Tutorial', ['python', 'tutorial']),
+    ('python教程', ['python', '教程']),
+    ('搜索引擎', ['搜索', '索引', '引擎']),
+    ('学 Ｐｙｔｈｏｎ3', ['学', 'python3']),
+    ('ひらがな', ['ひら', 'らが', 'がな']),
+    ('snake_case, 你好！', ['snake', 'case', '你好']),
+    ('', [])
+])
+def test_tokenize(text, expected):
+    assert rerank.tokenize(text) == expected
+
+@pytest.mark.parametrize('text', [
+    'Python 教程：从入门到精通，Python 3.12 新特性',
+    '哈哈哈 哈哈 一 二三 abc ABC abc',
+    '中文 english 混合 mixed 文本 text 文本',
+    'only ascii words here, words words'
+])
+def test_term_counts_match_tokenize(text):
+    # _count_terms 不生成二元组，统计结果应与 tokenize() 的切分一致
+    tokens = rerank.tokenize(text)
+    terms = list(dict.fromkeys(tokens))
+    rows, lengths = rerank._term_frequencies([_item('', text)], terms)
+    counts = Counter(tokens)
+    assert rows[0] == [counts[term] for term in terms]
+    assert lengths[0] == len(tokens)
+
+def test_title_terms_weighted():
+    rows, lengths = rerank._term_frequencies([_item('python', 'python 教程')], ['python', '教程'])
+    assert rows == [[rerank.TITLE_WEIGHT + 1, 1]]
+    assert lengths == [rerank.TITLE_WEIGHT + 2]
+
+def test_bm25_orders_by_relevance():
+    items = [
+        _item('天气预报', '今天北京晴，最高气温25度'),
+        _item('Python 入门', '一门编程语言'),
+        _item('Python 教程', 'Python 编程教程，适合初学者的 Python 入门教程')
+    ]
+    scores = rerank.bm25_scores('python 教程', items)
+    assert scores[0] == 0
+    assert scores[2] > scores[1] > 0
+
+def test_numpy_and_pure_python_scores_match(monkeypatch):
+    if rerank.np is None:
+        pytest.skip('需要 numpy')
+    items = [_item(f'搜索引擎 {index}', '搜索 ' * index + '引擎 search engine') for index in range(6)]
+    expected = rerank.bm25_scores('搜索引擎 search', items)
+    monkeypatch.setattr(rerank, 'np', None)
+    assert rerank.bm25_scores('搜索引擎 search', items) == pytest.approx(expected)
+
+def test_empty_query_scores_zero():
+    assert rerank.bm25_scores('！？', [_item('a'), _item('b')]) == [0.0, 0.0]
+    assert rerank.bm25_scores('python', []) == []
+
+def test_apply_returns_reordered_copy():
+    items = [_item('无关', '天气'), _item('另一个无关结果'), _item('Python 教程', 'Python')]
+    result = _result(items)
+    reranked = rerank.apply('searxng', result, 'python', rerank.BM25)
+    assert [item.title for item in reranked['search_result']] == ['Python 教程', '无关', '另一个无关结果']
+    assert reranked['meta'] == {'engine': 'searxng', 'rerank': rerank.BM25}
+    # 原结果（可能在缓存中）不被修改，得分相同的结果保持原有顺序
+    assert result['search_result'] is items
+    assert [item.title for item in items] == ['无关', '另一个无关结果', 'Python 教程']
+    assert result['meta'] == {'engine': 'searxng'}
+
+@pytest.mark.parametrize('method, result', [
+    (rerank.NONE, _result([_item('a'), _item('python')])),
+    (rerank.BM25, _result([_item('python')])),
+    (rerank.BM25, {**_result([_item('a'), _item('python')]), 'error': '上游错误'})
+])
+def test_apply_returns_original(method, result):
+    assert rerank.apply('searxng', result, 'python', method) is result
+
+def test_search_endpoint_rerank(monkeypatch):
+    monkeypatch.setattr(dispatcher, 'search', lambda engine, query, params: make_result(['天气', 'python 教程']))
+    client = app_module.app.test_client()
+    assert client.get('/api/search?engine=searxng&query=python&rerank=x').status_code == 400
+
+    plain = client.get('/api/search?engine=searxng&query=python').get_json()
+    reranked = client.get('/api/search?engine=searxng&query=python&rerank=bm25').get_json()
+    assert [item['title'] for item in plain['search_result']] == ['天气', 'python 教程']
+    assert [item['title'] for item in reranked['search_result']] == ['python 教程', '天气']
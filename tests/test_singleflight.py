@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+请求合并测试
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from search_engines import singleflight
+from conftest import make_result
+
+def _run_concurrently(count, target):
+    """在 count 个线程中同时调用 target，返回各线程的返回值或异常"""
+    barrier = threading.Barrier(count)
+    outcomes = [None] * count
+
+    def run(index):
+        barrier.wait(5)
+        try:
+            outcomes[index] = target()
+        except Exception as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return outcomes
+
+def _slow(calls, value=None, error=None):
+    """返回一个执行较慢的函数，让其他线程在执行期间加入等待"""
+    def fn():
+        calls.append(1)
+        threading.Event().wait(0.2)
+        if error is not None:
+            raise error
+        return value
+    return fn
+
+def test_concurrent_calls_share_one_execution():
+    group = singleflight.Group()
+    calls = []
+    fn = _slow(calls, make_result(['shared']))
+    outcomes = _run_concurrently(8, lambda: group.do('k', fn))
+
+    assert len(calls) == 1
+    assert sorted(source for _, source in outcomes) == [singleflight.LEADER] + [singleflight.THREAD] * 7
+    assert all(value is outcomes[0][0] for value, _ in outcomes)
+    assert group._calls == {}
+
+def test_different_keys_run_separately():
+    group = singleflight.Group()
+    calls = []
+    fn = _slow(calls, make_result(['a']))
+    keys = iter(['a', 'b'])
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            key = next(keys)
+        return group.do(key, fn)
+
+    outcomes = _run_concurrently(2, call)
+    assert len(calls) == 2
+    assert [source for _, source in outcomes] == [singleflight.LEADER] * 2
+
+def test_error_is_shared_with_waiters():
+    group = singleflight.Group()
+    calls = []
+    error = ValueError('上游错误')
+    outcomes = _run_concurrently(4, lambda: group.do('k', _slow(calls, error=error)))
+
+    assert len(calls) == 1
+    assert all(outcome is error for outcome in outcomes)
+    # 失败的调用不会留下，下一次调用重新执行
+    assert group.do('k', lambda: 1) == (1, singleflight.LEADER)
+
+def test_sequential_calls_are_not_coalesced():
+    group = singleflight.Group()
+    assert group.do('k', lambda: 1) == (1, singleflight.LEADER)
+    assert group.do('k', lambda: 2) == (2, singleflight.LEADER)
+
+def test_do_async_shares_one_execution():
+    group = singleflight.Group()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return make_result(['shared'])
+
+    async def main():
+        return await asyncio.gather(*(group.do_async('k', fetch) for _ in range(5)))
+
+    outcomes = asyncio.run(main())
+    assert len(calls) == 1
+    assert sorted(source for _, source in outcomes) == [singleflight.LEADER] + [singleflight.THREAD] * 4
+    assert group._async_calls == {}
+
+def test_do_async_error_is_shared():
+    group = singleflight.Group()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        raise ValueError('上游错误')
+
+    async def main():
+        return await asyncio.gather(*(group.do_async('k', fetch) for _ in range(3)), return_exceptions=True)
+
+    outcomes = asyncio.run(main())
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+
+def test_cancelled_waiter_does_not_cancel_leader():
+    group = singleflight.Group()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return 'done'
+
+    async def main():
+        leader = asyncio.ensure_future(group.do_async('k', fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(group.do_async('k', fetch))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        return await leader
+
+    assert asyncio.run(main()) == ('done', singleflight.LEADER)
+
+@pytest.mark.skipif(singleflight.fcntl is None, reason='需要 fcntl')
+def test_shares_result_across_processes(tmp_path):
+    # flock 锁属于打开的文件，两个 Group 各自打开锁文件，与两个工作进程的行为相同
+    groups = iter([singleflight.Group(str(tmp_path)), singleflight.Group(str(tmp_path))])
+    lock = threading.Lock()
+    calls = []
+    fn = _slow(calls, make_result(['shared']))
+
+    def call():
+        with lock:
+            group = next(groups)
+        return group.do('k', fn)
+
+    outcomes = _run_concurrently(2, call)
+    assert len(calls) == 1
+    assert sorted(source for _, source in outcomes) == [singleflight.LEADER, singleflight.PROCESS]
+    values = [value for value, _ in outcomes]
+    assert values[0]['search_result'][0].title == values[1]['search_result'][0].title == 'shared'